@@ -0,0 +1,382 @@
+"""HTTP API for the question -> SQL -> result pipeline.
+
+    API_SECRET=... python -m app.api      # API_HOST, API_PORT, API_WORKERS
+    API_SECRET=... uvicorn app.api:app --workers 4
+
+``API_SECRET`` is required: it signs the tokens ``/sql`` returns, so every
+worker must share it, and the service refuses to start without it.
+
+Endpoints (JSON request bodies):
+
+* ``POST /sql``    ``{"question", "stream"?, "priority"?, "use_cache"?}``: generated SQL. With
+  ``stream`` the response is NDJSON: ``{"partial": ...}`` lines while the model
+  writes, then the final object.
+* ``POST /check``  ``{"sql"}``: the query guard's decision and plan summary.
+  ``/check``, ``/query`` and ``/count`` only take a single read-only query over
+  the source's schema (400 ``QueryNotAllowed`` otherwise).
+* ``POST /query``  ``{"sql", "page"?, "page_size"?, "format"?, "refresh"?}``: the result,
+  after the same guard as ``/check`` (422 ``QueryRejected`` when it refuses the
+  query). ``page_size`` is at most ``API_MAX_PAGE_SIZE``.
+* ``POST /ask``    ``{"question", "page"?, "page_size"?, "format"?}``: generate,
+  guard and run in one call.
+* ``POST /count``  ``{"sql", "exact"?}``, ``POST /remember`` ``{"question", "sql", "token"}``
+  (``token`` as returned by ``/sql`` for that SQL, so only SQL this service
+  generated reaches the shared caches), ``POST /accept`` (same body; the user
+  confirmed the SQL as correct, so it becomes a few-shot example),
+  ``GET /schema?source=`` (the schema version), ``GET /stats``, ``GET /health``.
+* ``GET /sources`` (the configured data sources), ``POST /route`` ``{"question"}``
+  (the source a question would go to).
+
+Every body above also takes ``"source"``, the data source to use; without
+it ``/sql`` and ``/ask`` route the question and report the source chosen.
+
+Results are streamed as NDJSON (a header object with ``columns``, then one
+JSON array per row, then ``{"done": true, ...}``), as an Arrow IPC stream
+(``format=arrow``; metadata travels in the schema under ``text2sql``) or as
+one JSON document (``format=json``). Errors are JSON ``{"error", "detail"}``
+with the exception name, so :mod:`app.api_client` can raise the same type.
+"""
+import asyncio
+import hashlib
+import hmac
+import io
+import json
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+from . import pipeline
+from .config import (API_HOST, API_MAX_PAGE_SIZE, API_PORT, API_SECRET, API_WORKERS, RESULT_PAGE_SIZE,
+                     RESULT_PAGING)
+from .instrumentation import configure as configure_tracing, finish_trace, start_trace
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ROW_BATCH = 1000
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if not API_SECRET:
+        # A secret picked per process would make tokens from one worker fail on the others
+        raise RuntimeError("API_SECRET is not set; set it to the same random value for every worker")
+    # Each worker process loads the model and the shared prompt prefix before its first request
+    pipeline.start_warm_up()
+    yield
+
+
+app = FastAPI(title="Text-to-SQL API", lifespan=lifespan)
+configure_tracing()
+_SECRET = API_SECRET.encode()
+
+
+class SqlRequest(BaseModel):
+    question: str
+    stream: bool = False
+    priority: int = 0
+    use_cache: bool = True
+    source: Optional[str] = None
+
+
+class CheckRequest(BaseModel):
+    sql: str
+    source: Optional[str] = None
+
+
+class QueryRequest(BaseModel):
+    sql: str
+    page: Optional[int] = Field(None, ge=0)
+    page_size: int = Field(RESULT_PAGE_SIZE, ge=1, le=API_MAX_PAGE_SIZE)
+    format: str = "ndjson"
+    refresh: bool = False
+    source: Optional[str] = None
+
+
+class AskRequest(BaseModel):
+    question: str
+    page: Optional[int] = Field(0 if RESULT_PAGING else None, ge=0)
+    page_size: int = Field(RESULT_PAGE_SIZE, ge=1, le=API_MAX_PAGE_SIZE)
+    format: str = "ndjson"
+    priority: int = 0
+    source: Optional[str] = None
+
+
+class CountRequest(BaseModel):
+    sql: str
+    exact: bool = False
+    source: Optional[str] = None
+
+
+class RememberRequest(BaseModel):
+    question: str
+    sql: str
+    token: str
+    source: Optional[str] = None
+
+
+class RouteRequest(BaseModel):
+    question: str
+
+
+# --- errors ---------------------------------------------------------------
+
+_STATUS = [
+    (pipeline.LLMBusyError, 503),
+    (pipeline.LLMError, 502),
+    (pipeline.QueryRejected, 422),
+    (pipeline.QueryNotAllowed, 400),
+    (pipeline.SqlExtractionError, 422),
+    (pipeline.QueryError, 400),
+    (pipeline.UnknownDataSource, 404),
+    (pipeline.DatabaseError, 503),
+]
+
+
+def _error_response(exc):
+    status = next(code for cls, code in _STATUS if isinstance(exc, cls))
+    body = {"error": type(exc).__name__, "detail": str(exc)}
+    if isinstance(exc, pipeline.QueryRejected):
+        body["guard"] = _guard_dict(exc.guard)
+    elif isinstance(exc, pipeline.SqlExtractionError):
+        body["response"] = exc.response
+        if isinstance(exc, pipeline.SqlValidationError):
+            body.update(sql=exc.sql, problems=exc.problems)
+    elif isinstance(exc, pipeline.QueryError):
+        body["sql"] = exc.sql
+        if isinstance(exc, pipeline.QueryNotAllowed):
+            body["problems"] = exc.problems
+    headers = {"Retry-After": "5"} if isinstance(exc, pipeline.LLMBusyError) else None
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+for _cls, _ in _STATUS:
+    app.add_exception_handler(_cls, lambda request, exc: _error_response(exc))
+
+
+def _guard_dict(result):
+    return {
+        "action": result.action,
+        "sql": result.sql,
+        "reason": result.reason,
+        "summary": asdict(result.summary) if result.summary else None,
+    }
+
+
+def _token(source, question, sql):
+    """Proof that this service generated ``sql`` for ``question``; checked by /remember and /accept."""
+    message = json.dumps([source, question, sql]).encode()
+    return hmac.new(_SECRET, message, hashlib.sha256).hexdigest()
+
+
+def _generated_dict(generated, spans):
+    return dict(asdict(generated), token=_token(generated.source, generated.question, generated.sql),
+                timings=spans)
+
+
+def _guarded_fetch(sql, page, page_size, refresh, source):
+    """The guard, then the query, as the UI runs them; returns ``(guard_result, (frame, has_more))``."""
+    guard_result = pipeline.check(sql, source=source)
+    if guard_result.action == "reject":
+        raise pipeline.QueryRejected(guard_result)
+    return guard_result, pipeline.fetch(guard_result.sql, page, page_size, refresh=refresh, source=source)
+
+
+def _traced(name, fn, *args, **kwargs):
+    """Runs one pipeline call under its own trace; returns ``(result, spans)``."""
+    trace = start_trace(name)
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        finish_trace()
+    return result, (trace.to_dict()["spans"] if trace else [])
+
+
+# --- result encoding ------------------------------------------------------
+
+def _frame_meta(frame, **extra):
+    return dict(extra, columns=[str(c) for c in frame.columns], rows=len(frame),
+                column_types=frame.attrs.get("column_types"),
+                nested_columns=frame.attrs.get("nested_columns"))
+
+
+def _ndjson_rows(frame, meta):
+    yield (json.dumps(meta, default=str) + "\n").encode()
+    for start in range(0, len(frame), ROW_BATCH):
+        # to_json handles numpy scalars, NaN and timestamps in one vectorised pass
+        rows = json.loads(frame.iloc[start:start + ROW_BATCH].to_json(orient="values", date_format="iso"))
+        yield "".join(json.dumps(row) + "\n" for row in rows).encode()
+    yield (json.dumps({"done": True, "rows": len(frame)}) + "\n").encode()
+
+
+def _arrow_stream(frame, meta):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    schema = table.schema.with_metadata(
+        dict(table.schema.metadata or {}, text2sql=json.dumps(meta, default=str)))
+    sink = io.BytesIO()
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in table.to_batches(max_chunksize=ROW_BATCH * 10):
+            writer.write_batch(batch)
+            yield drain()
+    yield drain()
+
+
+def _result_response(frame, fmt, **meta):
+    meta = _frame_meta(frame, **meta)
+    if fmt == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return JSONResponse({"error": "NotAcceptable", "detail": "pyarrow is not installed"},
+                                status_code=406)
+        return StreamingResponse(_arrow_stream(frame, meta), media_type=ARROW_MEDIA_TYPE)
+    if fmt == "json":
+        rows = json.loads(frame.to_json(orient="values", date_format="iso"))
+        return JSONResponse(dict(meta, data=rows))
+    return StreamingResponse(_ndjson_rows(frame, meta), media_type=NDJSON_MEDIA_TYPE)
+
+
+# --- endpoints ------------------------------------------------------------
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/schema")
+async def schema(source: Optional[str] = None):
+    return {"version": await run_in_threadpool(pipeline.schema_version, source)}
+
+
+@app.get("/sources")
+async def sources():
+    return {"sources": await run_in_threadpool(pipeline.sources)}
+
+
+@app.post("/route")
+async def route(body: RouteRequest):
+    return {"source": await run_in_threadpool(pipeline.route, body.question)}
+
+
+@app.get("/stats")
+async def stats():
+    return JSONResponse(json.loads(json.dumps(await run_in_threadpool(pipeline.stats), default=str)))
+
+
+@app.post("/sql")
+async def sql(body: SqlRequest):
+    if not body.stream:
+        generated, spans = await run_in_threadpool(_traced, "sql", pipeline.generate, body.question,
+                                                   priority=body.priority, use_cache=body.use_cache,
+                                                   source=body.source)
+        return _generated_dict(generated, spans)
+
+    loop = asyncio.get_running_loop()
+    partials = asyncio.Queue()
+
+    def on_token(partial):
+        loop.call_soon_threadsafe(partials.put_nowait, partial)
+
+    task = asyncio.ensure_future(run_in_threadpool(_traced, "sql", pipeline.generate, body.question,
+                                                   on_token=on_token, priority=body.priority,
+                                                   use_cache=body.use_cache, source=body.source))
+
+    async def lines():
+        while not task.done() or not partials.empty():
+            getter = asyncio.ensure_future(partials.get())
+            await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                partial = getter.result()
+                # Partials are cumulative; skip to the newest if the client fell behind
+                while not partials.empty():
+                    partial = partials.get_nowait()
+                yield json.dumps({"partial": partial}) + "\n"
+            else:
+                getter.cancel()
+        try:
+            generated, spans = task.result()
+        except Exception as e:
+            if not any(isinstance(e, cls) for cls, _ in _STATUS):
+                raise
+            # Headers are already sent; report the error as the final line
+            yield json.dumps(json.loads(_error_response(e).body)) + "\n"
+            return
+        yield json.dumps(_generated_dict(generated, spans)) + "\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.post("/check")
+async def check(body: CheckRequest):
+    sql = await run_in_threadpool(pipeline.require_read_only, body.sql, body.source)
+    result, spans = await run_in_threadpool(_traced, "check", pipeline.check, sql, source=body.source)
+    return dict(_guard_dict(result), timings=spans)
+
+
+@app.post("/query")
+async def query(body: QueryRequest):
+    sql = await run_in_threadpool(pipeline.require_read_only, body.sql, body.source)
+    (guard_result, (frame, has_more)), spans = await run_in_threadpool(
+        _traced, "query", _guarded_fetch, sql, body.page, body.page_size, body.refresh, body.source)
+    return _result_response(frame, body.format, sql=body.sql, executed_sql=guard_result.sql,
+                            guard=_guard_dict(guard_result), page=body.page, has_more=has_more, timings=spans)
+
+
+@app.post("/ask")
+async def ask(body: AskRequest):
+    answer, spans = await run_in_threadpool(_traced, "question", pipeline.answer, body.question,
+                                            body.page, body.page_size, priority=body.priority, source=body.source)
+    return _result_response(answer.frame, body.format, question=answer.question, source=answer.source,
+                            sql=answer.sql, executed_sql=answer.executed_sql, cached=answer.cached,
+                            guard=_guard_dict(answer.guard), page=body.page, has_more=answer.has_more,
+                            timings=spans)
+
+
+@app.post("/count")
+async def count(body: CountRequest):
+    sql = await run_in_threadpool(pipeline.require_read_only, body.sql, body.source)
+    total, exact = await run_in_threadpool(pipeline.count, sql, body.exact, body.source)
+    return {"count": total, "exact": exact}
+
+
+@app.post("/remember")
+async def remember(body: RememberRequest):
+    if not hmac.compare_digest(body.token, _token(body.source, body.question, body.sql)):
+        return JSONResponse({"error": "Forbidden", "detail": "Only SQL generated by /sql can be remembered"},
+                            status_code=403)
+    await run_in_threadpool(pipeline.require_read_only, body.sql, body.source)
+    await run_in_threadpool(pipeline.remember, body.question, body.sql, body.source)
+    return {"status": "ok"}
+
+
+@app.post("/accept")
+async def accept(body: RememberRequest):
+    if not hmac.compare_digest(body.token, _token(body.source, body.question, body.sql)):
+        return JSONResponse({"error": "Forbidden", "detail": "Only SQL generated by /sql can be accepted"},
+                            status_code=403)
+    await run_in_threadpool(pipeline.require_read_only, body.sql, body.source)
+    stored = await run_in_threadpool(pipeline.accept, body.question, body.sql, body.source)
+    return {"status": "ok", "stored": stored}
+
+
+def main():
+    import uvicorn
+
+    uvicorn.run("app.api:app", host=API_HOST, port=API_PORT, workers=API_WORKERS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Client for :mod:`app.api` exposing the same functions as :mod:`app.pipeline`.
+
+With ``API_URL`` set, the Streamlit UI calls a separately scaled API service
+through this client instead of running the pipeline in its own process.
+Error responses are raised as the exception types the pipeline raises.
+"""
+import json
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+
+import httpx
+
+from .config import API_TIMEOUT, API_URL, RESULT_PAGE_SIZE
+from .errors import (DatabaseError, QueryError, QueryNotAllowed, QueryRejected, SqlExtractionError,
+                     SqlValidationError, UnknownDataSource)
+from .llm_client import LLMBusyError, LLMError
+from .query_guard import GuardResult, PlanSummary
+
+
+@dataclass
+class GeneratedSql:
+    question: str
+    sql: str
+    cached: bool = False
+    metrics: dict = field(default_factory=dict)
+    source: str = None
+    token: str = None  # lets /remember and /accept take this SQL
+    timings: list = field(default_factory=list)  # server-side spans
+
+
+def _guard_from_dict(data):
+    summary = data.get("summary")
+    if summary:
+        summary = PlanSummary(**dict(summary, scans=[tuple(s) for s in summary.get("scans", [])]))
+    return GuardResult(data["action"], data["sql"], summary, data.get("reason", ""))
+
+
+def _raise_for_error(data, status_code):
+    name = data.get("error")
+    detail = data.get("detail", "")
+    if name == "LLMBusyError":
+        raise LLMBusyError(detail)
+    if name == "LLMError":
+        raise LLMError(detail)
+    if name == "QueryRejected":
+        raise QueryRejected(_guard_from_dict(data["guard"]))
+    if name == "SqlValidationError":
+        raise SqlValidationError(detail, data.get("response"), data.get("sql"), data.get("problems") or [])
+    if name == "SqlExtractionError":
+        raise SqlExtractionError(detail, data.get("response"))
+    if name == "QueryNotAllowed":
+        raise QueryNotAllowed(detail, data.get("sql"), data.get("problems") or [])
+    if name == "QueryError":
+        raise QueryError(detail, data.get("sql"))
+    if name == "UnknownDataSource":
+        raise UnknownDataSource(detail)
+    raise DatabaseError(f"API error {status_code}: {detail or name}")
+
+
+class ApiClient:
+    def __init__(self, base_url=API_URL, timeout=API_TIMEOUT):
+        self.base_url = base_url
+        self._http = httpx.Client(base_url=base_url, timeout=httpx.Timeout(timeout, connect=10.0))
+        # Requests run off the calling thread so on_wait can keep a Streamlit script responsive
+        self._workers = ThreadPoolExecutor(max_workers=8, thread_name_prefix="api_client")
+        self._tokens = OrderedDict()  # (question, sql) -> (token, source) of recently generated SQL
+        self._tokens_lock = threading.Lock()
+
+    def _post(self, path, payload):
+        return self._request("POST", path, payload)
+
+    def _request(self, method, path, payload=None):
+        try:
+            res = self._http.request(method, path, json=payload)
+        except httpx.HTTPError as e:
+            raise DatabaseError(f"API unreachable at {self.base_url}: {e}") from e
+        data = res.json() if res.headers.get("content-type", "").startswith("application/json") else {}
+        if res.status_code >= 400:
+            _raise_for_error(data, res.status_code)
+        return data
+
+    def sources(self):
+        return self._request("GET", "/sources")["sources"]
+
+    def route(self, question):
+        return self._post("/route", {"question": question})["source"]
+
+    def schema_version(self, source=None):
+        return self._request("GET", "/schema" + (f"?source={quote(source)}" if source else ""))["version"]
+
+    def generate(self, question, on_token=None, priority=0, use_cache=True, source=None):
+        payload = {"question": question, "stream": on_token is not None, "priority": priority,
+                   "use_cache": use_cache, "source": source}
+        if on_token is None:
+            return self._generated(self._post("/sql", payload))
+        try:
+            with self._http.stream("POST", "/sql", json=payload) as res:
+                if res.status_code >= 400:
+                    res.read()
+                    _raise_for_error(res.json(), res.status_code)
+                for line in res.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if "partial" in data:
+                        on_token(data["partial"])
+                    elif "error" in data:
+                        _raise_for_error(data, 500)
+                    else:
+                        return self._generated(data)
+        except httpx.HTTPError as e:
+            raise DatabaseError(f"API unreachable at {self.base_url}: {e}") from e
+        raise LLMError("The API closed the stream before returning SQL")
+
+    def _generated(self, data):
+        generated = GeneratedSql(**data)
+        with self._tokens_lock:
+            self._tokens[(generated.question, generated.sql)] = (generated.token, generated.source)
+            while len(self._tokens) > 256:
+                self._tokens.popitem(last=False)
+        return generated
+
+    def remember(self, question, sql, source=None):
+        """Remembers SQL this client got from :meth:`generate`; other SQL is not accepted by the API."""
+        self._post_generated("/remember", question, sql)
+
+    def accept(self, question, sql, source=None):
+        """Stores SQL from :meth:`generate` that the user confirmed as a few-shot example."""
+        return bool(self._post_generated("/accept", question, sql).get("stored"))
+
+    def _post_generated(self, path, question, sql):
+        with self._tokens_lock:
+            token, generated_source = self._tokens.get((question, sql), (None, None))
+        if token is None:
+            return {}
+        return self._post(path, {"question": question, "sql": sql, "token": token, "source": generated_source})
+
+    def check(self, sql, source=None):
+        return _guard_from_dict(self._post("/check", {"sql": sql, "source": source}))
+
+    def fetch(self, sql, page=None, page_size=RESULT_PAGE_SIZE, on_wait=None, refresh=False, source=None):
+        """Returns ``(frame, has_more)``, transferred as Arrow when pyarrow is available."""
+        future = self._workers.submit(self._fetch, sql, page, page_size, refresh, source)
+        if on_wait is None:
+            return future.result()
+        while True:
+            try:
+                return future.result(timeout=0.25)
+            except FutureTimeout:
+                on_wait()
+
+    def _fetch(self, sql, page, page_size, refresh, source):
+        import pandas as pd
+
+        try:
+            import pyarrow as pa
+        except ImportError:
+            pa = None
+        payload = {"sql": sql, "page": page, "page_size": page_size, "format": "arrow" if pa else "json",
+                   "refresh": refresh, "source": source}
+        try:
+            res = self._http.post("/query", json=payload)
+        except httpx.HTTPError as e:
+            raise DatabaseError(f"API unreachable at {self.base_url}: {e}") from e
+        if res.status_code >= 400:
+            _raise_for_error(res.json(), res.status_code)
+        if pa is not None:
+            reader = pa.ipc.open_stream(res.content)
+            meta = json.loads(reader.schema.metadata[b"text2sql"])
+            frame = reader.read_pandas()
+        else:
+            meta = res.json()
+            frame = pd.DataFrame(meta.pop("data"), columns=range(len(meta["columns"])))
+            frame.columns = meta["columns"]
+        for key in ("column_types", "nested_columns"):
+            if meta.get(key) is not None:
+                frame.attrs[key] = meta[key]
+        return frame, meta.get("has_more", False)
+
+    def count(self, sql, exact=False, source=None):
+        data = self._post("/count", {"sql": sql, "exact": exact, "source": source})
+        return data["count"], data["exact"]
+
+    def stats(self):
+        try:
+            res = self._http.get("/stats")
+            res.raise_for_status()
+            return res.json()
+        except httpx.HTTPError as e:
+            return {"error": f"API unreachable at {self.base_url}: {e}"}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_api_client():
+    """Process-wide client shared by all Streamlit sessions."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ApiClient()
+    return _client
@@ -6,51 +6,33 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-print("--> Importing app.py")
 import streamlit as st
-import re
-print("--> app.py: Imported streamlit")
 from app.db_config import get_schema, run_query
-print("--> app.py: Imported db_config functions")
 from app.llm_utils import generate_sql
-print("--> app.py: Imported llm_utils function")
+from app.sql_validation import clean_sql
 
 def extract_sql_from_response(text):
-    # Using regex to find SQL block marked with ```sql ... ```
-    matches = re.findall(r"```sql(.*?)```", text, re.DOTALL | re.IGNORECASE)
-    # Return the first match stripped of whitespace, or None if no match
-    return matches[0].strip() if matches else None
+    # Same clean-up as the main pipeline: fences, surrounding prose, trailing semicolons
+    return clean_sql(text)
 
-print("--> app.py: Running st.set_page_config()")
 st.set_page_config(page_title="Text-to-SQL Internal Tool")
-print("--> app.py: Running st.title()")
 st.title("Ask Your Database Anything")
 
-print("--> app.py: Running st.text_input()")
 question = st.text_input("Enter your question:")
 
-print(f"--> app.py: Question entered: {bool(question)}")
 if question:
-    print("--> app.py: Entering 'if question:' block")
     with st.spinner("Generating SQL and fetching results..."):
-        print("--> app.py: Calling get_schema()")
-        schema = get_schema()
-        print("--> app.py: Calling generate_sql()")
+        schema = get_schema(question)
         sql_response = generate_sql(schema, question)
-        print(f"--> app.py: Full LLM response received: {sql_response[:100]}...")
 
         # Extract SQL from the response
         extracted_sql = extract_sql_from_response(sql_response)
-        print(f"--> app.py: Extracted SQL: {extracted_sql[:50] if extracted_sql else 'None'}...")
 
         if extracted_sql:
             st.code(extracted_sql, language="sql") # Display extracted SQL
             try:
-                print("--> app.py: Calling run_query() with extracted SQL")
                 result = run_query(extracted_sql) # Use extracted SQL
-                print("--> app.py: run_query() successful, calling st.dataframe()")
                 st.dataframe(result)
-                print("--> app.py: st.dataframe() successful")
 
                 # Attempt to display charts if data is suitable
                 if result is not None and not result.empty:
@@ -71,7 +53,6 @@ if question:
                         numeric_cols = chart_data.select_dtypes(include='number').columns
                         
                         if not numeric_cols.empty:
-                            print("--> app.py: Attempting to display charts")
                             st.subheader("Charts")
                             # Select first numeric column for basic charts
                             # More sophisticated logic could allow user selection
@@ -82,10 +63,6 @@ if question:
                             
                             st.write("Bar Chart:")
                             st.bar_chart(chart_data[col_to_plot])
-                            print("--> app.py: Charts displayed")
-                        else:
-                            print("--> app.py: No numeric columns found for charting.")
-                            # st.write("No suitable numeric data found for charting.")
                     except Exception as chart_e:
                         print(f"--> app.py: ERROR displaying charts - {chart_e}")
                         st.warning(f"Could not display charts: {str(chart_e)}")
@@ -99,5 +76,3 @@ if question:
             print("--> app.py: ERROR - Could not extract SQL from LLM response.")
             st.error("Could not extract SQL query from the response. Please try rephrasing your question.")
             st.text_area("Full Response:", sql_response, height=150) # Show full response for debugging
-
-print("--> Finished executing app.py script")
@@ -0,0 +1,246 @@
+"""Batch mode: answer a file of questions and write one result file per question.
+
+    python -m app.batch questions.csv --out reports/2024-06-01
+    python -m app.batch questions.jsonl --out reports/nightly --format csv --llm-workers 2
+
+Input is a CSV with a ``question`` column (and optionally ``id`` and
+``source``, the data source to ask) or JSON lines with the same keys.
+Questions without a source use ``--source``, or are routed to the best
+matching one. Questions that normalise to the same text (for the same
+source) are answered once. Generation and execution are pipelined: up to
+``--llm-workers`` questions are with the model while up to ``--db-workers``
+generated queries run.
+
+Every finished question is appended to ``manifest.jsonl`` in the output
+directory (SQL, row count, output file, per-stage timings, error). The
+manifest doubles as the checkpoint: rerunning the same command skips
+questions that already succeeded, and ``--retry-errors`` retries the rest.
+"""
+import argparse
+import contextvars
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from . import pipeline
+from .config import DB_POOL_SIZE, OLLAMA_NUM_PARALLEL
+from .data_sources import use_source
+from .db_config import get_schema_catalog
+from .instrumentation import configure as configure_tracing, finish_trace, span, start_trace
+from .sql_cache import normalise_question
+
+MANIFEST = "manifest.jsonl"
+# Interactive users share the LLM queue when batch runs in the API process; let them go first
+BATCH_PRIORITY = 10
+
+
+def read_questions(path, default_source=None):
+    """Returns ``[(id, question, source)]`` from a CSV or JSON-lines file."""
+    with open(path, newline="", encoding="utf-8") as fh:
+        if path.endswith((".jsonl", ".ndjson")):
+            rows = [json.loads(line) for line in fh if line.strip()]
+        else:
+            rows = list(csv.DictReader(fh))
+    questions = []
+    for i, row in enumerate(rows, 1):
+        question = (row.get("question") or "").strip()
+        if question:
+            source = (row.get("source") or "").strip() or default_source
+            questions.append((str(row.get("id") or i), question, source))
+    return questions
+
+
+def group_questions(questions):
+    """Deduplicates by source and normalised text; returns ``{key: {"question", "source", "ids"}}``
+    in input order."""
+    groups = {}
+    for qid, question, source in questions:
+        normalised = normalise_question(question)
+        # Keys of questions without a source stay as they were before sources existed
+        text = normalised if source is None else f"{source}\n{normalised}"
+        key = hashlib.sha1(text.encode()).hexdigest()[:12]
+        groups.setdefault(key, {"question": question, "source": source, "ids": []})["ids"].append(qid)
+    return groups
+
+
+def load_manifest(out_dir):
+    """Latest manifest entry per question key."""
+    done = {}
+    path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by an interrupted run
+                done[entry["key"]] = entry
+    return done
+
+
+def _slug(text, limit=40):
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")[:limit] or "question"
+
+
+def _parquet_errors():
+    """Exceptions after which a frame is written as CSV instead of Parquet."""
+    try:
+        from pyarrow import ArrowException
+    except ImportError:
+        return ImportError, ValueError, TypeError
+    return ImportError, ValueError, TypeError, ArrowException
+
+
+def write_frame(frame, path_base, fmt):
+    """Writes ``frame`` as Parquet, falling back to CSV without pyarrow or when a
+    column can't be converted (e.g. mixed types in an object column); returns the path."""
+    frame = frame.copy(deep=False)
+    frame.columns = [str(c) for c in frame.columns]
+    if fmt == "parquet":
+        try:
+            frame.to_parquet(path_base + ".parquet", index=False)
+            return path_base + ".parquet"
+        except _parquet_errors() as e:
+            if not isinstance(e, ImportError):
+                print(f"--> batch: Writing {os.path.basename(path_base)} as CSV, not Parquet: {e}")
+            if os.path.exists(path_base + ".parquet"):
+                os.remove(path_base + ".parquet")
+    frame.to_csv(path_base + ".csv", index=False)
+    return path_base + ".csv"
+
+
+class BatchRun:
+    def __init__(self, out_dir, fmt="parquet", llm_workers=OLLAMA_NUM_PARALLEL, db_workers=DB_POOL_SIZE):
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.llm_workers = max(1, llm_workers)
+        self.db_workers = max(1, db_workers)
+        self._manifest_lock = threading.Lock()
+        os.makedirs(os.path.join(out_dir, "results"), exist_ok=True)
+
+    def run(self, groups, retry_errors=False):
+        """Answers every group not yet in the manifest; returns ``(succeeded, failed, skipped)``."""
+        done = load_manifest(self.out_dir)
+        pending = {
+            key: group for key, group in groups.items()
+            if key not in done or (retry_errors and done[key]["status"] != "ok")
+        }
+        skipped = len(groups) - len(pending)
+        if skipped:
+            print(f"--> batch: Resuming; {skipped} question(s) already in the manifest")
+        # One catalog load per named source up front; every question then reuses the cached schema
+        for source in {group["source"] for group in pending.values()}:
+            with use_source(source):
+                get_schema_catalog()
+
+        results = []
+        with ThreadPoolExecutor(self.db_workers, thread_name_prefix="batch_db") as db_pool, \
+                ThreadPoolExecutor(self.llm_workers, thread_name_prefix="batch_llm") as llm_pool:
+            generated = [llm_pool.submit(self._generate, key, group, db_pool)
+                         for key, group in pending.items()]
+            for future in generated:
+                results.append(future.result().result())
+        succeeded = sum(1 for status in results if status == "ok")
+        return succeeded, len(results) - succeeded, skipped
+
+    def _generate(self, key, group, db_pool):
+        """LLM stage; hands the query to the DB stage and returns that stage's future."""
+        trace = start_trace("batch", key=key)
+        started = time.time()
+        try:
+            # Batches want throughput; speculative candidates would multiply the load on the model
+            generated = pipeline.generate(group["question"], priority=BATCH_PRIORITY, source=group["source"],
+                                          candidates=1)
+        except Exception as e:
+            finish_trace()
+            failed = Future()
+            failed.set_result(self._record(key, group, started, trace, error=e))
+            return failed
+        # The DB stage continues this trace on another thread
+        context = contextvars.copy_context()
+        return db_pool.submit(context.run, self._execute, key, group, generated, started, trace)
+
+    def _execute(self, key, group, generated, started, trace):
+        try:
+            guard_result = pipeline.check(generated.sql, source=generated.source)
+            if guard_result.action == "reject":
+                raise pipeline.QueryRejected(guard_result)
+            frame, _ = pipeline.fetch(guard_result.sql, source=generated.source)
+            with span("write"):
+                output = write_frame(frame, os.path.join(
+                    self.out_dir, "results", f"{key}_{_slug(group['question'])}"), self.fmt)
+            if not generated.cached:
+                pipeline.remember(group["question"], generated.sql, source=generated.source)
+        except Exception as e:
+            finish_trace()
+            return self._record(key, group, started, trace, generated=generated, error=e)
+        finish_trace()
+        return self._record(key, group, started, trace, generated=generated, executed_sql=guard_result.sql,
+                            rows=len(frame), output=os.path.relpath(output, self.out_dir))
+
+    def _record(self, key, group, started, trace, generated=None, executed_sql=None, rows=None, output=None,
+                error=None):
+        entry = {
+            "key": key,
+            "ids": group["ids"],
+            "question": group["question"],
+            "source": generated.source if generated else group["source"],
+            "status": "ok" if error is None else "error",
+            "sql": generated.sql if generated else None,
+            "executed_sql": executed_sql,
+            "cached_sql": generated.cached if generated else False,
+            "rows": rows,
+            "output": output,
+            "error": f"{type(error).__name__}: {error}" if error is not None else None,
+            "started_at": started,
+            "seconds": round(time.time() - started, 3),
+            "timings": _stage_timings(trace),
+        }
+        line = json.dumps(entry, default=str)
+        with self._manifest_lock, open(os.path.join(self.out_dir, MANIFEST), "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        print(f"--> batch: [{entry['status']}] {group['question'][:60]}"
+              + (f" ({error})" if error is not None else f" -> {output}"))
+        return entry["status"]
+
+
+def _stage_timings(trace):
+    timings = {}
+    if trace is not None:
+        for s in trace.spans:
+            timings[s.name] = round(timings.get(s.name, 0.0) + s.duration, 4)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("questions", help="CSV or JSONL file with a 'question' column/key")
+    parser.add_argument("--out", required=True, help="output directory (also holds the checkpoint)")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--llm-workers", type=int, default=OLLAMA_NUM_PARALLEL)
+    parser.add_argument("--db-workers", type=int, default=DB_POOL_SIZE)
+    parser.add_argument("--retry-errors", action="store_true", help="rerun questions that failed before")
+    parser.add_argument("--source", help="data source for questions without one (default: route each question)")
+    args = parser.parse_args()
+
+    configure_tracing()
+    questions = read_questions(args.questions, args.source)
+    groups = group_questions(questions)
+    print(f"--> batch: {len(questions)} question(s), {len(groups)} unique")
+    started = time.perf_counter()
+    succeeded, failed, skipped = BatchRun(args.out, args.format, args.llm_workers, args.db_workers).run(
+        groups, retry_errors=args.retry_errors)
+    print(f"--> batch: {succeeded} succeeded, {failed} failed, {skipped} skipped "
+          f"in {time.perf_counter() - started:.1f}s; manifest: {os.path.join(args.out, MANIFEST)}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
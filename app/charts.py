@@ -0,0 +1,226 @@
+"""Chart preparation for query results.
+
+Column roles (temporal, measure, categorical, key) come from the database
+types :mod:`app.materialize` records in ``df.attrs["column_types"]``, falling
+back to the pandas dtype where the driver reports no types, so no cell is
+inspected. Large results are reduced to the chart's pixel budget before they
+reach Streamlit: a single line series with Largest-Triangle-Three-Buckets
+(which keeps peaks and troughs), several series by averaging equal-size bins,
+and bar charts by aggregating per category and keeping the largest bars.
+A partial result (one page of a larger one) is labelled as such, and its bars
+are not summed per category, since the totals would only cover that page.
+Prepared charts are memoised per result frame, so reruns redraw without
+recomputing.
+"""
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .config import CHART_MAX_BARS, CHART_MAX_POINTS
+from .instrumentation import span
+
+TEMPORAL_TYPES = {"date", "timestamp", "timestamptz"}
+MEASURE_TYPES = {"int2", "int4", "int8", "float4", "float8", "numeric", "money"}
+
+_MEMO_SIZE = 32
+
+
+@dataclass
+class ChartSpec:
+    kind: str  # "line" or "bar"
+    frame: object  # indexed by the x axis, one column per series
+    source_rows: int
+    reduction: str = ""  # how the rows were reduced, for a caption
+    partial: bool = False  # charts the current page of a larger result only
+
+    def describe(self):
+        scope = "Current page only" if self.partial else ""
+        if not self.reduction:
+            return scope
+        described = f"{self.reduction}: {len(self.frame):,} of {self.source_rows:,} rows shown"
+        return f"{scope} · {described}" if scope else described
+
+
+def column_roles(df):
+    """Maps each column to "temporal", "measure", "categorical" or "key"."""
+    db_types = df.attrs.get("column_types") or {}
+    nested = set(df.attrs.get("nested_columns") or ())
+    roles = {}
+    for name, dtype in zip(df.columns, df.dtypes):
+        db_type = db_types.get(name, "unknown")
+        if name in nested:
+            role = "categorical"
+        elif db_type in TEMPORAL_TYPES or dtype.kind == "M":
+            role = "temporal"
+        elif db_type in MEASURE_TYPES or (db_type == "unknown" and dtype.kind in "iuf"):
+            role = "measure"
+        else:
+            role = "categorical"
+        if role == "measure" and _is_key(name):
+            role = "key"
+        roles[name] = role
+    return roles
+
+
+def _is_key(name):
+    name = str(name).lower()
+    return name == "id" or name.endswith("_id")
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of ``n_out`` points that keep the shape of (x, y)."""
+    import numpy as np
+
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # n_out - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        xs, ys = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x) * (ys - y[a]) - (x[a] - xs) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def _as_measure(series, db_type):
+    import pandas as pd
+
+    if series.dtype.kind in "iuf":
+        return series
+    if db_type == "money":
+        series = series.astype(str).str.replace(r"[^\d.\-]", "", regex=True)
+    # numeric arrives as Decimal objects; one vectorised conversion to float
+    return pd.to_numeric(series, errors="coerce")
+
+
+def _as_temporal(series):
+    import pandas as pd
+
+    if series.dtype.kind == "M":
+        return series
+    return pd.to_datetime(series, errors="coerce")
+
+
+def _line(frame, x, measures, max_points):
+    import numpy as np
+
+    data = frame.dropna(subset=measures, how="all")
+    if x is not None:
+        data = data.dropna(subset=[x]).sort_values(x, kind="stable")
+    n = len(data)
+    if n <= max_points:
+        return (data.set_index(x) if x is not None else data.reset_index(drop=True)), ""
+    if len(measures) == 1:
+        # Seconds from the first point; works for naive and timezone-aware columns
+        xs = ((data[x] - data[x].iloc[0]).dt.total_seconds().to_numpy() if x is not None
+              else np.arange(n, dtype="float64"))
+        ys = data[measures[0]].to_numpy(dtype="float64", na_value=np.nan)
+        ys = np.where(np.isnan(ys), np.nanmean(ys), ys)
+        data = data.iloc[lttb(xs, ys, max_points)]
+        return (data.set_index(x) if x is not None else data.reset_index(drop=True)), "Downsampled (LTTB)"
+    bins = (np.arange(n) * max_points) // n
+    aggregations = {m: "mean" for m in measures}
+    if x is not None:
+        aggregations[x] = "first"
+    data = data.groupby(bins, sort=False).agg(aggregations)
+    return (data.set_index(x) if x is not None else data), "Averaged into bins"
+
+
+def _bar(frame, x, measures, max_bars, partial=False):
+    if measures and partial:
+        # Rows as returned; duplicate categories get their row number instead of a page-only sum
+        data = frame.set_index(x)[measures].head(max_bars)
+        labels = data.index.astype(str)
+        duplicated = labels.duplicated(keep=False)
+        data.index = labels.where(~duplicated, labels + " #" + (data.reset_index().index + 1).astype(str))
+        return data, f"First {max_bars} rows" if len(frame) > max_bars else ""
+    if measures:
+        data = frame.groupby(x, sort=False, dropna=False)[measures].sum()
+        reduction = "Summed per category" if len(data) < len(frame) else ""
+        order = measures[0]
+    else:
+        data = frame[x].value_counts(dropna=False).rename("count").to_frame()
+        reduction = "Rows per category"
+        order = "count"
+    if len(data) > max_bars:
+        data = data.nlargest(max_bars, order)
+        reduction = f"Top {max_bars} categories"
+    data.index = data.index.astype(str)
+    return data, reduction
+
+
+def build_chart(df, max_points=CHART_MAX_POINTS, max_bars=CHART_MAX_BARS, partial=False):
+    """Returns a ChartSpec for ``df``, or None when nothing in it can be charted.
+
+    ``partial`` marks ``df`` as one page of a larger result.
+    """
+    if df is None or df.empty or len(df.columns) == 0 or not df.columns.is_unique:
+        return None
+    roles = column_roles(df)
+    db_types = df.attrs.get("column_types") or {}
+    temporal = [c for c, r in roles.items() if r == "temporal"]
+    measures = [c for c, r in roles.items() if r == "measure"]
+    categorical = [c for c, r in roles.items() if r == "categorical"]
+
+    columns = {m: _as_measure(df[m], db_types.get(m)) for m in measures}
+    if temporal and measures:
+        x = temporal[0]
+        columns[x] = _as_temporal(df[x])
+        frame, reduction = _line(_frame(columns), x, measures, max_points)
+        kind = "line"
+    elif categorical:
+        x = categorical[0]
+        columns[x] = df[x]
+        frame, reduction = _bar(_frame(columns), x, measures, max_bars, partial)
+        kind = "bar"
+    elif measures:
+        frame, reduction = _line(_frame(columns), None, measures, max_points)
+        kind = "line"
+    else:
+        return None
+    if frame.empty:
+        return None
+    return ChartSpec(kind, frame, len(df), reduction, partial)
+
+
+def _frame(columns):
+    import pandas as pd
+
+    return pd.DataFrame(columns, copy=False)
+
+
+_memo = OrderedDict()  # id(frame) -> (weakref to frame, ChartSpec)
+_memo_lock = threading.Lock()
+
+
+def prepare_chart(df, max_points=CHART_MAX_POINTS, max_bars=CHART_MAX_BARS, partial=False):
+    """Memoised :func:`build_chart`: a result frame served again (e.g. from the session
+    memo on a rerun) reuses its prepared chart."""
+    key = (id(df), max_points, max_bars, partial)
+    with _memo_lock:
+        cached = _memo.get(key)
+        if cached is not None and cached[0]() is df:
+            _memo.move_to_end(key)
+            return cached[1]
+    with span("chart_prep", rows=len(df) if df is not None else 0) as chart_span:
+        chart = build_chart(df, max_points, max_bars, partial)
+        chart_span.set(points=len(chart.frame) if chart else 0)
+    try:
+        ref = weakref.ref(df)
+    except TypeError:
+        return chart
+    with _memo_lock:
+        _memo[key] = (ref, chart)
+        while len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+    return chart
@@ -3,5 +3,192 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Schema catalog: on-disk cache location and how often (seconds) to re-check
+# the database for changed table definitions.
+SCHEMA_CACHE_DIR = os.getenv("SCHEMA_CACHE_DIR", os.path.join(PROJECT_ROOT, ".cache", "schema"))
+SCHEMA_REFRESH_INTERVAL = float(os.getenv("SCHEMA_REFRESH_INTERVAL", "300"))
+
+# Schema linking: above SCHEMA_LINKING_MIN_TABLES tables, only the SCHEMA_TOP_K
+# tables most relevant to the question (plus join bridges) are sent to the LLM,
+# capped at roughly SCHEMA_TOKEN_BUDGET prompt tokens.
+SCHEMA_LINKING = os.getenv("SCHEMA_LINKING", "true").lower() in ("1", "true", "yes")
+SCHEMA_LINKING_MIN_TABLES = int(os.getenv("SCHEMA_LINKING_MIN_TABLES", "15"))
+SCHEMA_TOP_K = int(os.getenv("SCHEMA_TOP_K", "8"))
+SCHEMA_TOKEN_BUDGET = int(os.getenv("SCHEMA_TOKEN_BUDGET", "3000"))
+
+# Ollama endpoint. Completions are always streamed and cut off once the SQL
+# statement is complete; OLLAMA_STREAM controls showing partial SQL in the UI.
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434").rstrip("/")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+OLLAMA_STREAM = os.getenv("OLLAMA_STREAM", "true").lower() in ("1", "true", "yes")
+
+# Prompt prefix caching. Prompts start with a part shared by every question
+# (instructions and schema) whose evaluation Ollama keeps in the loaded
+# model's KV cache. OLLAMA_KEEP_ALIVE ("30m", seconds, or -1 for always) keeps
+# the model and that cache loaded between questions; OLLAMA_NUM_CTX fixes the
+# context window (0 leaves the server default), since longer prompts are
+# truncated from the start and changing it reloads the model. OLLAMA_WARMUP
+# loads the model and evaluates the shared prefix when the app starts.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "true").lower() in ("1", "true", "yes")
+
+# Generated-SQL cache. SQL_CACHE_SIMILARITY is the cosine threshold for
+# reusing SQL of a near-duplicate question with the same content words (1.0,
+# the default, disables that tier; use 0.98 or higher);
+# SQL_CACHE_PATH enables a SQLite store shared across sessions and processes.
+SQL_CACHE = os.getenv("SQL_CACHE", "true").lower() in ("1", "true", "yes")
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1000"))
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "86400"))
+SQL_CACHE_SIMILARITY = float(os.getenv("SQL_CACHE_SIMILARITY", "1.0"))
+SQL_CACHE_PATH = os.getenv("SQL_CACHE_PATH", "")
+
+# Generated SQL is cleaned up and validated against the schema catalog before
+# it runs (sqlglot, when installed, enables full parsing and column checks).
+# Invalid SQL is sent back to the model with the problems at most
+# SQL_REPAIR_ATTEMPTS times.
+SQL_VALIDATION = os.getenv("SQL_VALIDATION", "true").lower() in ("1", "true", "yes")
+SQL_REPAIR_ATTEMPTS = int(os.getenv("SQL_REPAIR_ATTEMPTS", "2"))
+
+# Speculative generation. With SQL_CANDIDATES > 1, SQL the cache can't answer
+# is generated that many times in parallel, at the temperatures in
+# SQL_CANDIDATE_TEMPERATURES (each with its own seed). Once one candidate is
+# valid, slower ones get SQL_CANDIDATE_GRACE more seconds. Valid candidates
+# are explained and the SQL_CANDIDATE_RUNS cheapest run at once for up to
+# SQL_CANDIDATE_TIMEOUT seconds; SQL_CANDIDATE_PICK=first takes the first that
+# succeeds, "agreement" the result most candidates return. Each question then
+# uses up to SQL_CANDIDATES generation slots: lower tail latency, less throughput
+# (OLLAMA_NUM_PARALLEL should be at least SQL_CANDIDATES).
+SQL_CANDIDATES = int(os.getenv("SQL_CANDIDATES", "1"))
+SQL_CANDIDATE_TEMPERATURES = os.getenv("SQL_CANDIDATE_TEMPERATURES", "0,0.4,0.7,1.0")
+SQL_CANDIDATE_GRACE = float(os.getenv("SQL_CANDIDATE_GRACE", "0.25"))
+SQL_CANDIDATE_RUNS = int(os.getenv("SQL_CANDIDATE_RUNS", "2"))
+SQL_CANDIDATE_TIMEOUT = float(os.getenv("SQL_CANDIDATE_TIMEOUT", "5"))
+SQL_CANDIDATE_PICK = os.getenv("SQL_CANDIDATE_PICK", "first")
+
+# Few-shot examples: up to FEW_SHOT_K stored question/SQL pairs most similar
+# to the question are added to the prompt, within FEW_SHOT_TOKEN_BUDGET tokens.
+# With FEW_SHOT_CAPTURE, users can confirm an answer's SQL as correct, which
+# adds it to the store for that database.
+FEW_SHOT = os.getenv("FEW_SHOT", "true").lower() in ("1", "true", "yes")
+FEW_SHOT_PATH = os.getenv("FEW_SHOT_PATH", os.path.join(PROJECT_ROOT, ".cache", "examples.db"))
+FEW_SHOT_K = int(os.getenv("FEW_SHOT_K", "3"))
+FEW_SHOT_TOKEN_BUDGET = int(os.getenv("FEW_SHOT_TOKEN_BUDGET", "800"))
+FEW_SHOT_CAPTURE = os.getenv("FEW_SHOT_CAPTURE", "true").lower() in ("1", "true", "yes")
+
+# Query result cache. Frames above RESULT_CACHE_SPILL_BYTES, or pushed out of
+# the RESULT_CACHE_MAX_BYTES memory budget, are spilled to RESULT_CACHE_DIR.
+# RESULT_CACHE_TABLE_TTLS overrides the TTL per table ("events=30,orders=600");
+# RESULT_CACHE_CHANGE_SIGNAL=pg_stat also invalidates on table writes.
+RESULT_CACHE = os.getenv("RESULT_CACHE", "true").lower() in ("1", "true", "yes")
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(PROJECT_ROOT, ".cache", "results"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+RESULT_CACHE_SPILL_BYTES = int(os.getenv("RESULT_CACHE_SPILL_BYTES", str(32 * 1024 * 1024)))
+RESULT_CACHE_MAX_DISK_BYTES = int(os.getenv("RESULT_CACHE_MAX_DISK_BYTES", str(2 * 1024 * 1024 * 1024)))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_TABLE_TTLS = os.getenv("RESULT_CACHE_TABLE_TTLS", "")
+RESULT_CACHE_CHANGE_SIGNAL = os.getenv("RESULT_CACHE_CHANGE_SIGNAL", "none").lower()
+
+# Result materialisation: "chunked" streams rows from a server-side cursor in
+# RESULT_FETCH_CHUNK_ROWS batches; "copy" (PostgreSQL only) parses
+# COPY ... TO STDOUT CSV with the vectorised CSV reader.
+RESULT_FETCH_MODE = os.getenv("RESULT_FETCH_MODE", "chunked").lower()
+RESULT_FETCH_CHUNK_ROWS = int(os.getenv("RESULT_FETCH_CHUNK_ROWS", "50000"))
+
+# Result windowing: generated SELECTs are fetched RESULT_PAGE_SIZE rows at a
+# time; further pages are fetched on demand.
+RESULT_PAGING = os.getenv("RESULT_PAGING", "true").lower() in ("1", "true", "yes")
+RESULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", "1000"))
+
+# Charts: results are reduced to at most CHART_MAX_POINTS points per line
+# (roughly the chart width in pixels) and CHART_MAX_BARS bars before drawing.
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "1000"))
+CHART_MAX_BARS = int(os.getenv("CHART_MAX_BARS", "50"))
+
+# Per-session memo of answered questions (SQL, result pages, charts), so
+# Streamlit reruns don't regenerate or re-query. Bounded per session by entry
+# count and SESSION_MEMO_MAX_BYTES of result frames; pages are fetched again
+# after SESSION_MEMO_TTL seconds.
+SESSION_MEMO_MAX_ENTRIES = int(os.getenv("SESSION_MEMO_MAX_ENTRIES", "10"))
+SESSION_MEMO_MAX_BYTES = int(os.getenv("SESSION_MEMO_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_MEMO_TTL = float(os.getenv("SESSION_MEMO_TTL", "600"))
+
+# Pre-execution guard. Plans whose estimated cost or rows processed exceed
+# the thresholds are rejected, or with QUERY_GUARD_ACTION=downgrade run as a
+# LIMITed variant when that is cheap enough (never when the rows feed an
+# aggregate, sort or join). Every generated query runs under
+# STATEMENT_TIMEOUT_MS (PostgreSQL; 0 disables).
+QUERY_GUARD = os.getenv("QUERY_GUARD", "true").lower() in ("1", "true", "yes")
+QUERY_GUARD_ACTION = os.getenv("QUERY_GUARD_ACTION", "downgrade").lower()
+QUERY_MAX_COST = float(os.getenv("QUERY_MAX_COST", "50000000"))
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "100000000"))
+QUERY_DOWNGRADE_LIMIT = int(os.getenv("QUERY_DOWNGRADE_LIMIT", "1000"))
+STATEMENT_TIMEOUT_MS = int(os.getenv("STATEMENT_TIMEOUT_MS", "30000"))
+
+# Ollama request pipeline: at most OLLAMA_NUM_PARALLEL generations run at
+# once (match the server's OLLAMA_NUM_PARALLEL); up to OLLAMA_MAX_QUEUE more
+# wait in a priority queue, beyond which new requests are refused.
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+OLLAMA_MAX_QUEUE = int(os.getenv("OLLAMA_MAX_QUEUE", "64"))
+OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "3"))
+
+# Data sources. DATABASE_URL (with DATABASE_REPLICA_URL) is the source named
+# DATA_SOURCE_DEFAULT; DATA_SOURCES adds more as "sales=postgresql://...;
+# local=./shop.sqlite" (paths of .db/.sqlite/.sqlite3/.duckdb files work as
+# URLs), and DATA_SOURCES_FILE as JSON {"name": {"url", "replica_url",
+# "description"}}. Engines start on first use and are disposed after
+# DATA_SOURCE_IDLE_TIMEOUT seconds unused (0 keeps them). With
+# DATA_SOURCE_ROUTING, a question without an explicit source goes to the
+# source whose schema covers it best.
+DATA_SOURCES = os.getenv("DATA_SOURCES", "")
+DATA_SOURCES_FILE = os.getenv("DATA_SOURCES_FILE", "")
+DATA_SOURCE_DEFAULT = os.getenv("DATA_SOURCE_DEFAULT", "default")
+DATA_SOURCE_IDLE_TIMEOUT = float(os.getenv("DATA_SOURCE_IDLE_TIMEOUT", "900"))
+DATA_SOURCE_ROUTING = os.getenv("DATA_SOURCE_ROUTING", "true").lower() in ("1", "true", "yes")
+
+# Connection pool and session settings. DATABASE_REPLICA_URL, when set, is
+# used for the generated analytical queries; schema reflection stays on
+# DATABASE_URL. DB_READ_ONLY makes every transaction read-only.
+# DB_QUERY_WORKERS threads run generated queries; by default one per pooled
+# connection, since more would only queue for a checkout.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "2"))
+DB_QUERY_WORKERS = int(os.getenv("DB_QUERY_WORKERS", str(DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW)))
+DB_READ_ONLY = os.getenv("DB_READ_ONLY", "true").lower() in ("1", "true", "yes")
+DB_SEARCH_PATH = os.getenv("DB_SEARCH_PATH", "")
+
+# Instrumentation: per-stage spans for each question. TRACE_SINKS is a comma
+# list of "jsonl" (TRACE_JSONL_PATH) and "prometheus" (/metrics on
+# TRACE_PROMETHEUS_HOST:TRACE_PROMETHEUS_PORT, local only by default; use
+# 0.0.0.0 to let a remote scraper in); the in-app timing panel is always available.
+INSTRUMENTATION = os.getenv("INSTRUMENTATION", "true").lower() in ("1", "true", "yes")
+TRACE_SINKS = os.getenv("TRACE_SINKS", "")
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", os.path.join(PROJECT_ROOT, "traces.jsonl"))
+TRACE_PROMETHEUS_HOST = os.getenv("TRACE_PROMETHEUS_HOST", "127.0.0.1")
+TRACE_PROMETHEUS_PORT = int(os.getenv("TRACE_PROMETHEUS_PORT", "9464"))
+
+# HTTP API service (python -m app.api). Each of the API_WORKERS processes has
+# its own pools, caches and OLLAMA_NUM_PARALLEL generation slots. When
+# API_URL is set, the Streamlit UI calls that service instead of running the
+# pipeline in-process.
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+API_URL = os.getenv("API_URL", "").rstrip("/")
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "300"))
+# Signs the tokens /sql returns, which /remember and /accept require; required by the
+# API service and the same for every worker. API_MAX_PAGE_SIZE caps the rows
+# one /query or /ask request may ask for.
+API_SECRET = os.getenv("API_SECRET", "")
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "10000"))
@@ -0,0 +1,285 @@
+"""Registry of named data sources, so one deployment can answer questions about several databases.
+
+Each source has its own pooled engine (and read-replica engine), schema
+catalog, caches keyed by its fingerprint, and SQL dialect for the prompt.
+Engines are created on first use and disposed after
+``DATA_SOURCE_IDLE_TIMEOUT`` seconds without use; the catalog stays on disk,
+so coming back is cheap. ``DATABASE_URL`` is the source named
+``DATA_SOURCE_DEFAULT``; ``DATA_SOURCES`` and ``DATA_SOURCES_FILE`` add more.
+
+The database functions in :mod:`app.db_config` act on the current source,
+which :func:`use_source` sets for the calling context (threads started with a
+copied context keep it). Questions without an explicit source can be routed
+to the source whose schema covers them best (:meth:`DataSourceRegistry.route`).
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from .config import (DATA_SOURCE_DEFAULT, DATA_SOURCE_IDLE_TIMEOUT, DATA_SOURCES, DATA_SOURCES_FILE,
+                     DATABASE_REPLICA_URL, DATABASE_URL)
+from .db_pool import build_engine, warm_up
+from .errors import DatabaseError, UnknownDataSource
+from .instrumentation import span
+
+# Local database files can be named by path instead of URL
+_FILE_SCHEMES = {".db": "sqlite", ".sqlite": "sqlite", ".sqlite3": "sqlite", ".duckdb": "duckdb"}
+
+_current = contextvars.ContextVar("data_source", default=None)
+
+
+def normalise_url(url):
+    """A SQLAlchemy URL for ``url``; paths of SQLite and DuckDB files become ``sqlite:///``/``duckdb:///`` URLs."""
+    url = url.strip()
+    if "://" not in url:
+        scheme = _FILE_SCHEMES.get(os.path.splitext(url)[1].lower())
+        if scheme:
+            return f"{scheme}:///{os.path.abspath(url)}"
+    return url
+
+
+@dataclass
+class DataSource:
+    name: str
+    url: str
+    replica_url: str = None
+    description: str = ""
+    last_used: float = 0.0
+    _engine: object = field(default=None, repr=False)
+    _query_engine: object = field(default=None, repr=False)
+    _lock: object = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def dialect(self):
+        """SQLAlchemy dialect name, known without connecting."""
+        from sqlalchemy.engine import make_url
+
+        return make_url(self.url).get_backend_name()
+
+    @property
+    def fingerprint(self):
+        from .schema_catalog import url_fingerprint
+
+        return url_fingerprint(self.url)
+
+    @property
+    def active(self):
+        return self._engine is not None
+
+    def get_engine(self):
+        """Primary engine: explicitly sized pool, pre-ping, recycling, warmed up on creation."""
+        self.last_used = time.monotonic()
+        engine = self._engine
+        if engine is not None:
+            return engine
+        with self._lock:
+            if self._engine is None:
+                try:
+                    engine = build_engine(self.url)
+                    warm_up(engine)
+                except Exception as e:
+                    from sqlalchemy.engine import make_url
+                    raise DatabaseError(f"Error connecting to database {self.name!r}: {e} "
+                                        f"(connection string used: {make_url(self.url)})") from e
+                self._engine = engine
+            return self._engine
+
+    def get_query_engine(self):
+        """Engine for generated analytical queries: the read replica when one is configured."""
+        if not self.replica_url:
+            return self.get_engine()
+        self.last_used = time.monotonic()
+        if self._query_engine is None:
+            with self._lock:
+                if self._query_engine is None:
+                    try:
+                        engine = build_engine(self.replica_url, read_only=True)
+                        warm_up(engine)
+                    except Exception as e:
+                        print(f"--> data_sources: Replica of {self.name!r} unavailable, using primary: {e}")
+                        engine = False
+                    self._query_engine = engine
+        return self._query_engine or self.get_engine()
+
+    def close(self):
+        """Disposes the engines and drops the in-memory catalog; the next use starts them again."""
+        from .schema_catalog import release
+        from .schema_linking import drop_indexes
+
+        with self._lock:
+            engines = [e for e in (self._engine, self._query_engine) if e]
+            self._engine = self._query_engine = None
+        for engine in engines:
+            release(engine)
+            engine.dispose()
+        drop_indexes(self.fingerprint)
+        return bool(engines)
+
+
+class DataSourceRegistry:
+    def __init__(self, sources, default=None, idle_timeout=DATA_SOURCE_IDLE_TIMEOUT):
+        self.sources = {source.name: source for source in sources}
+        self.default = default if default in self.sources else next(iter(self.sources), None)
+        self.idle_timeout = idle_timeout
+        self.evictions = 0
+        self._last_sweep = time.monotonic()
+        self._sweep_lock = threading.Lock()
+
+    def names(self):
+        return list(self.sources)
+
+    def get(self, name=None):
+        """The source called ``name`` (the default one for None); raises UnknownDataSource for other names."""
+        self._evict_idle()
+        if name is None:
+            name = self.default
+            if name is None:
+                raise DatabaseError("DATABASE_URL not found in environment variables. Please check your .env file.")
+        source = self.sources.get(name)
+        if source is None:
+            raise UnknownDataSource(f"Unknown data source {name!r}; configured: {', '.join(self.sources) or 'none'}")
+        return source
+
+    def _evict_idle(self):
+        """Disposes sources unused for ``idle_timeout`` seconds; checked at most every tenth of it."""
+        if self.idle_timeout <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_sweep < self.idle_timeout / 10 or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = now
+            for source in self.sources.values():
+                if source.active and now - source.last_used > self.idle_timeout and source.close():
+                    self.evictions += 1
+                    print(f"--> data_sources: Closed {source.name!r} after "
+                          f"{now - source.last_used:.0f}s idle")
+        finally:
+            self._sweep_lock.release()
+
+    def route(self, question):
+        """Name of the source whose schema covers ``question`` best; the default on a tie or no match."""
+        if len(self.sources) <= 1:
+            return self.default
+        with span("route") as route_span:
+            scores = self.scores(question)
+            name = self.default
+            best = max(scores.values(), default=0.0)
+            # Ties (including no match at all) go to the default source
+            if best > 0 and scores.get(self.default) != best:
+                name = next(n for n, score in scores.items() if score == best)
+            route_span.set(source=name, score=round(best, 2), candidates=len(scores))
+        return name
+
+    def scores(self, question):
+        """``{name: coverage}`` of ``question`` by each source's schema; unreachable sources are skipped."""
+        from .schema_catalog import get_catalog, peek_catalog
+        from .schema_linking import get_index
+
+        scores = {}
+        for name, source in self.sources.items():
+            # The cached catalog (in memory or on disk) is good enough for routing; only
+            # a source that was never seen has to connect
+            catalog = peek_catalog(source.fingerprint)
+            if catalog is None:
+                try:
+                    catalog = get_catalog(source.get_engine())
+                except Exception as e:
+                    print(f"--> data_sources: Not routing to {name!r}: {e}")
+                    continue
+            scores[name] = get_index(catalog).coverage(question)
+        return scores
+
+    def describe(self):
+        """Name, dialect and description of every source, default first."""
+        ordered = sorted(self.sources.values(), key=lambda s: s.name != self.default)
+        return [{"name": s.name, "dialect": s.dialect, "description": s.description, "default": s.name == self.default}
+                for s in ordered]
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "default": self.default,
+            "evictions": self.evictions,
+            "sources": {
+                name: {"active": source.active,
+                       "idle_seconds": round(now - source.last_used, 1) if source.last_used else None}
+                for name, source in self.sources.items()
+            },
+        }
+
+
+def parse_sources(spec):
+    """``"name=url;name=url"`` -> ``[DataSource]``."""
+    sources = []
+    for item in filter(None, (s.strip() for s in spec.split(";"))):
+        name, _, url = item.partition("=")
+        if not url.strip():
+            raise ValueError(f"DATA_SOURCES entry {item!r} is not name=url")
+        sources.append(DataSource(name.strip(), normalise_url(url)))
+    return sources
+
+
+def load_sources_file(path):
+    """``{"name": {"url", "replica_url"?, "description"?}}`` (or ``{"name": "url"}``) -> ``[DataSource]``."""
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    sources = []
+    for name, entry in data.items():
+        if isinstance(entry, str):
+            entry = {"url": entry}
+        replica = entry.get("replica_url")
+        sources.append(DataSource(name, normalise_url(entry["url"]), normalise_url(replica) if replica else None,
+                                  entry.get("description", "")))
+    return sources
+
+
+def configured_sources():
+    """Sources from DATABASE_URL, DATA_SOURCES and DATA_SOURCES_FILE (later ones win on a name clash)."""
+    sources = {}
+    if DATABASE_URL:
+        sources[DATA_SOURCE_DEFAULT] = DataSource(DATA_SOURCE_DEFAULT, normalise_url(DATABASE_URL),
+                                                  DATABASE_REPLICA_URL or None)
+    for source in parse_sources(DATA_SOURCES):
+        sources[source.name] = source
+    if DATA_SOURCES_FILE:
+        for source in load_sources_file(DATA_SOURCES_FILE):
+            sources[source.name] = source
+    return list(sources.values())
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Process-wide registry shared by all Streamlit sessions."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = DataSourceRegistry(configured_sources(), DATA_SOURCE_DEFAULT)
+    return _registry
+
+
+def current_source():
+    """The source selected with :func:`use_source` in this context, or the default one."""
+    return get_registry().get(_current.get())
+
+
+@contextmanager
+def use_source(name):
+    """Makes ``name`` the current source for the block; None keeps the current one."""
+    if name is None:
+        yield current_source()
+        return
+    source = get_registry().get(name)
+    token = _current.set(source.name)
+    try:
+        yield source
+    finally:
+        _current.reset(token)
@@ -1,70 +1,167 @@
-from langchain_community.utilities import SQLDatabase
-from app.config import DATABASE_URL
-import streamlit as st
-from sqlalchemy import text
-import pandas as pd
-
-@st.cache_resource
-def get_db():
-    if not DATABASE_URL:
-        st.error("DATABASE_URL not found in environment variables. Please check your .env file.")
-        st.stop()
+from app.config import (DB_QUERY_WORKERS, RESULT_CACHE, RESULT_CACHE_CHANGE_SIGNAL, RESULT_PAGE_SIZE,
+                        SCHEMA_LINKING, SCHEMA_LINKING_MIN_TABLES, STATEMENT_TIMEOUT_MS)
+from app.data_sources import current_source
+from app.db_pool import pool_stats
+from app.errors import DatabaseError, QueryError
+from app.instrumentation import span
+from app.materialize import fetch_frame
+from app.pagination import count_sql, estimate_row_count, is_pageable, page_sql
+from app.query_guard import GuardResult, guard
+from app.result_cache import get_result_cache, normalise_sql, postgres_change_signal, referenced_tables
+from app.schema_catalog import database_fingerprint, get_catalog
+from app.schema_linking import build_schema_context
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# Runs queries off the script thread so a Streamlit stop/rerun can cancel them
+_query_workers = ThreadPoolExecutor(max_workers=DB_QUERY_WORKERS, thread_name_prefix="run_query")
+
+def get_engine():
+    """Primary engine of the current data source (see :mod:`app.data_sources`)."""
+    return current_source().get_engine()
+
+def get_query_engine():
+    """Engine for generated analytical queries: the current source's read replica when one is configured."""
+    return current_source().get_query_engine()
+
+def get_pool_stats():
+    """Pool utilisation of the primary engine and, if separate, the replica engine."""
+    stats = {"primary": pool_stats(get_engine())}
+    if get_query_engine() is not get_engine():
+        stats["replica"] = pool_stats(get_query_engine())
+    return stats
+
+def get_schema_catalog():
+    """Returns the structured, cached schema catalog for the current data source."""
+    engine = get_engine()
     try:
-        db = SQLDatabase.from_uri(
-            DATABASE_URL,
-            sample_rows_in_table_info=0  # Disable sample rows
-        )
-        db.run("SELECT 1")
-        return db
+        return get_catalog(engine)
     except Exception as e:
-        st.error(f"Error connecting to database: {e}")
-        st.error(f"Connection String used (check credentials/host): {DATABASE_URL}")
-        st.stop()
+        raise DatabaseError(f"Error getting table schema: {e}") from e
 
-def get_schema():
-    db_conn = get_db()
+def get_schema(question=None):
+    """Returns schema DDL for the prompt, pruned to the tables relevant to ``question`` on large databases."""
     try:
-        info = db_conn.get_table_info()
-        return info
+        with span("schema_fetch") as schema_span:
+            # Served from the cached catalog; only changed tables are reflected again
+            catalog = get_schema_catalog()
+            linked = bool(question and SCHEMA_LINKING and len(catalog.tables) > SCHEMA_LINKING_MIN_TABLES)
+            schema = build_schema_context(catalog, question) if linked else catalog.render()
+            schema_span.set(tables=len(catalog.tables), linked=linked)
+            return schema
+    except DatabaseError:
+        raise
     except Exception as e:
-        st.error(f"Error getting table schema: {e}")
-        st.stop()
+        raise DatabaseError(f"Error getting table schema: {e}") from e
+
+def _result_cache():
+    cache = get_result_cache()
+    source = current_source()
+    if RESULT_CACHE_CHANGE_SIGNAL == "pg_stat" and source.dialect == "postgresql":
+        database = database_fingerprint(source.get_query_engine())
+        if not cache.has_change_signal(database):
+            # Write counters live on the primary; a replica's pg_stat doesn't see replayed writes
+            cache.set_change_signal(postgres_change_signal(source.get_engine), database)
+    return cache
 
-def run_query(sql):
-    db_conn = get_db() # Langchain SQLDatabase object
-    engine = db_conn._engine # Access the underlying SQLAlchemy engine
+def _set_statement_timeout(connection, timeout_ms):
+    if timeout_ms and connection.dialect.name == "postgresql":
+        # SET LOCAL only lasts for this transaction, so pooled connections stay unaffected
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+def _cancel(connection):
+    raw = connection.connection.dbapi_connection
+    cancel = getattr(raw, "cancel", None) or getattr(raw, "interrupt", None)  # psycopg2 / sqlite3
+    if cancel:
+        cancel()
+
+def _run_cancellable(connection, fn, on_wait):
+    """Runs ``fn`` in a worker, calling ``on_wait`` while it runs; cancels the query if interrupted."""
+    if on_wait is None:
+        return fn()
+    # Copy the context so spans recorded in the worker land in the caller's trace
+    future = _query_workers.submit(contextvars.copy_context().run, fn)
+    try:
+        while True:
+            try:
+                return future.result(timeout=0.25)
+            except FutureTimeout:
+                on_wait()
+    except BaseException:
+        # Includes Streamlit's stop/rerun exceptions raised from on_wait
+        if not future.done():
+            print("--> run_query: Cancelling running query")
+        while not future.done():
+            # A cancel sent before the statement starts is lost, so repeat it until the worker stops
+            _cancel(connection)
+            try:
+                future.result(timeout=0.25)
+            except FutureTimeout:
+                pass
+            except Exception:
+                break
+        raise
+
+def check_query(sql):
+    """Runs the EXPLAIN-based guard; queries that can't be explained are passed through."""
+    engine = get_query_engine()
     try:
         with engine.connect() as connection:
-            result_proxy = connection.execute(text(sql)) # Use SQLAlchemy text for safety
-            # Get column names first
-            columns = list(result_proxy.keys())
-            
-            # Fetch and convert data more carefully
-            data_list = []
-            for row in result_proxy.fetchall():
-                # Convert each row to a list of values, handling potential special types
-                row_values = []
-                for value in row:
-                    # Convert any special types to their string representation if needed
-                    if value is None:
-                        row_values.append(None)
-                    else:
-                        try:
-                            # Try direct conversion first
-                            row_values.append(value)
-                        except:
-                            # Fallback to string representation
-                            row_values.append(str(value))
-                data_list.append(row_values)
-            
-            print(f"--> run_query: Columns: {columns}")
-            print(f"--> run_query: First row (if any): {data_list[0] if data_list else 'No data'}")
-            
-            # Create DataFrame with processed data
-            df = pd.DataFrame(data_list, columns=columns)
+            return guard(connection, sql)
+    except Exception as e:
+        print(f"--> check_query: EXPLAIN failed, skipping guard: {e}")
+        return GuardResult("run", sql)
+
+def run_query(sql, on_wait=None, timeout_ms=STATEMENT_TIMEOUT_MS, refresh=False):
+    """Runs ``sql`` and returns a DataFrame, served from the result cache when possible.
+
+    ``refresh`` skips the cache lookup; the new result replaces the cached one.
+    Raises QueryError when the query fails.
+    """
+    engine = get_query_engine()
+    cache = _result_cache() if RESULT_CACHE else None
+    if cache:
+        cache_key = (database_fingerprint(engine), normalise_sql(sql))
+    if cache and not refresh:
+        with span("result_cache") as cache_span:
+            cached = cache.get(cache_key)
+            cache_span.set(hit=cached is not None)
+        if cached is not None:
+            return cached
+    try:
+        with engine.connect() as connection:
+            _set_statement_timeout(connection, timeout_ms)
+            # Columns are built directly from a chunked server-side cursor
+            df = _run_cancellable(connection, lambda: fetch_frame(connection, sql), on_wait)
+            if cache:
+                cache.put(cache_key, df, referenced_tables(sql, get_schema_catalog().tables))
             return df
     except Exception as e:
-        st.error(f"Error running SQL query: {e}")
-        st.code(sql, language="sql")
-        # Return empty DataFrame on error
-        return pd.DataFrame()
+        raise QueryError(f"Error running SQL query: {e}", sql) from e
+
+def run_query_page(sql, page=0, page_size=RESULT_PAGE_SIZE, on_wait=None, refresh=False):
+    """Runs one page of a SELECT. Returns ``(frame, has_more)``."""
+    if not is_pageable(sql):
+        return run_query(sql, on_wait=on_wait, refresh=refresh), False
+    df = run_query(page_sql(sql, page, page_size), on_wait=on_wait, refresh=refresh)
+    has_more = len(df) > page_size
+    if has_more:
+        df = df.iloc[:page_size]
+    return df, has_more
+
+def count_rows(sql, exact=False):
+    """Returns ``(row_count, is_exact)``; uses the planner estimate unless ``exact`` is set."""
+    from sqlalchemy import text
+
+    engine = get_query_engine()
+    try:
+        with engine.connect() as connection:
+            if not exact:
+                estimate = estimate_row_count(connection, sql)
+                if estimate is not None:
+                    return estimate, False
+            return int(connection.execute(text(count_sql(sql))).scalar()), True
+    except Exception as e:
+        print(f"--> count_rows: Could not count rows: {e}")
+        return None, False
@@ -0,0 +1,104 @@
+"""SQLAlchemy engine construction with explicit pool and session settings."""
+import time
+
+from .config import (
+    DB_POOL_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_WARMUP,
+    DB_READ_ONLY,
+    DB_SEARCH_PATH,
+    STATEMENT_TIMEOUT_MS,
+)
+
+APPLICATION_NAME = "text2sql"
+
+
+def build_engine(url, read_only=DB_READ_ONLY, statement_timeout_ms=STATEMENT_TIMEOUT_MS,
+                 search_path=DB_SEARCH_PATH):
+    """Creates an engine with a tuned QueuePool and per-connection session settings.
+
+    Pre-ping replaces connections that died (e.g. after a failover) before
+    they are handed out; recycling bounds connection age; LIFO checkout lets
+    idle surplus connections time out server-side instead of being kept warm.
+    """
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.engine import make_url
+
+    backend = make_url(url).get_backend_name()
+    kwargs = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if backend != "sqlite":
+        kwargs.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_POOL_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_use_lifo=True,
+        )
+    if backend == "duckdb" and read_only:
+        kwargs["connect_args"] = {"read_only": True}
+    engine = create_engine(url, **kwargs)
+
+    if backend == "postgresql":
+        settings = [f"SET application_name = '{APPLICATION_NAME}'"]
+        if statement_timeout_ms:
+            settings.append(f"SET statement_timeout = {int(statement_timeout_ms)}")
+        if read_only:
+            settings.append("SET default_transaction_read_only = on")
+        if search_path:
+            settings.append(f"SET search_path TO {search_path}")
+
+        @event.listens_for(engine, "connect")
+        def _configure_session(dbapi_connection, connection_record):
+            autocommit = dbapi_connection.autocommit
+            dbapi_connection.autocommit = True
+            cursor = dbapi_connection.cursor()
+            try:
+                for statement in settings:
+                    cursor.execute(statement)
+            finally:
+                cursor.close()
+                dbapi_connection.autocommit = autocommit
+    elif backend == "sqlite" and read_only:
+        @event.listens_for(engine, "connect")
+        def _configure_session(dbapi_connection, connection_record):
+            dbapi_connection.execute("PRAGMA query_only = ON")
+
+    return engine
+
+
+def warm_up(engine, connections=DB_POOL_WARMUP):
+    """Opens ``connections`` pooled connections up front so first queries skip the handshake."""
+    from sqlalchemy import text
+
+    start = time.perf_counter()
+    held = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            held.append(conn)
+    finally:
+        for conn in held:
+            conn.close()
+    print(f"--> db_pool: Warmed {len(held)} connection(s) in {time.perf_counter() - start:.2f}s")
+    return len(held)
+
+
+def pool_stats(engine):
+    """Current pool utilisation for an engine."""
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__, "status": pool.status()}
+    if hasattr(pool, "checkedout"):
+        size = pool.size()
+        checked_out = pool.checkedout()
+        stats.update(
+            size=size,
+            checked_out=checked_out,
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            utilisation=round(checked_out / max(size + DB_POOL_MAX_OVERFLOW, 1), 3),
+        )
+    return stats
@@ -0,0 +1,55 @@
+"""Exceptions raised by the question -> SQL -> result pipeline.
+
+Kept free of heavy imports so thin clients (:mod:`app.api_client`) can raise
+the same types without loading the database stack. LLM failures are
+``LLMError`` / ``LLMBusyError`` from :mod:`app.llm_client`.
+"""
+
+
+class DatabaseError(Exception):
+    """The database is not configured or reachable, or its schema could not be read."""
+
+
+class UnknownDataSource(DatabaseError):
+    """A data source name that isn't configured."""
+
+
+class QueryError(DatabaseError):
+    """A generated query failed to run."""
+
+    def __init__(self, message, sql):
+        super().__init__(message)
+        self.sql = sql
+
+
+class QueryNotAllowed(QueryError):
+    """Client-supplied SQL that is not a single read-only query over the schema."""
+
+    def __init__(self, message, sql, problems):
+        super().__init__(message, sql)
+        self.problems = problems
+
+
+class SqlExtractionError(Exception):
+    """The model's response contained no SQL."""
+
+    def __init__(self, message, response):
+        super().__init__(message)
+        self.response = response
+
+
+class SqlValidationError(SqlExtractionError):
+    """The generated SQL failed local validation, including after the allowed repair attempts."""
+
+    def __init__(self, message, response, sql, problems):
+        super().__init__(message, response)
+        self.sql = sql
+        self.problems = problems
+
+
+class QueryRejected(Exception):
+    """The query guard refused to run the statement."""
+
+    def __init__(self, guard_result):
+        super().__init__(guard_result.reason)
+        self.guard = guard_result
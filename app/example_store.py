@@ -0,0 +1,278 @@
+"""Few-shot example store: verified question/SQL pairs retrieved for the prompt.
+
+Pairs and their question terms (tokenised and stemmed like schema linking)
+live in a SQLite file. Ranking is BM25 over an inverted index of NumPy
+posting arrays built from that file on first use; rows added since, by this
+or any other process, are appended to it on the next lookup instead of
+rebuilding. Lookups take about a millisecond with 100k examples. Pairs come
+from ``python -m app.example_store import`` and from SQL a user confirmed as
+correct (``FEW_SHOT_CAPTURE``). Examples are scoped to the fingerprint of the
+database they were written for; imported pairs can be offered for any database.
+
+    python -m app.example_store import verified.jsonl
+    python -m app.example_store search "revenue by month"
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from .config import FEW_SHOT_K, FEW_SHOT_PATH, FEW_SHOT_TOKEN_BUDGET
+from .schema_linking import estimate_tokens, tokenize
+from .sql_cache import normalise_question
+
+ANY_DATABASE = "*"
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Candidates ranked per requested example, leaving room for the token budget
+CANDIDATES_PER_EXAMPLE = 4
+
+
+class _Bm25Index:
+    """Inverted index over example terms; documents are numbered in insertion order."""
+
+    def __init__(self):
+        import numpy as np
+
+        self.last_id = 0
+        self.ids = np.zeros(0, dtype=np.int64)  # document -> examples.id
+        self.lengths = np.zeros(0, dtype=np.float32)
+        self.databases = np.zeros(0, dtype=np.int32)  # document -> fingerprint code
+        self.codes = {}  # fingerprint -> code
+        self.postings = {}  # term -> documents containing it
+        self._weights = None  # per-document BM25 length normalisation
+
+    def extend(self, rows):
+        """Appends ``[(id, fingerprint, terms)]`` with ids above ``last_id``."""
+        import numpy as np
+
+        if not rows:
+            return
+        base = len(self.ids)
+        new_postings = defaultdict(list)
+        lengths, databases = [], []
+        for offset, (_, fingerprint, terms) in enumerate(rows):
+            unique = set(terms.split())
+            for term in unique:
+                new_postings[term].append(base + offset)
+            lengths.append(len(unique))
+            databases.append(self.codes.setdefault(fingerprint, len(self.codes)))
+        self.ids = np.concatenate([self.ids, np.array([row[0] for row in rows], dtype=np.int64)])
+        self.lengths = np.concatenate([self.lengths, np.array(lengths, dtype=np.float32)])
+        self.databases = np.concatenate([self.databases, np.array(databases, dtype=np.int32)])
+        for term, docs in new_postings.items():
+            docs = np.array(docs, dtype=np.int32)
+            existing = self.postings.get(term)
+            self.postings[term] = docs if existing is None else np.concatenate([existing, docs])
+        self.last_id = rows[-1][0]
+        self._weights = None
+
+    def top(self, terms, fingerprints, n):
+        """Ids of the ``n`` best-scoring examples for ``terms`` among ``fingerprints``."""
+        import numpy as np
+
+        total = len(self.ids)
+        if not total:
+            return []
+        allowed = [self.codes[f] for f in fingerprints if f in self.codes]
+        if not allowed:
+            return []
+        if self._weights is None:
+            # Questions rarely repeat a term, so each posting counts once (tf = 1)
+            self._weights = (K1 + 1) / (1 + K1 * (1 - B + B * self.lengths / self.lengths.mean()))
+        weights = self._weights
+        scores = np.zeros(total, dtype=np.float32)
+        for term in terms:
+            docs = self.postings.get(term)
+            if docs is None:
+                continue
+            idf = math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * weights[docs]
+        if len(allowed) < len(self.codes):
+            scores[~np.isin(self.databases, allowed)] = 0
+        n = min(n, total)
+        best = np.argpartition(-scores, n - 1)[:n]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [int(self.ids[doc]) for doc in best if scores[doc] > 0]
+
+
+class ExampleStore:
+    """SQLite store of question/SQL pairs with an in-memory BM25 index."""
+
+    def __init__(self, path=FEW_SHOT_PATH):
+        self.path = path
+        self.lookups = 0
+        self.hits = 0
+        self._index = None
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS examples (
+                    id INTEGER PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    normalised TEXT NOT NULL,
+                    terms TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    UNIQUE (fingerprint, normalised)
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, fingerprint, question, sql, source="accepted"):
+        """Adds or updates one pair; returns True when it was new."""
+        return self.add_many(fingerprint, [(question, sql)], source) == 1
+
+    def add_many(self, fingerprint, pairs, source="import"):
+        """Adds ``[(question, sql)]`` in one transaction; returns how many were new.
+
+        The index picks new rows up on the next lookup.
+        """
+        added = 0
+        now = time.time()
+        with self._connect() as conn:
+            for question, sql in pairs:
+                normalised = normalise_question(question)
+                terms = " ".join(sorted(set(tokenize(normalised))))
+                if not terms or not sql.strip():
+                    continue
+                # Same normalised question, same terms: only the pair itself changes
+                updated = conn.execute(
+                    "UPDATE examples SET question = ?, sql = ?, source = ?, created_at = ? "
+                    "WHERE fingerprint = ? AND normalised = ?",
+                    (question, sql.strip(), source, now, fingerprint, normalised),
+                ).rowcount
+                if not updated:
+                    conn.execute(
+                        "INSERT INTO examples (fingerprint, normalised, terms, question, sql, source, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (fingerprint, normalised, terms, question, sql.strip(), source, now),
+                    )
+                    added += 1
+        return added
+
+    def search(self, fingerprint, question, k=FEW_SHOT_K, token_budget=FEW_SHOT_TOKEN_BUDGET):
+        """Returns up to ``k`` ``(question, sql)`` pairs most similar to ``question``, best first,
+        together no larger than ``token_budget`` prompt tokens."""
+        if k <= 0:
+            return []
+        terms = set(tokenize(normalise_question(question)))
+        if not terms:
+            return []
+        with self._connect() as conn:
+            with self._lock:
+                self.lookups += 1
+                index = self._refresh(conn)
+                ids = index.top(terms, (fingerprint, ANY_DATABASE), k * CANDIDATES_PER_EXAMPLE)
+            if not ids:
+                return []
+            placeholders = ",".join("?" * len(ids))
+            rows = dict((row[0], row[1:]) for row in conn.execute(
+                f"SELECT id, question, sql FROM examples WHERE id IN ({placeholders})", ids))
+        examples = []
+        used = 0
+        for example_id in ids:
+            example_question, sql = rows[example_id]
+            cost = estimate_tokens(example_question) + estimate_tokens(sql) + 4
+            if used + cost > token_budget:
+                continue
+            examples.append((example_question, sql))
+            used += cost
+            if len(examples) == k:
+                break
+        if examples:
+            self.hits += 1
+        return examples
+
+    def _refresh(self, conn):
+        """Loads rows added since the last lookup, by any process, into the index."""
+        if self._index is None:
+            self._index = _Bm25Index()
+        self._index.extend(conn.execute(
+            "SELECT id, fingerprint, terms FROM examples WHERE id > ? ORDER BY id",
+            (self._index.last_id,)).fetchall())
+        return self._index
+
+    def stats(self):
+        with self._connect() as conn:
+            size = conn.execute("SELECT count(*) FROM examples").fetchone()[0]
+        return {"examples": size, "lookups": self.lookups, "hits": self.hits}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_example_store():
+    """Process-wide store shared by all Streamlit sessions."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ExampleStore()
+    return _store
+
+
+def read_pairs(path):
+    """Returns ``[(question, sql)]`` from a CSV or JSON-lines file with ``question`` and ``sql``."""
+    with open(path, newline="", encoding="utf-8") as fh:
+        if path.endswith((".jsonl", ".ndjson")):
+            rows = [json.loads(line) for line in fh if line.strip()]
+        else:
+            rows = list(csv.DictReader(fh))
+    return [(row["question"].strip(), row["sql"].strip()) for row in rows
+            if (row.get("question") or "").strip() and (row.get("sql") or "").strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="add verified pairs from a CSV or JSONL file")
+    importer.add_argument("path")
+    importer.add_argument("--any-database", action="store_true",
+                          help="offer the pairs for every database instead of the configured one")
+    searcher = commands.add_parser("search", help="show the examples retrieved for a question")
+    searcher.add_argument("question")
+    searcher.add_argument("-k", type=int, default=FEW_SHOT_K)
+    args = parser.parse_args()
+
+    store = get_example_store()
+    if args.command == "import" and args.any_database:
+        fingerprint = ANY_DATABASE
+    else:
+        from .db_config import get_schema_catalog
+
+        fingerprint = get_schema_catalog().fingerprint
+    if args.command == "import":
+        pairs = read_pairs(args.path)
+        added = store.add_many(fingerprint, pairs, source="import")
+        print(f"--> example_store: Imported {added} new pair(s) of {len(pairs)} into {store.path}")
+        return
+    started = time.perf_counter()
+    examples = store.search(fingerprint, args.question, k=args.k)
+    print(f"--> example_store: {len(examples)} example(s) in {(time.perf_counter() - started) * 1000:.1f} ms")
+    for question, sql in examples:
+        print(f"\n{question}\n{sql}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""Per-stage latency spans for the question pipeline, with pluggable sinks.
+
+A trace is started per question; ``span()`` blocks inside it record their
+duration and attributes (token, row and byte counts). Finished traces are
+handed to every registered sink: JSON lines, a Prometheus text endpoint, or
+the in-app timing panel that reads :func:`current_trace`.
+
+When instrumentation is disabled, or no trace is active, ``span()`` returns
+a shared no-op object, so instrumented code pays one function call.
+
+The trace and the nesting depth live in context variables, so work handed to
+another thread with ``contextvars.copy_context()`` adds its spans to the same
+trace, nested under the span that handed it off, without racing other threads.
+"""
+import contextvars
+import json
+import threading
+import time
+
+from .config import INSTRUMENTATION, TRACE_JSONL_PATH, TRACE_PROMETHEUS_HOST, TRACE_PROMETHEUS_PORT, TRACE_SINKS
+
+_current = contextvars.ContextVar("text2sql_trace", default=None)
+# Open spans around the current point of this context (thread or copied context)
+_depth = contextvars.ContextVar("text2sql_span_depth", default=0)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("trace", "name", "attrs", "start", "duration", "depth", "error", "_token")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.duration = None
+        self.error = None
+
+    def __enter__(self):
+        self.depth = _depth.get()
+        self._token = _depth.set(self.depth + 1)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        _depth.reset(self._token)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.trace.spans.append(self)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        data = {
+            "name": self.name,
+            "offset": round(self.start - self.trace.start, 6),
+            "duration": round(self.duration, 6),
+            "depth": self.depth,
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class Trace:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans = []
+
+    def record(self, name, duration, **attrs):
+        """Adds a span measured elsewhere (e.g. queue wait reported by the LLM client)."""
+        span = Span(self, name, attrs)
+        span.depth = _depth.get()
+        span.start = time.perf_counter() - duration
+        span.duration = duration
+        self.spans.append(span)
+
+    def to_dict(self):
+        return {
+            "trace": self.name,
+            "started_at": self.started_at,
+            "duration": round(self.duration or 0.0, 6),
+            "attrs": self.attrs,
+            "spans": [s.to_dict() for s in sorted(self.spans, key=lambda s: s.start)],
+        }
+
+
+def start_trace(name, **attrs):
+    """Starts a trace for the current context (Streamlit script thread, worker...)."""
+    if not INSTRUMENTATION:
+        return None
+    trace = Trace(name, attrs)
+    _current.set(trace)
+    _depth.set(0)
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+def span(name, **attrs):
+    """Context manager timing one stage of the active trace."""
+    trace = _current.get()
+    if trace is None:
+        return _NOOP
+    return Span(trace, name, attrs)
+
+
+def record(name, duration, **attrs):
+    trace = _current.get()
+    if trace is not None and duration is not None:
+        trace.record(name, duration, **attrs)
+
+
+def finish_trace():
+    """Ends the active trace and hands it to every sink."""
+    trace = _current.get()
+    if trace is None:
+        return None
+    trace.duration = time.perf_counter() - trace.start
+    _current.set(None)
+    for sink in list(_sinks):
+        try:
+            sink.emit(trace)
+        except Exception as e:
+            print(f"--> instrumentation: Sink {type(sink).__name__} failed: {e}")
+    return trace
+
+
+# --- sinks ----------------------------------------------------------------
+
+class JsonlSink:
+    """Appends one JSON object per finished trace to a file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, trace):
+        line = json.dumps(trace.to_dict(), default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+
+
+class PrometheusSink:
+    """Aggregates stage durations and counts, served in Prometheus text format."""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+    COUNTED_ATTRS = ("prompt_tokens", "rows", "bytes")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # stage -> [bucket counts..., sum, count]
+        self._counters = {}  # (attr, stage) -> total
+        self._errors = {}
+
+    def emit(self, trace):
+        with self._lock:
+            for s in trace.spans + [_TraceTotal(trace)]:
+                hist = self._histograms.setdefault(s.name, [0] * len(self.BUCKETS) + [0.0, 0])
+                for i, bound in enumerate(self.BUCKETS):
+                    if s.duration <= bound:
+                        hist[i] += 1
+                hist[-2] += s.duration
+                hist[-1] += 1
+                for attr in self.COUNTED_ATTRS:
+                    value = s.attrs.get(attr)
+                    if isinstance(value, (int, float)):
+                        key = (attr, s.name)
+                        self._counters[key] = self._counters.get(key, 0) + value
+                if s.error:
+                    self._errors[s.name] = self._errors.get(s.name, 0) + 1
+
+    def render(self):
+        lines = [
+            "# HELP text2sql_stage_seconds Duration of question pipeline stages.",
+            "# TYPE text2sql_stage_seconds histogram",
+        ]
+        with self._lock:
+            for stage, hist in sorted(self._histograms.items()):
+                for bound, count in zip(self.BUCKETS, hist):
+                    lines.append(f'text2sql_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'text2sql_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist[-1]}')
+                lines.append(f'text2sql_stage_seconds_sum{{stage="{stage}"}} {hist[-2]:.6f}')
+                lines.append(f'text2sql_stage_seconds_count{{stage="{stage}"}} {hist[-1]}')
+            for attr in self.COUNTED_ATTRS:
+                metric = f"text2sql_{attr}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (name, stage), total in sorted(self._counters.items()):
+                    if name == attr:
+                        lines.append(f'{metric}{{stage="{stage}"}} {total}')
+            lines.append("# TYPE text2sql_stage_errors_total counter")
+            for stage, total in sorted(self._errors.items()):
+                lines.append(f'text2sql_stage_errors_total{{stage="{stage}"}} {total}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host=TRACE_PROMETHEUS_HOST):
+        """Serves ``/metrics`` on ``host:port`` from a daemon thread."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = sink.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="prometheus-metrics", daemon=True).start()
+        print(f"--> instrumentation: Prometheus metrics on {host}:{port}/metrics")
+        return server
+
+
+class _TraceTotal:
+    """Adapts a whole trace to the span interface for the ``total`` stage."""
+
+    name = "total"
+    error = None
+
+    def __init__(self, trace):
+        self.duration = trace.duration
+        self.attrs = {}
+
+
+_sinks = []
+_setup_lock = threading.Lock()
+_configured = False
+
+
+def register_sink(sink):
+    """Adds a sink; anything with an ``emit(trace)`` method works."""
+    _sinks.append(sink)
+    return sink
+
+
+def configure():
+    """Registers the sinks named in TRACE_SINKS once per process."""
+    global _configured
+    if _configured or not INSTRUMENTATION:
+        return
+    with _setup_lock:
+        if _configured:
+            return
+        names = {n.strip() for n in TRACE_SINKS.split(",") if n.strip()}
+        if "jsonl" in names:
+            register_sink(JsonlSink(TRACE_JSONL_PATH))
+        if "prometheus" in names:
+            sink = register_sink(PrometheusSink())
+            try:
+                sink.serve(TRACE_PROMETHEUS_PORT, TRACE_PROMETHEUS_HOST)
+            except OSError as e:
+                # Another process (e.g. a second Streamlit server) already holds the port
+                print(f"--> instrumentation: Could not serve Prometheus metrics: {e}")
+        _configured = True
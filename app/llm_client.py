@@ -0,0 +1,386 @@
+"""Asynchronous, pooled client for the Ollama ``/api/generate`` endpoint.
+
+All generation requests from every Streamlit session go through one client
+running on its own asyncio event-loop thread:
+
+* one pooled ``httpx.AsyncClient`` keeps connections to Ollama alive;
+* a priority queue feeds ``max_concurrency`` workers, matching Ollama's
+  ``OLLAMA_NUM_PARALLEL`` so requests queue here instead of piling up there;
+* identical in-flight prompts are coalesced into one generation;
+* transient failures are retried with exponential backoff and full jitter;
+* a bounded queue rejects new work when full instead of growing without limit;
+* a request nobody waits for any more (cancelled, or its caller stopped) is
+  dropped from the queue or hung up on, which frees Ollama's slot;
+* every request carries the same ``keep_alive`` and ``num_ctx``, so the model
+  stays loaded and Ollama can reuse the evaluated prompt prefix it shares
+  with earlier requests.
+
+Callers use the synchronous :meth:`OllamaClient.generate`, which delivers
+streamed partial text on the calling thread (as Streamlit requires).
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+
+from .config import (
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_MAX_QUEUE,
+    OLLAMA_MAX_RETRIES,
+    OLLAMA_MODEL,
+    OLLAMA_NUM_CTX,
+    OLLAMA_NUM_PARALLEL,
+    OLLAMA_TIMEOUT,
+    OLLAMA_URL,
+)
+
+# Warm-up requests yield to questions (and batch work) already waiting
+WARMUP_PRIORITY = 100
+# How often a waiting caller checks its cancel event
+CANCEL_POLL = 0.05
+
+
+class LLMError(Exception):
+    """Generation failed after all retries, or with a non-retryable error."""
+
+
+class LLMBusyError(LLMError):
+    """The request queue is full; the caller should back off and try again."""
+
+
+class LLMCancelled(LLMError):
+    """The caller cancelled the request before it finished."""
+
+
+class _Job:
+    """One generation, possibly shared by several coalesced callers."""
+
+    def __init__(self, key, payload, stop, priority):
+        self.key = key
+        self.payload = payload
+        self.stop = stop
+        self.priority = priority
+        self.task = None  # set once a worker runs it
+        self.abandoned = False  # every caller left; skipped or cancelled
+        self.enqueued_at = time.perf_counter()
+        self.subscribers = []
+        self.text = ""
+        self.metrics = {}
+
+    def subscribe(self):
+        events = queue.SimpleQueue()
+        if self.text:
+            events.put(("token", self.text))
+        self.subscribers.append(events)
+        return events
+
+    def publish(self, *event):
+        for events in self.subscribers:
+            events.put(event)
+
+
+class OllamaClient:
+    def __init__(self, base_url=OLLAMA_URL, model=OLLAMA_MODEL, max_concurrency=OLLAMA_NUM_PARALLEL,
+                 timeout=OLLAMA_TIMEOUT, max_retries=OLLAMA_MAX_RETRIES, max_queue=OLLAMA_MAX_QUEUE,
+                 backoff_base=0.5, backoff_max=8.0, keep_alive=OLLAMA_KEEP_ALIVE, num_ctx=OLLAMA_NUM_CTX):
+        self.base_url = base_url
+        self.model = model
+        self.keep_alive = _keep_alive(keep_alive)
+        self.num_ctx = num_ctx
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_queue = max_queue
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.submitted = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.in_flight = 0
+        self._waits = deque(maxlen=1000)
+        self._seq = itertools.count()
+        self._inflight = {}  # coalescing key -> _Job (queued or running)
+        self._queued = 0  # jobs waiting for a worker, not counting abandoned ones
+        self._loop = None
+        self._lock = threading.Lock()
+
+    # --- synchronous API -------------------------------------------------
+
+    def generate(self, prompt, priority=0, options=None, stop=None, on_token=None, metrics=None,
+                 extra=None, cancel=None):
+        """Generates a completion for ``prompt`` and returns its text.
+
+        Lower ``priority`` values are served first. ``stop(text)`` may return
+        an end index to cut the completion there and hang up early.
+        ``on_token`` receives the partial text on the calling thread;
+        ``metrics`` (a dict) receives queue wait, TTFT and total time.
+        ``extra`` holds additional top-level request fields (e.g. keep_alive).
+        Setting the ``cancel`` event (a threading.Event) makes the call raise
+        LLMCancelled within CANCEL_POLL seconds.
+
+        A caller that leaves early (cancelled, or ``on_token`` raised, e.g.
+        Streamlit's stop) unsubscribes; once nobody waits for the generation,
+        it is dropped from the queue or its connection to Ollama is closed.
+        Coalesced callers keep it alive for each other.
+        """
+        job, events = self._call(self._submit(prompt, priority, options, stop, extra))
+        finished = False
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=CANCEL_POLL)
+                except queue.Empty:
+                    if cancel is not None and cancel.is_set():
+                        raise LLMCancelled("Cancelled by the caller")
+                    continue
+                finished = event[0] != "token"
+                if self._handle(event, events, on_token, metrics):
+                    return event[1]
+        finally:
+            if not finished:
+                self._loop.call_soon_threadsafe(self._leave, job, events)
+
+    @staticmethod
+    def _handle(event, events, on_token, metrics):
+        """Delivers one event to the caller; True when it carries the final text."""
+        if event[0] == "token":
+            # Skip ahead to the newest partial text if the caller fell behind
+            try:
+                while True:
+                    newer = events.get_nowait()
+                    if newer[0] != "token":
+                        event = newer
+                        break
+                    event = newer
+            except queue.Empty:
+                pass
+        if event[0] == "token":
+            if on_token:
+                on_token(event[1])
+            return False
+        if event[0] == "done":
+            if metrics is not None:
+                metrics.update(event[2])
+            return True
+        raise event[1]
+
+    def warm_up(self, prompt="", metrics=None):
+        """Loads the model; with ``prompt``, also evaluates it into Ollama's prompt cache so
+        requests that start with the same text skip prefilling it. Runs behind other requests."""
+        options = {"num_predict": 1} if prompt else None
+        return self.generate(prompt, priority=WARMUP_PRIORITY, options=options, metrics=metrics)
+
+    def stats(self):
+        """Queue depth, concurrency and queue-wait statistics (seconds)."""
+        waits = sorted(self._waits)
+
+        def pct(p):
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        return {
+            "queue_depth": self._queued,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "wait_p50": pct(0.50),
+            "wait_p95": pct(0.95),
+            "wait_max": waits[-1] if waits else 0.0,
+        }
+
+    # --- event loop ------------------------------------------------------
+
+    def _call(self, coro):
+        self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def _ensure_loop(self):
+        if self._loop is not None:
+            return
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="ollama-client", daemon=True).start()
+            asyncio.run_coroutine_threadsafe(self._start(), loop).result()
+            self._loop = loop
+
+    async def _start(self):
+        import httpx
+
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=self.max_concurrency,
+                                max_keepalive_connections=self.max_concurrency),
+        )
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.max_concurrency)]
+
+    async def _submit(self, prompt, priority, options, stop, extra):
+        payload = {"model": self.model, "prompt": prompt, "stream": True}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        if self.num_ctx:
+            # The same window on every request; a different one makes Ollama reload the model
+            options = dict(options or {}, num_ctx=self.num_ctx)
+        if options:
+            payload["options"] = options
+        if extra:
+            payload.update(extra)
+        key = hashlib.sha1(json.dumps([payload, stop is not None], sort_keys=True, default=str)
+                           .encode()).hexdigest()
+        job = self._inflight.get(key)
+        if job is not None:
+            self.coalesced += 1
+            return job, job.subscribe()
+        if self._queued >= self.max_queue:
+            raise LLMBusyError(f"LLM queue is full ({self.max_queue} waiting requests)")
+        job = _Job(key, payload, stop, priority)
+        events = job.subscribe()
+        self._inflight[key] = job
+        self.submitted += 1
+        self._queued += 1
+        self._queue.put_nowait((priority, next(self._seq), job))
+        return job, events
+
+    def _leave(self, job, events):
+        """Runs on the loop when a caller stops waiting; abandons the job once nobody waits."""
+        if events in job.subscribers:
+            job.subscribers.remove(events)
+        if job.subscribers or job.abandoned:
+            return
+        job.abandoned = True
+        if self._inflight.get(job.key) is job:
+            # A new caller with the same prompt starts a fresh generation
+            del self._inflight[job.key]
+        if job.task is not None:
+            # Leaving the response stream closes the connection, so Ollama frees the slot
+            job.task.cancel()
+        else:
+            self._queued -= 1  # the worker skips it
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            if job.abandoned:
+                continue
+            self._queued -= 1
+            wait = time.perf_counter() - job.enqueued_at
+            self._waits.append(wait)
+            job.metrics["queue_wait"] = wait
+            self.in_flight += 1
+            try:
+                # Its own task, so an abandoned job can be cancelled without stopping the worker
+                job.task = asyncio.ensure_future(self._run(job))
+                await asyncio.wait({job.task})
+            finally:
+                self.in_flight -= 1
+                if self._inflight.get(job.key) is job:
+                    del self._inflight[job.key]
+
+    def _backoff(self, attempt):
+        # Full jitter: spreads retries from many sessions instead of synchronising them
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _run(self, job):
+        import httpx
+
+        error = None
+        for attempt in range(self.max_retries):
+            try:
+                text = await self._stream(job)
+                job.publish("done", text, dict(job.metrics, attempts=attempt + 1))
+                return
+            except httpx.HTTPStatusError as e:
+                error = e
+                if e.response.status_code < 500 and e.response.status_code != 429:
+                    break  # Client errors won't succeed on retry
+            except httpx.TransportError as e:
+                error = e
+            except Exception as e:
+                error = e  # Model errors and malformed responses won't succeed on retry either
+                break
+            print(f"--> llm_client: Attempt {attempt + 1} of {self.max_retries} failed: {error}")
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(self._backoff(attempt))
+        self.failed += 1
+        if isinstance(error, httpx.TimeoutException):
+            message = f"Request timed out after {self.max_retries} attempts"
+        else:
+            message = str(error) or type(error).__name__
+        job.publish("error", LLMError(message))
+
+    async def _stream(self, job):
+        """Reads the NDJSON token stream; leaving it early closes the connection,
+        which makes Ollama stop generating and frees its slot."""
+        start = time.perf_counter()
+        job.text = ""
+        chunks = []
+        metrics = job.metrics
+        # A retry starts over; only the queue wait carries across attempts
+        queue_wait = metrics.get("queue_wait")
+        metrics.clear()
+        metrics["queue_wait"] = queue_wait
+        async with self._http.stream("POST", "/api/generate", json=job.payload) as res:
+            if res.status_code >= 400:
+                await res.aread()
+            res.raise_for_status()
+            async for line in res.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    raise LLMError(data["error"])
+                token = data.get("response", "")
+                if token:
+                    if len(chunks) == 0:
+                        metrics["ttft"] = time.perf_counter() - start
+                    chunks.append(token)
+                    job.text = "".join(chunks)
+                    # Only a ';' or a backtick can complete a statement
+                    if job.stop and (";" in token or "`" in token):
+                        end = job.stop(job.text)
+                        if end is not None:
+                            job.text = job.text[:end]
+                            metrics["cut_early"] = not data.get("done", False)
+                            break
+                    job.publish("token", job.text)
+                if data.get("done"):
+                    for field in ("prompt_eval_count", "prompt_eval_duration", "eval_count",
+                                  "eval_duration", "load_duration"):
+                        if field in data:
+                            metrics[field] = data[field]
+                    break
+        metrics["tokens"] = len(chunks)
+        metrics["total"] = time.perf_counter() - start
+        return job.text
+
+
+def _keep_alive(value):
+    """Ollama's keep_alive: a duration string ("30m") or a number of seconds; None when unset."""
+    if value is None or str(value).strip() == "":
+        return None
+    value = str(value).strip()
+    return int(value) if re.fullmatch(r"-?\d+", value) else value
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Process-wide client shared by all Streamlit sessions."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OllamaClient()
+    return _client
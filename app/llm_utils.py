@@ -1,70 +1,143 @@
-import requests
-from langchain.prompts import PromptTemplate
-import streamlit as st
-import time
-from .prompts import SQL_TEMPLATE
-
-prompt_template = PromptTemplate(
-    input_variables=["schema", "question"],
-    template=SQL_TEMPLATE,
-)
-
-def generate_sql(schema, question):
-    """Generates SQL query using local Ollama LLM."""
-    # Format the prompt using the template
-    formatted_prompt = prompt_template.format(schema=schema, question=question)
-    
-    max_retries = 3
-    retry_delay = 2  # seconds
-    
-    for attempt in range(max_retries):
-        try:
-            print(f"--> Attempt {attempt + 1} to call Ollama API")
-            # Call the Ollama API
-            res = requests.post("http://localhost:11434/api/generate", json={
-                "model": "llama3.2",  # Using llama3.2 as it's available
-                "prompt": formatted_prompt,
-                "stream": False
-            }, timeout=120)  # 120 second timeout
-            
-            res.raise_for_status()  # Raise an exception for bad status codes
-            response_data = res.json()
-            
-            if 'response' in response_data:
-                sql_result = response_data['response'].strip()
-                return sql_result
-            else:
-                error_msg = "Error: 'response' key not found in Ollama API response."
-                print(f"--> {error_msg}")
-                print(f"--> Full response: {response_data}")
-                if attempt == max_retries - 1:  # Last attempt
-                    st.error(error_msg)
-                    st.json(response_data)
-                    st.stop()
-                    
-        except requests.exceptions.Timeout:
-            error_msg = f"Timeout on attempt {attempt + 1} of {max_retries}"
-            print(f"--> {error_msg}")
-            if attempt == max_retries - 1:  # Last attempt
-                st.error(f"Error calling Ollama API: Request timed out after {max_retries} attempts")
-                st.stop()
-            time.sleep(retry_delay)
-            
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Request error on attempt {attempt + 1}: {str(e)}"
-            print(f"--> {error_msg}")
-            if attempt == max_retries - 1:  # Last attempt
-                st.error(f"Error calling Ollama API: {str(e)}")
-                st.stop()
-            time.sleep(retry_delay)
-            
-        except Exception as e:
-            error_msg = f"Unexpected error on attempt {attempt + 1}: {str(e)}"
-            print(f"--> {error_msg}")
-            if attempt == max_retries - 1:  # Last attempt
-                st.error(f"An unexpected error occurred: {str(e)}")
-                st.stop()
-            time.sleep(retry_delay)
-    
-    st.error("Failed to generate SQL after all retry attempts")
-    st.stop()
+import re
+from .config import OLLAMA_NUM_CTX
+from .instrumentation import record, span
+from .llm_client import get_llm_client
+from .prompts import REPAIR_TEMPLATE, SQL_PREFIX_TEMPLATE, SQL_QUESTION_TEMPLATE, dialect_instruction, format_examples
+from .schema_linking import estimate_tokens
+
+_FENCE_OPEN = re.compile(r"```[ \t]*(?:sql)?", re.IGNORECASE)
+_STATEMENT_START = re.compile(r"\b(?:SELECT|WITH)\b", re.IGNORECASE)
+
+
+def find_statement_end(text):
+    """Returns the index just past the first complete SQL statement in ``text``, or None.
+
+    A statement is complete at the closing ``` of a fenced block, or at a ``;``
+    outside quotes, comments and parentheses. Prose before the statement is
+    ignored so apostrophes in it don't confuse the quote tracking.
+    """
+    fence = _FENCE_OPEN.search(text)
+    start = _STATEMENT_START.search(text)
+    if fence and (start is None or fence.start() <= start.start()):
+        close = text.find("```", fence.end())
+        return close + 3 if close != -1 else None
+    if start is None:
+        return None
+
+    depth = 0
+    quote = None
+    i = start.start()
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if quote:
+            if ch == quote:
+                # A doubled quote is an escaped quote inside the literal
+                if i + 1 < n and text[i + 1] == quote:
+                    i += 1
+                else:
+                    quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+        elif text.startswith("--", i):
+            newline = text.find("\n", i)
+            if newline == -1:
+                return None
+            i = newline
+        elif text.startswith("/*", i):
+            close = text.find("*/", i + 2)
+            if close == -1:
+                return None
+            i = close + 1
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(depth - 1, 0)
+        elif ch == ";" and depth == 0:
+            return i + 1
+        elif text.startswith("```", i):
+            return i
+        i += 1
+    return None
+
+
+def generate_sql(schema, question, on_token=None, metrics=None, priority=0, examples=(), dialect="postgresql",
+                 options=None, cancel=None):
+    """Generates SQL query using local Ollama LLM.
+
+    Requests go through the shared Ollama client (queued, coalesced, retried).
+    ``on_token`` receives the partial text as it streams; generation stops as
+    soon as the SQL statement is complete. Timing is written to ``metrics``
+    when a dict is passed: ``queue_wait``, ``ttft`` and ``total`` in seconds.
+    ``examples`` are ``(question, sql)`` pairs shown to the model as few-shot examples;
+    ``dialect`` (a SQLAlchemy dialect name) selects the SQL syntax the model is told to use.
+    ``options`` (e.g. temperature and seed) go to Ollama as they are; setting
+    the ``cancel`` event abandons the request with LLMCancelled.
+
+    Raises LLMBusyError when the request queue is full and LLMError when
+    generation fails.
+    """
+    # Format the prompt: the schema prefix is shared by every question, so Ollama can reuse its evaluation
+    with span("prompt_format") as prompt_span:
+        prefix = SQL_PREFIX_TEMPLATE.format(schema=schema, dialect=dialect_instruction(dialect))
+        formatted_prompt = prefix + SQL_QUESTION_TEMPLATE.format(examples=format_examples(examples),
+                                                                 question=question)
+        prompt_span.set(prompt_tokens=estimate_tokens(formatted_prompt), prefix_tokens=estimate_tokens(prefix),
+                        examples=len(examples))
+    return _complete(formatted_prompt, "llm", on_token, metrics, priority, options, cancel)
+
+
+def repair_sql(schema, question, sql, errors, on_token=None, metrics=None, priority=0, dialect="postgresql"):
+    """Asks the model to fix ``sql`` given the validation ``errors``; same contract as generate_sql."""
+    with span("prompt_format", repair=True) as prompt_span:
+        formatted_prompt = REPAIR_TEMPLATE.format(schema=schema, dialect=dialect_instruction(dialect),
+                                                  question=question, sql=sql,
+                                                  errors="\n".join(f"- {e}" for e in errors))
+        prompt_span.set(prompt_tokens=estimate_tokens(formatted_prompt))
+    return _complete(formatted_prompt, "llm_repair", on_token, metrics, priority)
+
+
+def warm_up(schema=None, metrics=None, dialect="postgresql"):
+    """Loads the model and, given the ``schema`` every question will be asked against,
+    evaluates the shared prompt prefix so the first question only prefills its own part."""
+    prompt = SQL_PREFIX_TEMPLATE.format(schema=schema, dialect=dialect_instruction(dialect)) if schema else ""
+    if prompt:
+        _check_context(prompt)
+    return get_llm_client().warm_up(prompt, metrics=metrics)
+
+
+def _check_context(prompt):
+    tokens = estimate_tokens(prompt)
+    if OLLAMA_NUM_CTX and tokens > OLLAMA_NUM_CTX:
+        print(f"--> llm_utils: Prompt of about {tokens} tokens exceeds OLLAMA_NUM_CTX={OLLAMA_NUM_CTX}; "
+              "Ollama will truncate it and can't reuse its cached prefix")
+
+
+def _complete(prompt, span_name, on_token, metrics, priority, options=None, cancel=None):
+    if metrics is None:
+        metrics = {}
+    _check_context(prompt)
+    with span(span_name) as llm_span:
+        sql_result = get_llm_client().generate(
+            prompt,
+            priority=priority,
+            options=options,
+            stop=find_statement_end,
+            on_token=on_token,
+            metrics=metrics,
+            cancel=cancel,
+        )
+        llm_span.set(completion_tokens=metrics.get("tokens"), attempts=metrics.get("attempts"),
+                     prompt_eval_count=metrics.get("prompt_eval_count"))
+    record(f"{span_name}.queue", metrics.get("queue_wait"))
+    if metrics.get("load_duration"):
+        record(f"{span_name}.load", metrics["load_duration"] / 1e9)
+    if "prompt_eval_duration" in metrics:
+        # Reported when the stream ran to the end; only the part of the prompt not in
+        # Ollama's prompt cache is evaluated
+        record(f"{span_name}.prefill", metrics["prompt_eval_duration"] / 1e9,
+               tokens=metrics.get("prompt_eval_count"))
+    record(f"{span_name}.ttft", metrics.get("ttft"))
+    if "ttft" in metrics:
+        record(f"{span_name}.generation", metrics["total"] - metrics["ttft"], tokens=metrics.get("tokens"))
+    return sql_result.strip()
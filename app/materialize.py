@@ -0,0 +1,162 @@
+"""Builds result DataFrames column-wise instead of cell by cell.
+
+Rows are streamed from a server-side cursor in chunks and appended straight
+into per-column lists, so no intermediate list of rows is kept. On
+PostgreSQL the ``copy`` mode instead streams ``COPY ... TO STDOUT`` CSV into
+pyarrow's (or pandas') vectorised CSV parser, with text and boolean columns
+typed from the cursor description and NULL kept apart from the empty string,
+so it returns what the chunked path does. Array and JSON columns are
+turned into text in one pass per column, chosen from the cursor's type
+metadata rather than by inspecting every value.
+"""
+import io
+import json
+
+from .config import RESULT_FETCH_CHUNK_ROWS, RESULT_FETCH_MODE
+from .instrumentation import span
+
+# psycopg2 type OIDs -> PostgreSQL type names, for the types we care about
+# when displaying or charting results. Unknown OIDs are reported as "unknown".
+PG_TYPE_NAMES = {
+    16: "bool", 20: "int8", 21: "int2", 23: "int4", 26: "oid", 700: "float4", 701: "float8",
+    1700: "numeric", 790: "money", 25: "text", 1042: "bpchar", 1043: "varchar", 19: "name",
+    18: "char", 2950: "uuid", 1082: "date", 1083: "time", 1266: "timetz", 1114: "timestamp",
+    1184: "timestamptz", 1186: "interval", 114: "json", 3802: "jsonb", 17: "bytea",
+    869: "inet", 650: "cidr",
+}
+PG_JSON_OIDS = {114, 3802}
+PG_ARRAY_OIDS = {
+    1000, 1001, 1005, 1007, 1016, 1021, 1022, 1231, 1009, 1014, 1015, 1002, 2951,
+    1182, 1183, 1115, 1185, 1270, 199, 3807, 1041, 651, 1028,
+}
+PG_TEMPORAL_OIDS = {1082, 1114, 1184}
+# Types the CSV parser may infer from COPY output; every other column is read as text
+COPY_INFERRED_TYPES = {"bool", "int2", "int4", "int8", "oid", "float4", "float8", "numeric"}
+# COPY writes NULL as this unquoted marker and quotes every value, so NULL, the
+# empty string and a string "\N" stay apart
+COPY_NULL = "\\N"
+
+
+def _to_text(value):
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def _column_types(description):
+    """Returns ``[(name, db_type, nested)]`` from a DB-API cursor description."""
+    types = []
+    for col in description:
+        code = col[1]
+        if isinstance(code, int):
+            name = PG_TYPE_NAMES.get(code, "array" if code in PG_ARRAY_OIDS else "unknown")
+            nested = code in PG_JSON_OIDS or code in PG_ARRAY_OIDS
+        else:
+            name, nested = (str(code) if code else "unknown"), False
+        types.append((col[0], name, nested))
+    return types
+
+
+def _finish(df, names, column_types, convert=True):
+    """Converts nested columns to text once and records the DB types on the frame."""
+    nested = set()
+    for i, (_, db_type, is_nested) in enumerate(column_types):
+        series = df[i]
+        if convert and not is_nested and series.dtype == object:
+            # Drivers without type codes (e.g. SQLite): check one value, not every cell
+            first = series.first_valid_index()
+            is_nested = first is not None and isinstance(series[first], (list, tuple, dict))
+        if is_nested:
+            if convert:
+                df[i] = series.map(_to_text, na_action="ignore")
+            nested.add(names[i])
+    df.columns = names
+    df.attrs["column_types"] = {name: db_type for name, db_type, _ in column_types}
+    df.attrs["nested_columns"] = sorted(nested)
+    return df
+
+
+def fetch_frame(connection, sql, chunk_size=RESULT_FETCH_CHUNK_ROWS, mode=RESULT_FETCH_MODE):
+    """Executes ``sql`` on a SQLAlchemy connection and returns the result as a DataFrame."""
+    if mode == "copy" and connection.dialect.name == "postgresql":
+        return _fetch_copy(connection, sql)
+    return _fetch_chunked(connection, sql, chunk_size)
+
+
+def _fetch_chunked(connection, sql, chunk_size):
+    import pandas as pd
+    from sqlalchemy import text
+
+    with span("query_execution"):
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(text(sql))
+    if not result.returns_rows:
+        return pd.DataFrame()
+    with span("materialisation", mode="chunked") as fetch_span:
+        names = list(result.keys())
+        # Some server-side cursors only describe themselves after the first fetch
+        description = getattr(result.cursor, "description", None) or [(n, None) for n in names]
+        column_types = _column_types(description)
+        columns = [[] for _ in names]
+        for partition in result.partitions():
+            for values, column in zip(zip(*partition), columns):
+                column.extend(values)
+        # Positional keys keep duplicate column names (e.g. two "id"s from a join) apart
+        df = pd.DataFrame({i: column for i, column in enumerate(columns)}, columns=range(len(names)))
+        df = _finish(df, names, column_types)
+        fetch_span.set(rows=len(df), bytes=int(df.memory_usage(deep=False).sum()))
+    return df
+
+
+def _fetch_copy(connection, sql):
+    import pandas as pd
+
+    statement = sql.strip().rstrip(";")
+    raw = connection.connection  # DB-API (psycopg2) connection checked out for this Connection
+    with span("query_execution", mode="copy") as exec_span, raw.cursor() as cursor:
+        # Zero-row probe for column names and type OIDs
+        cursor.execute(f"SELECT * FROM ({statement}) AS _t2s_probe LIMIT 0")
+        column_types = _column_types(cursor.description)
+        temporal = {i: col[1] for i, col in enumerate(cursor.description) if col[1] in PG_TEMPORAL_OIDS}
+        buffer = io.BytesIO()
+        cursor.copy_expert(f"COPY ({statement}) TO STDOUT WITH (FORMAT csv, HEADER false, "
+                           f"NULL '{COPY_NULL}', FORCE_QUOTE *)", buffer)
+        exec_span.set(bytes=buffer.tell())
+    buffer.seek(0)
+    names = [name for name, _, _ in column_types]
+    if not names:
+        return pd.DataFrame()
+    with span("materialisation", mode="copy") as fetch_span:
+        df = _parse_copy(pd, buffer, names, column_types, temporal)
+        fetch_span.set(rows=len(df), bytes=int(df.memory_usage(deep=False).sum()))
+    return df
+
+
+def _parse_copy(pd, buffer, names, column_types, temporal):
+    # Text, arrays and JSON stay strings ("007" is not 7); booleans arrive as t/f
+    text = [i for i, (_, db_type, _) in enumerate(column_types) if db_type not in COPY_INFERRED_TYPES]
+    try:
+        df = _parse_copy_arrow(buffer, len(names), text)
+    except ImportError:
+        buffer.seek(0)
+        # Without pyarrow a quoted "\N" string also reads as NULL; empty strings still survive
+        df = pd.read_csv(buffer, header=None, names=list(range(len(names))), dtype={i: str for i in text},
+                         keep_default_na=False, na_values=[COPY_NULL], true_values=["t"], false_values=["f"])
+    for i, oid in temporal.items():
+        df[i] = pd.to_datetime(df[i], errors="coerce", utc=oid == 1184)
+    # Nested columns already arrived as text, so _finish only records metadata
+    return _finish(df, names, column_types, convert=False)
+
+
+def _parse_copy_arrow(buffer, width, text):
+    import pyarrow as pa
+    from pyarrow import csv
+
+    columns = [str(i) for i in range(width)]
+    table = csv.read_csv(buffer, read_options=csv.ReadOptions(column_names=columns),
+                         convert_options=csv.ConvertOptions(
+                             null_values=[COPY_NULL], strings_can_be_null=True, quoted_strings_can_be_null=False,
+                             true_values=["t"], false_values=["f"],
+                             column_types={columns[i]: pa.string() for i in text}))
+    df = table.to_pandas()
+    df.columns = range(width)
+    return df
@@ -0,0 +1,44 @@
+"""Result windowing: run generated SELECTs one page at a time.
+
+The generated statement is wrapped in an outer ``SELECT ... LIMIT/OFFSET``
+so only the requested page ever leaves the database. Pages are as stable as
+the statement's own ORDER BY; without one, the database may return rows in
+a different order between pages.
+"""
+import json
+import re
+
+_PAGEABLE = re.compile(r"^\s*(?:\(\s*)*(?:SELECT|WITH|VALUES|TABLE)\b", re.IGNORECASE)
+
+
+def strip_statement(sql):
+    """Removes surrounding whitespace and trailing semicolons."""
+    return sql.strip().rstrip(";").rstrip()
+
+
+def is_pageable(sql):
+    """Only read-only row-returning statements can be wrapped in a subquery."""
+    return bool(_PAGEABLE.match(sql))
+
+
+def page_sql(sql, page, page_size):
+    """Returns SQL for page ``page`` (0-based); fetches one extra row to detect a next page."""
+    return (
+        f"SELECT * FROM (\n{strip_statement(sql)}\n) AS _t2s_page "
+        f"LIMIT {int(page_size) + 1} OFFSET {int(page) * int(page_size)}"
+    )
+
+
+def count_sql(sql):
+    return f"SELECT count(*) FROM (\n{strip_statement(sql)}\n) AS _t2s_count"
+
+
+def estimate_row_count(connection, sql):
+    """Planner row estimate for the statement, or None where EXPLAIN JSON isn't available."""
+    if connection.dialect.name != "postgresql":
+        return None
+    from sqlalchemy import text
+
+    raw = connection.execute(text(f"EXPLAIN (FORMAT JSON) {strip_statement(sql)}")).scalar()
+    plan = raw if isinstance(raw, list) else json.loads(raw)
+    return int(plan[0]["Plan"]["Plan Rows"])
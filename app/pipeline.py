@@ -0,0 +1,307 @@
+"""Streamlit-free question -> SQL -> result pipeline.
+
+The steps the UI, the HTTP API (:mod:`app.api`) and the benchmarks share.
+Nothing here renders or stops a script: failures raise
+
+* ``DatabaseError``, ``UnknownDataSource``, ``QueryError``, ``QueryNotAllowed``,
+  ``SqlExtractionError`` and ``QueryRejected`` from :mod:`app.errors`,
+* ``LLMError`` / ``LLMBusyError`` from :mod:`app.llm_client`.
+
+:class:`app.api_client.ApiClient` offers the same functions over HTTP, so a
+caller can switch between running the pipeline in-process and calling a
+separately scaled API service.
+
+Functions that touch the database take ``source``, the name of a configured
+data source (:mod:`app.data_sources`); None means the default one, except
+that :func:`generate` routes a question without one to the best match.
+
+With ``SQL_CANDIDATES`` > 1, :func:`generate` races several candidate
+queries (:mod:`app.speculative`); the winner's first page is then already in
+the result cache.
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+
+from .config import (DATA_SOURCE_ROUTING, FEW_SHOT, FEW_SHOT_CAPTURE, OLLAMA_WARMUP, QUERY_GUARD, RESULT_CACHE,
+                     RESULT_PAGE_SIZE, RESULT_PAGING, SCHEMA_LINKING, SCHEMA_LINKING_MIN_TABLES, SQL_CACHE,
+                     SQL_CANDIDATES, SQL_REPAIR_ATTEMPTS, SQL_VALIDATION)
+from .data_sources import get_registry, use_source
+from .db_config import (check_query, count_rows, get_pool_stats, get_schema, get_schema_catalog, run_query,
+                        run_query_page)
+from .example_store import get_example_store
+from .errors import (DatabaseError, QueryError, QueryNotAllowed, QueryRejected, SqlExtractionError,
+                     SqlValidationError, UnknownDataSource)
+from .instrumentation import span
+from .llm_client import LLMBusyError, LLMError, get_llm_client
+from .llm_utils import generate_sql, repair_sql, warm_up as warm_up_llm
+from .query_guard import GuardResult
+from .result_cache import get_result_cache
+from .speculative import speculate
+from .sql_cache import get_sql_cache
+from .sql_validation import clean_sql, validate_sql
+
+__all__ = [
+    "Answer", "DatabaseError", "GeneratedSql", "LLMBusyError", "LLMError", "QueryError", "QueryNotAllowed",
+    "QueryRejected", "SqlExtractionError", "SqlValidationError", "UnknownDataSource", "accept", "answer", "check",
+    "count", "extract_sql", "require_read_only",
+    "fetch", "find_examples", "generate", "remember", "route", "schema_version", "sources", "start_warm_up", "stats",
+    "validate", "warm_up",
+]
+
+_warm_up_started = False
+_warm_up_lock = threading.Lock()
+
+
+@dataclass
+class GeneratedSql:
+    question: str
+    sql: str
+    cached: bool = False
+    metrics: dict = field(default_factory=dict)
+    source: str = None  # the data source the SQL was written for
+
+
+@dataclass
+class Answer:
+    question: str
+    sql: str  # as generated
+    executed_sql: str  # after the guard, e.g. with a LIMIT added
+    frame: object
+    has_more: bool = False
+    cached: bool = False
+    guard: GuardResult = None
+    metrics: dict = field(default_factory=dict)
+    source: str = None
+
+
+def extract_sql(text):
+    """Extracts the SQL statement from a model response, dropping fences, prose and semicolons."""
+    return clean_sql(text)
+
+
+def sources():
+    """The configured data sources: ``[{"name", "dialect", "description", "default"}]``, default first."""
+    return get_registry().describe()
+
+
+def route(question):
+    """Name of the data source a question without an explicit source goes to."""
+    registry = get_registry()
+    return registry.route(question) if DATA_SOURCE_ROUTING else registry.default
+
+
+def schema_version(source=None):
+    """Identifies the database and its current schema; changes whenever a table definition does."""
+    with use_source(source):
+        catalog = get_schema_catalog()
+    return f"{catalog.fingerprint}:{catalog.version}"
+
+
+def generate(question, on_token=None, priority=0, use_cache=True, source=None, candidates=None):
+    """Returns SQL for ``question``, from the SQL cache or the model (always the model
+    with ``use_cache=False``). Without ``source`` the question is routed to one.
+    ``candidates`` overrides SQL_CANDIDATES, the number of speculative candidates."""
+    if source is None:
+        source = route(question)
+    with use_source(source) as data_source:
+        catalog = get_schema_catalog()
+        sql_cache = get_sql_cache() if SQL_CACHE and use_cache else None
+        cached_sql = sql_cache.get(catalog.fingerprint, catalog.version, question) if sql_cache else None
+        if cached_sql:
+            return GeneratedSql(question, cached_sql, cached=True, source=data_source.name)
+
+        schema = get_schema(question)
+        examples = find_examples(catalog, question)
+        candidates = SQL_CANDIDATES if candidates is None else candidates
+        if candidates > 1:
+            return _generate_speculatively(question, schema, catalog, examples, data_source, on_token, priority,
+                                           candidates)
+        metrics = {}
+        response = generate_sql(schema, question, on_token=on_token, metrics=metrics, priority=priority,
+                                examples=examples, dialect=data_source.dialect)
+        with span("sql_extraction"):
+            sql = extract_sql(response)
+        if not sql:
+            raise SqlExtractionError("Could not extract SQL query from the response.", response)
+        if SQL_VALIDATION:
+            sql = validate(question, schema, catalog, sql, response, metrics, on_token, priority,
+                           dialect=data_source.dialect)
+    return GeneratedSql(question, sql, metrics=metrics, source=data_source.name)
+
+
+def _generate_speculatively(question, schema, catalog, examples, data_source, on_token, priority, candidates):
+    speculation = speculate(question, schema, catalog, examples, data_source.dialect, on_token=on_token,
+                            priority=priority, n=candidates, page=0 if RESULT_PAGING else None)
+    winner = speculation.winner
+    if winner is None:
+        # No valid candidate: repair the first one that has SQL, as a single generation would
+        answered = [c for c in speculation.candidates if c.error is None]
+        if not answered:
+            errors = [c.error for c in speculation.candidates]
+            raise errors[0] if errors else LLMError("Every candidate was cancelled")
+        with_sql = [c for c in answered if c.sql]
+        if not with_sql:
+            raise SqlExtractionError("Could not extract SQL query from the response.", answered[0].response)
+        winner = with_sql[0]
+        if SQL_VALIDATION:
+            winner.sql = validate(question, schema, catalog, winner.sql, winner.response, winner.metrics, None,
+                                  priority, dialect=data_source.dialect)
+    metrics = dict(winner.metrics, speculation=speculation.describe())
+    return GeneratedSql(question, winner.sql, metrics=metrics, source=data_source.name)
+
+
+def validate(question, schema, catalog, sql, response, metrics, on_token=None, priority=0, dialect="postgresql"):
+    """Returns ``sql`` once it passes local validation, asking the model for a fix at most
+    SQL_REPAIR_ATTEMPTS times. Raises SqlValidationError when it still fails."""
+    for attempt in range(SQL_REPAIR_ATTEMPTS + 1):
+        with span("sql_validation", attempt=attempt) as validation_span:
+            result = validate_sql(sql, catalog, dialect)
+            validation_span.set(errors=len(result.errors), parsed=result.parsed)
+        if result.ok:
+            return result.sql
+        if attempt == SQL_REPAIR_ATTEMPTS:
+            break
+        print(f"--> pipeline: Generated SQL failed validation ({'; '.join(result.errors)}); asking for a fix")
+        metrics["repairs"] = attempt + 1
+        response = repair_sql(schema, question, result.sql, result.errors, on_token=on_token, priority=priority,
+                              dialect=dialect)
+        with span("sql_extraction"):
+            sql = extract_sql(response) or result.sql
+    raise SqlValidationError("The generated SQL is not valid for this database: " + " ".join(result.errors),
+                             response, result.sql, result.errors)
+
+
+def find_examples(catalog, question):
+    """Stored question/SQL pairs similar to ``question``, for the prompt."""
+    if not FEW_SHOT:
+        return []
+    with span("few_shot") as few_shot_span:
+        examples = get_example_store().search(catalog.fingerprint, question)
+        few_shot_span.set(examples=len(examples))
+    return examples
+
+
+def remember(question, sql, source=None):
+    """Stores SQL that ran successfully so the same or a similar question can reuse it."""
+    if not SQL_CACHE:
+        return
+    with use_source(source):
+        catalog = get_schema_catalog()
+    get_sql_cache().put(catalog.fingerprint, catalog.version, question, sql)
+
+
+def accept(question, sql, source=None):
+    """Stores SQL the user confirmed as correct as a few-shot example for the source's
+    database; returns False when capture is off. Running without an error is no such proof."""
+    if not (FEW_SHOT and FEW_SHOT_CAPTURE):
+        return False
+    with use_source(source):
+        catalog = get_schema_catalog()
+    get_example_store().add(catalog.fingerprint, question, sql, source="accepted")
+    return True
+
+
+def require_read_only(sql, source=None):
+    """Returns ``sql`` without a trailing semicolon if it is a single read-only query over the
+    source's schema; raises QueryNotAllowed otherwise. For SQL from outside the pipeline."""
+    cleaned = clean_sql(sql)
+    if cleaned is None or cleaned != sql.strip().rstrip(";").rstrip():
+        raise QueryNotAllowed("Only a single SQL statement is allowed.", sql,
+                              ["Only a single SQL statement, with nothing around it, is allowed."])
+    with use_source(source) as data_source:
+        result = validate_sql(cleaned, get_schema_catalog(), data_source.dialect)
+    if not result.ok:
+        raise QueryNotAllowed("The SQL is not allowed: " + " ".join(result.errors), sql, result.errors)
+    return cleaned
+
+
+def check(sql, source=None):
+    """Runs the EXPLAIN-based guard when enabled; returns a GuardResult."""
+    if not QUERY_GUARD:
+        return GuardResult("run", sql)
+    with use_source(source), span("query_guard") as guard_span:
+        result = check_query(sql)
+        guard_span.set(action=result.action)
+    return result
+
+
+def fetch(sql, page=None, page_size=RESULT_PAGE_SIZE, on_wait=None, refresh=False, source=None):
+    """Runs ``sql``; returns ``(frame, has_more)``. ``page=None`` fetches the whole result.
+
+    ``refresh`` bypasses the result cache.
+    """
+    with use_source(source), span("query", paged=page is not None) as query_span:
+        if page is None:
+            frame, has_more = run_query(sql, on_wait=on_wait, refresh=refresh), False
+        else:
+            frame, has_more = run_query_page(sql, page, page_size, on_wait=on_wait, refresh=refresh)
+        query_span.set(rows=len(frame))
+    return frame, has_more
+
+
+def count(sql, exact=False, source=None):
+    """Returns ``(row_count, is_exact)``; ``row_count`` is None when it can't be determined."""
+    with use_source(source):
+        return count_rows(sql, exact=exact)
+
+
+def answer(question, page=None, page_size=RESULT_PAGE_SIZE, on_token=None, on_wait=None, priority=0, source=None):
+    """Runs the whole pipeline for ``question``. Raises QueryRejected if the guard refuses the SQL."""
+    generated = generate(question, on_token=on_token, priority=priority, source=source)
+    guard_result = check(generated.sql, source=generated.source)
+    if guard_result.action == "reject":
+        raise QueryRejected(guard_result)
+    frame, has_more = fetch(guard_result.sql, page, page_size, on_wait=on_wait, source=generated.source)
+    if not generated.cached:
+        remember(question, generated.sql, source=generated.source)
+    return Answer(question, generated.sql, guard_result.sql, frame, has_more, generated.cached,
+                  guard_result, generated.metrics, generated.source)
+
+
+def stats():
+    """Pool, LLM queue and cache statistics for this process."""
+    data = {"pool": get_pool_stats(), "llm": get_llm_client().stats()}
+    registry = get_registry()
+    if len(registry.sources) > 1:
+        data["data_sources"] = registry.stats()
+    if SQL_CACHE:
+        data["sql_cache"] = get_sql_cache().stats()
+    if RESULT_CACHE:
+        data["result_cache"] = get_result_cache().stats()
+    if FEW_SHOT:
+        data["examples"] = get_example_store().stats()
+    return data
+
+
+def warm_up(source=None):
+    """Loads the model and evaluates the prompt prefix shared by every question about ``source``.
+
+    On databases where schema linking picks tables per question there is no
+    single shared schema, so only the model is loaded.
+    """
+    started = time.perf_counter()
+    metrics = {}
+    try:
+        with use_source(source) as data_source:
+            catalog = get_schema_catalog()
+            linked = SCHEMA_LINKING and len(catalog.tables) > SCHEMA_LINKING_MIN_TABLES
+            warm_up_llm(None if linked else get_schema(), metrics=metrics, dialect=data_source.dialect)
+    except (DatabaseError, LLMError) as e:
+        print(f"--> pipeline: Warm-up failed: {e}")
+        return False
+    print(f"--> pipeline: Warmed up the model in {time.perf_counter() - started:.1f}s "
+          f"({metrics.get('prompt_eval_count', 0)} prompt token(s) cached)")
+    return True
+
+
+def start_warm_up():
+    """Runs :func:`warm_up` once per process on a background thread (when OLLAMA_WARMUP is on)."""
+    global _warm_up_started
+    if not OLLAMA_WARMUP or _warm_up_started:
+        return
+    with _warm_up_lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+    threading.Thread(target=warm_up, name="llm-warm-up", daemon=True).start()
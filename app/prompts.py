@@ -1,6 +1,11 @@
 """Prompt templates for the Text-to-SQL application."""
 
-SQL_TEMPLATE = """You are an expert SQL analyst.
+# Prompts are laid out as a prefix that is identical for every question about
+# the same schema (instructions, then the schema) followed by the
+# per-question part. Ollama keeps the evaluated prefix in the loaded model's
+# KV cache, so only the short suffix is prefilled for each new question. Keep
+# anything that varies per question out of SQL_PREFIX_TEMPLATE.
+SQL_PREFIX_TEMPLATE = """You are an expert SQL analyst.
 
 You will be provided:
 - A database schema with table names and column descriptions.
@@ -11,18 +16,73 @@ Your job is to:
 2. Analyze which tables and columns are needed
 3. Write an accurate and optimized SQL query that answers the question
 
---- Schema ---
-{schema}
-
---- Question ---
-{question}
-
 --- Instructions ---
 - Return ONLY the SQL query (no explanation, no markdown)
 - Use exact column and table names from the schema
 - Use JOINs, GROUP BY, HAVING, and nested subqueries when necessary
 - Optimize for performance
 - Handle edge cases like NULL values, missing relationships, or ambiguous columns
-- Assume PostgreSQL syntax
+- {dialect}
+
+--- Schema ---
+{schema}
+"""
+
+# The last instruction of the prefix, per SQLAlchemy dialect name
+DIALECT_INSTRUCTIONS = {
+    "postgresql": "Assume PostgreSQL syntax",
+    "sqlite": "Assume SQLite syntax: use strftime() and date() for dates (there is no EXTRACT or DATE_TRUNC) "
+              "and LIKE instead of ILIKE",
+    "duckdb": "Assume DuckDB syntax (PostgreSQL-like; date_trunc, ILIKE and QUALIFY are available)",
+    "mysql": "Assume MySQL syntax: quote identifiers with backticks and use DATE_FORMAT() for dates",
+}
+
+SQL_QUESTION_TEMPLATE = """{examples}
+--- Question ---
+{question}
+
+--- SQL ---"""
+
+SQL_TEMPLATE = SQL_PREFIX_TEMPLATE + SQL_QUESTION_TEMPLATE
+
+# Repairs share the generation prefix, so the schema is not evaluated again
+REPAIR_TEMPLATE = SQL_PREFIX_TEMPLATE + """
+--- Question ---
+{question}
+
+--- Query ---
+{sql}
+
+--- Problems ---
+{errors}
+
+The query above was written for this question and failed validation.
+- Return ONLY the corrected SQL query (no explanation, no markdown)
+- Fix the problems listed above and keep the rest of the query unchanged
+- Use only tables and columns that exist in the schema
+- Write a single read-only SELECT statement
 
 --- SQL ---"""
+
+EXAMPLES_HEADER = """
+--- Examples ---
+Questions about this database that were answered correctly:
+"""
+
+EXAMPLE_TEMPLATE = """
+Question: {question}
+SQL:
+{sql}
+"""
+
+
+def format_examples(examples):
+    """Renders ``[(question, sql)]`` for the ``{examples}`` slot of SQL_TEMPLATE."""
+    if not examples:
+        return ""
+    return EXAMPLES_HEADER + "".join(EXAMPLE_TEMPLATE.format(question=q, sql=sql) for q, sql in examples)
+
+
+def dialect_instruction(dialect):
+    """The ``{dialect}`` line of SQL_PREFIX_TEMPLATE for a SQLAlchemy dialect name."""
+    return DIALECT_INSTRUCTIONS.get(dialect, f"Assume {dialect} SQL syntax")
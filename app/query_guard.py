@@ -0,0 +1,134 @@
+"""Pre-execution guard for generated SQL based on the planner's estimates.
+
+``EXPLAIN (FORMAT JSON)`` is run on the statement and summarised. Plans over
+the configured cost or row thresholds are either rejected or downgraded to a
+LIMITed variant, which is explained again and only accepted if it is cheap
+enough. A LIMIT can't cut short the input of an aggregate, sort or join, so
+plans whose over-limit rows feed one are rejected instead of downgraded.
+Dialects without a JSON cost model are passed through unchecked.
+"""
+import json
+from dataclasses import dataclass, field
+
+from .config import QUERY_DOWNGRADE_LIMIT, QUERY_GUARD_ACTION, QUERY_MAX_COST, QUERY_MAX_ROWS
+from .pagination import strip_statement
+
+_SCAN_NODES = {"Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan", "Parallel Seq Scan"}
+# Nodes that consume (or, for joins, may consume) all their input before a LIMIT above them stops
+_BLOCKING_NODES = {"Aggregate", "Group", "WindowAgg", "Sort", "Unique", "SetOp", "Hash",
+                   "Hash Join", "Merge Join", "Nested Loop"}
+
+
+@dataclass
+class PlanSummary:
+    total_cost: float
+    plan_rows: int
+    max_node_rows: int
+    scans: list = field(default_factory=list)  # [(node type, relation, estimated rows)]
+    cartesian: bool = False
+    max_blocked_rows: int = 0  # largest estimate of a node feeding an aggregate, sort or join
+
+    def describe(self):
+        parts = [f"Estimated cost {self.total_cost:,.0f}", f"{self.plan_rows:,} rows"]
+        seq = [f"{rel} (~{rows:,})" for node, rel, rows in self.scans if "Seq Scan" in node]
+        if seq:
+            parts.append("sequential scan of " + ", ".join(seq[:3]))
+        if self.cartesian:
+            parts.append("possible cartesian join")
+        return " · ".join(parts)
+
+
+@dataclass
+class GuardResult:
+    action: str  # "run", "downgrade" or "reject"
+    sql: str
+    summary: PlanSummary = None
+    reason: str = ""
+
+
+def _has_condition(node):
+    if "Index Cond" in node or "Recheck Cond" in node or "Hash Cond" in node:
+        return True
+    return any(_has_condition(child) for child in node.get("Plans", []))
+
+
+def summarise_plan(plan):
+    """Builds a PlanSummary from the JSON document EXPLAIN (FORMAT JSON) returns."""
+    root = plan[0]["Plan"]
+    scans = []
+    max_rows = 0
+    max_blocked = 0
+    cartesian = False
+    stack = [(root, False)]
+    while stack:
+        node, blocked = stack.pop()
+        rows = int(node.get("Plan Rows", 0))
+        max_rows = max(max_rows, rows)
+        if blocked:
+            max_blocked = max(max_blocked, rows)
+        node_type = node.get("Node Type", "")
+        if node_type in _SCAN_NODES and "Relation Name" in node:
+            scans.append((node_type, node["Relation Name"], rows))
+        children = node.get("Plans", [])
+        if node_type == "Nested Loop" and "Join Filter" not in node and len(children) > 1:
+            # No join filter and no index lookup on the inner side: every pair matches
+            if not _has_condition(children[1]):
+                cartesian = True
+        blocks = blocked or node_type in _BLOCKING_NODES
+        stack.extend((child, blocks) for child in children)
+    scans.sort(key=lambda s: -s[2])
+    return PlanSummary(
+        total_cost=float(root.get("Total Cost", 0.0)),
+        plan_rows=int(root.get("Plan Rows", 0)),
+        max_node_rows=max_rows,
+        scans=scans,
+        cartesian=cartesian,
+        max_blocked_rows=max_blocked,
+    )
+
+
+def explain(connection, sql):
+    """Returns the PlanSummary for ``sql``, or None where the dialect has no JSON plans."""
+    if connection.dialect.name != "postgresql":
+        return None
+    from sqlalchemy import text
+
+    raw = connection.execute(text(f"EXPLAIN (FORMAT JSON) {strip_statement(sql)}")).scalar()
+    return summarise_plan(raw if isinstance(raw, list) else json.loads(raw))
+
+
+def _over_limits(summary, max_cost, max_rows):
+    if summary.total_cost > max_cost:
+        return f"estimated cost {summary.total_cost:,.0f} exceeds {max_cost:,.0f}"
+    if summary.max_node_rows > max_rows:
+        return f"estimated {summary.max_node_rows:,} rows processed exceeds {max_rows:,}"
+    return None
+
+
+def limited_sql(sql, limit=QUERY_DOWNGRADE_LIMIT):
+    return f"SELECT * FROM (\n{strip_statement(sql)}\n) AS _t2s_limited LIMIT {int(limit)}"
+
+
+def guard(connection, sql, max_cost=QUERY_MAX_COST, max_rows=QUERY_MAX_ROWS, action=QUERY_GUARD_ACTION):
+    """Decides whether ``sql`` may run as-is, must be limited, or is rejected."""
+    summary = explain(connection, sql)
+    if summary is None:
+        return GuardResult("run", sql)
+    reason = _over_limits(summary, max_cost, max_rows)
+    if reason is None:
+        return GuardResult("run", sql, summary)
+    if action != "downgrade":
+        return GuardResult("reject", sql, summary, reason)
+    if summary.max_blocked_rows > max_rows:
+        # A LIMIT on top would only cut the output; the aggregate or join still reads every row
+        return GuardResult("reject", sql, summary, f"{reason}; {summary.max_blocked_rows:,} rows feed an "
+                           "aggregate, sort or join, which a row limit doesn't bound")
+
+    downgraded = limited_sql(sql)
+    limited = explain(connection, downgraded)
+    # Child nodes keep their full row estimates under a LIMIT, so only the
+    # (early-terminating) total cost of the limited plan is meaningful here
+    if limited.total_cost <= max_cost:
+        return GuardResult("downgrade", downgraded, limited,
+                           f"{reason}; limited to {QUERY_DOWNGRADE_LIMIT:,} rows")
+    return GuardResult("reject", sql, summary, f"{reason}, even when limited")
@@ -0,0 +1,344 @@
+"""Cache of query results keyed on normalised SQL text.
+
+Each entry remembers the tables its query reads so it can be expired by
+per-table TTLs, invalidated explicitly, or invalidated by a pluggable change
+signal. Frames live in memory up to a byte budget; large frames and frames
+pushed out of memory are spilled to disk (Parquet when pyarrow is available).
+Spill files are written outside the cache lock, so readers never wait on disk
+I/O, and every hit is a copy of the cached frame, so a caller that sorts or
+adds columns doesn't change what others get.
+"""
+import hashlib
+import itertools
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from .config import (
+    RESULT_CACHE_DIR,
+    RESULT_CACHE_MAX_BYTES,
+    RESULT_CACHE_MAX_DISK_BYTES,
+    RESULT_CACHE_SPILL_BYTES,
+    RESULT_CACHE_TABLE_TTLS,
+    RESULT_CACHE_TTL,
+)
+
+_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_WHITESPACE = re.compile(r"\s+")
+_IDENTIFIER = re.compile(r"\"((?:[^\"]|\"\")+)\"|([A-Za-z_][\w$]*)")
+
+
+def normalise_sql(sql):
+    """Collapses whitespace and case outside string literals, drops comments and trailing ';'."""
+    parts = _QUOTED.split(sql.strip())
+    out = []
+    for i, part in enumerate(parts):
+        if i % 2:  # quoted literal or identifier: keep as-is
+            out.append(part)
+        else:
+            part = _COMMENT.sub(" ", part)
+            out.append(_WHITESPACE.sub(" ", part).lower())
+    return "".join(out).strip().rstrip(";").strip()
+
+
+def referenced_tables(sql, known_tables):
+    """Returns the known tables mentioned anywhere in the SQL (a safe over-approximation)."""
+    lookup = {name.lower(): name for name in known_tables}
+    found = set()
+    for quoted, bare in _IDENTIFIER.findall(_COMMENT.sub(" ", sql)):
+        if quoted:
+            name = quoted.replace('""', '"')
+            table = name if name in known_tables else None
+        else:
+            table = lookup.get(bare.lower())
+        if table:
+            found.add(table)
+    return frozenset(found)
+
+
+def parse_table_ttls(spec):
+    """Parses ``"events=30,orders=600"`` into ``{"events": 30.0, "orders": 600.0}``."""
+    ttls = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, seconds = item.partition("=")
+        ttls[name.strip()] = float(seconds)
+    return ttls
+
+
+def postgres_change_signal(get_engine):
+    """Change signal based on ``pg_stat_user_tables`` write counters.
+
+    The counters are updated when a writing transaction ends, so a change is
+    seen shortly after commit without touching the tables themselves.
+    ``get_engine()`` returns the engine to ask, which may be restarted in between.
+    """
+    from sqlalchemy import bindparam, text
+
+    query = text(
+        "SELECT relname, n_tup_ins, n_tup_upd, n_tup_del, n_live_tup "
+        "FROM pg_stat_user_tables WHERE relname IN :names"
+    ).bindparams(bindparam("names", expanding=True))
+
+    def signal(tables):
+        if not tables:
+            return {}
+        with get_engine().connect() as conn:
+            return {row[0]: tuple(row[1:]) for row in conn.execute(query, {"names": sorted(tables)})}
+
+    return signal
+
+
+class _Entry:
+    __slots__ = ("tables", "created_at", "expires_at", "nbytes", "frame", "path", "tokens", "spilling")
+
+    def __init__(self, tables, created_at, expires_at, nbytes, tokens):
+        self.tables = tables
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.nbytes = nbytes
+        self.tokens = tokens
+        self.frame = None
+        self.path = None
+        self.spilling = False  # its frame is being written to disk; still served from memory
+
+
+class ResultCache:
+    """Byte-bounded LRU cache of DataFrames with disk spill and per-table invalidation."""
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, spill_bytes=RESULT_CACHE_SPILL_BYTES,
+                 max_disk_bytes=RESULT_CACHE_MAX_DISK_BYTES, default_ttl=RESULT_CACHE_TTL,
+                 table_ttls=None, cache_dir=RESULT_CACHE_DIR, change_signal=None):
+        self.max_bytes = max_bytes
+        self.spill_bytes = spill_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.default_ttl = default_ttl
+        self.table_ttls = parse_table_ttls(RESULT_CACHE_TABLE_TTLS) if table_ttls is None else table_ttls
+        self.cache_dir = cache_dir
+        self.change_signal = change_signal
+        self.change_signals = {}  # database fingerprint -> change signal for its entries
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "spills": 0}
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._file_numbers = itertools.count()  # a new file per write, so rewrites of a key never collide
+
+    def set_change_signal(self, change_signal, database=None):
+        """``change_signal(tables) -> {table: token}``; an entry is stale once any token differs.
+
+        With ``database``, the signal only applies to keys ``(database, ...)``.
+        """
+        if database is None:
+            self.change_signal = change_signal
+        else:
+            self.change_signals[database] = change_signal
+
+    def has_change_signal(self, database=None):
+        return (self.change_signal if database is None else self.change_signals.get(database)) is not None
+
+    def _signal(self, key):
+        if self.change_signals and isinstance(key, tuple):
+            return self.change_signals.get(key[0], self.change_signal)
+        return self.change_signal
+
+    def get(self, key):
+        """Returns a copy of the cached frame for ``key``, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() > entry.expires_at:
+                self._remove(key)
+                self.counters["invalidations"] += 1
+                entry = None
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+        signal = self._signal(key)
+        if signal and entry.tables and signal(entry.tables) != entry.tokens:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._remove(key)
+                    self.counters["invalidations"] += 1
+                self.counters["misses"] += 1
+            return None
+
+        frame = entry.frame
+        if frame is None:
+            frame = self._read(entry)
+        with self._lock:
+            if frame is None:
+                if self._entries.get(key) is entry:
+                    self._remove(key)
+                self.counters["misses"] += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+        return frame.copy(deep=False)
+
+    def put(self, key, frame, tables=frozenset()):
+        nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+        ttl = min((self.table_ttls.get(t, self.default_ttl) for t in tables), default=self.default_ttl)
+        if ttl <= 0:
+            return
+        # The caller keeps its own frame; later changes to it must not reach the cache
+        frame = frame.copy(deep=False)
+        signal = self._signal(key)
+        tokens = signal(tables) if signal and tables else None
+        now = time.time()
+        entry = _Entry(tables, now, now + ttl, nbytes, tokens)
+        path = None
+        if nbytes > self.spill_bytes:
+            path = self._write(key, frame)
+            if path is None:
+                return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if path:
+                self._add_file(entry, path)
+            else:
+                entry.frame = frame
+                self.memory_bytes += nbytes
+            self._entries[key] = entry
+            victims = self._over_memory_budget()
+            self._enforce_disk_budget()
+        self._spill(victims)
+
+    def invalidate_tables(self, tables):
+        """Drops every entry that reads any of ``tables``."""
+        tables = set(tables)
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e.tables & tables]:
+                self._remove(key)
+                self.counters["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            spilled = sum(1 for e in self._entries.values() if e.path)
+            return dict(
+                self.counters,
+                entries=len(self._entries),
+                spilled_entries=spilled,
+                memory_bytes=self.memory_bytes,
+                disk_bytes=self.disk_bytes,
+            )
+
+    def _over_memory_budget(self):
+        """Marks least recently used in-memory frames for spilling until the rest fit; under the lock."""
+        victims = []
+        excess = self.memory_bytes - self.max_bytes
+        for key, entry in self._entries.items():
+            if excess <= 0:
+                break
+            if entry.frame is not None and not entry.spilling:
+                entry.spilling = True
+                victims.append((key, entry, entry.frame))
+                excess -= entry.nbytes
+        return victims
+
+    def _spill(self, victims):
+        """Writes ``victims`` to disk without the lock, then swaps each frame for its file."""
+        for key, entry, frame in victims:
+            path = self._write(key, frame)
+            with self._lock:
+                entry.spilling = False
+                if self._entries.get(key) is not entry or entry.frame is not frame:
+                    # Removed or replaced while it was being written
+                    if path:
+                        _delete(path)
+                    continue
+                entry.frame = None
+                self.memory_bytes -= entry.nbytes
+                if path:
+                    self._add_file(entry, path)
+                else:
+                    del self._entries[key]
+                    self.counters["evictions"] += 1
+                self._enforce_disk_budget()
+
+    def _enforce_disk_budget(self):
+        # The least recently used spilled frames are deleted; under the lock
+        while self.disk_bytes > self.max_disk_bytes and self._entries:
+            key = next((k for k, e in self._entries.items() if e.path), None)
+            if key is None:
+                break
+            self._remove(key)
+            self.counters["evictions"] += 1
+
+    def _add_file(self, entry, path):
+        entry.path = path
+        self.disk_bytes += os.path.getsize(path)
+        self.counters["spills"] += 1
+
+    def _write(self, key, frame):
+        """Writes ``frame`` to a new spill file; returns its path, or None."""
+        if self.max_disk_bytes <= 0:
+            return None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        base = os.path.join(self.cache_dir, f"{hashlib.sha1(repr(key).encode()).hexdigest()}-"
+                                            f"{os.getpid()}-{next(self._file_numbers)}")
+        try:
+            try:
+                frame.to_parquet(base + ".parquet")
+                return base + ".parquet"
+            except Exception:
+                # No pyarrow, or object columns Parquet can't represent
+                _delete(base + ".parquet")
+                frame.to_pickle(base + ".pkl")
+                return base + ".pkl"
+        except Exception as e:
+            print(f"--> result_cache: Could not spill result to disk: {e}")
+            return None
+
+    def _read(self, entry):
+        import pandas as pd
+
+        try:
+            if entry.path.endswith(".parquet"):
+                return pd.read_parquet(entry.path)
+            return pd.read_pickle(entry.path)
+        except Exception as e:
+            print(f"--> result_cache: Could not read spilled result {entry.path}: {e}")
+            return None
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        if entry.frame is not None:
+            self.memory_bytes -= entry.nbytes
+            entry.frame = None
+        if entry.path:
+            try:
+                self.disk_bytes -= os.path.getsize(entry.path)
+            except OSError:
+                pass
+            _delete(entry.path)
+            entry.path = None
+
+
+def _delete(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Process-wide result cache shared by all Streamlit sessions."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
@@ -0,0 +1,347 @@
+"""Reflected, cached model of the database schema.
+
+The catalog replaces per-question calls to ``SQLDatabase.get_table_info()``.
+Tables are reflected once, cached in memory and on disk keyed by a database
+fingerprint, and only tables whose change marker moved are reflected again.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+
+from .config import SCHEMA_CACHE_DIR, SCHEMA_REFRESH_INTERVAL
+
+CACHE_FORMAT = 1
+
+# One row per table: (table name, marker). The marker changes whenever the
+# table's columns, types, nullability or constraints change.
+_PG_MARKERS_SQL = """
+SELECT c.relname,
+       md5(string_agg(a.attname || ':' || format_type(a.atttypid, a.atttypmod)
+                      || ':' || a.attnotnull::text, ',' ORDER BY a.attnum))
+       || coalesce((SELECT md5(string_agg(pg_get_constraintdef(k.oid), ',' ORDER BY k.conname))
+                    FROM pg_constraint k WHERE k.conrelid = c.oid), '')
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE c.relkind IN ('r', 'p', 'f')
+  AND NOT c.relispartition
+  AND n.nspname = current_schema()
+GROUP BY c.oid, c.relname
+"""
+
+_SQLITE_MARKERS_SQL = """
+SELECT name, sql FROM sqlite_master
+WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+"""
+
+
+# Names that read the same quoted or not in every supported dialect
+_PLAIN_NAME = re.compile(r"[a-z_][a-z0-9_]*")
+
+
+def quote_name(name):
+    """``name`` as the model should write it: quoted when its case (or a character) matters."""
+    if _PLAIN_NAME.fullmatch(name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+@dataclass
+class Column:
+    name: str
+    type: str
+    nullable: bool = True
+
+
+@dataclass
+class ForeignKey:
+    columns: list
+    referred_table: str
+    referred_columns: list
+    name: str = None
+
+
+@dataclass
+class Table:
+    name: str
+    columns: list
+    primary_key: list = field(default_factory=list)
+    primary_key_name: str = None
+    foreign_keys: list = field(default_factory=list)
+    marker: str = ""
+
+    def column_names(self):
+        return [c.name for c in self.columns]
+
+    def ddl(self):
+        """Renders the table as a CREATE TABLE statement."""
+        lines = []
+        for col in self.columns:
+            lines.append(f"{quote_name(col.name)} {col.type}" + ("" if col.nullable else " NOT NULL"))
+        if self.primary_key:
+            prefix = f"CONSTRAINT {self.primary_key_name} " if self.primary_key_name else ""
+            lines.append(f"{prefix}PRIMARY KEY ({', '.join(map(quote_name, self.primary_key))})")
+        for fk in self.foreign_keys:
+            prefix = f"CONSTRAINT {fk.name} " if fk.name else ""
+            lines.append(
+                f"{prefix}FOREIGN KEY({', '.join(map(quote_name, fk.columns))}) "
+                f"REFERENCES {quote_name(fk.referred_table)} ({', '.join(map(quote_name, fk.referred_columns))})"
+            )
+        body = ", \n\t".join(lines)
+        return f"CREATE TABLE {quote_name(self.name)} (\n\t{body}\n)"
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "columns": [vars(c) for c in self.columns],
+            "primary_key": self.primary_key,
+            "primary_key_name": self.primary_key_name,
+            "foreign_keys": [vars(fk) for fk in self.foreign_keys],
+            "marker": self.marker,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            name=data["name"],
+            columns=[Column(**c) for c in data["columns"]],
+            primary_key=data.get("primary_key") or [],
+            primary_key_name=data.get("primary_key_name"),
+            foreign_keys=[ForeignKey(**fk) for fk in data.get("foreign_keys") or []],
+            marker=data.get("marker", ""),
+        )
+
+
+class SchemaCatalog:
+    """Structured schema for one database, with memoised DDL rendering."""
+
+    def __init__(self, fingerprint, tables):
+        self.fingerprint = fingerprint
+        self.tables = dict(sorted(tables.items()))
+        self.version = hashlib.sha1(
+            "|".join(f"{name}={t.marker}" for name, t in self.tables.items()).encode()
+        ).hexdigest()[:16]
+        self.checked_at = 0.0
+        self._ddl = {}
+        self._rendered = None
+
+    def table_names(self):
+        return list(self.tables)
+
+    def get_table(self, name):
+        return self.tables.get(name)
+
+    def ddl(self, name):
+        text = self._ddl.get(name)
+        if text is None:
+            text = self._ddl[name] = self.tables[name].ddl()
+        return text
+
+    def render(self, names=None):
+        """Returns CREATE TABLE statements for ``names`` (all tables by default)."""
+        if names is None:
+            if self._rendered is None:
+                self._rendered = "\n\n".join(self.ddl(n) for n in self.tables)
+            return self._rendered
+        return "\n\n".join(self.ddl(n) for n in names if n in self.tables)
+
+
+_catalogs = {}
+_fingerprints = {}
+_lock = threading.Lock()
+
+
+def database_fingerprint(engine):
+    """Stable identifier for the database an engine points at (password excluded)."""
+    key = id(engine)
+    fp = _fingerprints.get(key)
+    if fp is None:
+        fp = _fingerprints[key] = _url_hash(engine.url)
+    return fp
+
+
+def url_fingerprint(url):
+    """The fingerprint an engine for ``url`` will have, computed without creating one."""
+    from sqlalchemy.engine import make_url
+
+    return _url_hash(make_url(url))
+
+
+def _url_hash(url):
+    return hashlib.sha1(url.render_as_string(hide_password=True).encode()).hexdigest()[:16]
+
+
+def get_catalog(engine, refresh_interval=SCHEMA_REFRESH_INTERVAL, force_refresh=False):
+    """Returns the cached catalog, re-checking change markers at most every ``refresh_interval`` seconds."""
+    fingerprint = database_fingerprint(engine)
+    catalog = _catalogs.get(fingerprint)
+    if (
+        catalog is not None
+        and not force_refresh
+        and time.monotonic() - catalog.checked_at < refresh_interval
+    ):
+        return catalog
+
+    with _lock:
+        catalog = _catalogs.get(fingerprint)
+        if catalog is None:
+            catalog = _load_from_disk(fingerprint)
+        catalog = _refresh(engine, fingerprint, catalog)
+        catalog.checked_at = time.monotonic()
+        _catalogs[fingerprint] = catalog
+        return catalog
+
+
+def peek_catalog(fingerprint):
+    """The catalog last seen for ``fingerprint``, from memory or the disk cache, without
+    touching the database; None when there is none."""
+    catalog = _catalogs.get(fingerprint)
+    if catalog is None:
+        catalog = _load_from_disk(fingerprint)
+        if catalog is not None:
+            with _lock:
+                # checked_at stays 0, so the next get_catalog re-checks the database
+                catalog = _catalogs.setdefault(fingerprint, catalog)
+    return catalog
+
+
+def release(engine):
+    """Forgets an engine that is being disposed: its in-memory catalog and fingerprint."""
+    with _lock:
+        fingerprint = _fingerprints.pop(id(engine), None)
+        if fingerprint is not None:
+            _catalogs.pop(fingerprint, None)
+
+
+def invalidate(engine=None):
+    """Drops in-memory catalogs so the next lookup re-checks the database."""
+    with _lock:
+        if engine is None:
+            _catalogs.clear()
+        else:
+            _catalogs.pop(database_fingerprint(engine), None)
+
+
+def _refresh(engine, fingerprint, catalog):
+    markers = fetch_change_markers(engine)
+    known = catalog.tables if catalog is not None else {}
+    changed = [name for name, marker in markers.items()
+               if name not in known or known[name].marker != marker]
+    removed = [name for name in known if name not in markers]
+    if catalog is not None and not changed and not removed:
+        return catalog
+
+    print(f"--> schema_catalog: Reflecting {len(changed)} changed table(s), dropping {len(removed)}")
+    tables = {name: t for name, t in known.items() if name in markers and name not in changed}
+    for table in reflect_tables(engine, changed):
+        table.marker = markers[table.name]
+        tables[table.name] = table
+    catalog = SchemaCatalog(fingerprint, tables)
+    _save_to_disk(catalog)
+    return catalog
+
+
+def fetch_change_markers(engine):
+    """Returns ``{table_name: marker}`` using the cheapest query the dialect offers."""
+    from sqlalchemy import text
+
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        with engine.connect() as conn:
+            return {row[0]: row[1] for row in conn.execute(text(_PG_MARKERS_SQL))}
+    if dialect == "sqlite":
+        with engine.connect() as conn:
+            return {
+                row[0]: hashlib.md5((row[1] or "").encode()).hexdigest()
+                for row in conn.execute(text(_SQLITE_MARKERS_SQL))
+            }
+    # Other dialects: fall back to a column listing per table via the inspector.
+    from sqlalchemy import inspect
+
+    inspector = inspect(engine)
+    markers = {}
+    for name in inspector.get_table_names():
+        cols = inspector.get_columns(name)
+        signature = ",".join(f"{c['name']}:{c['type']}:{c.get('nullable')}" for c in cols)
+        markers[name] = hashlib.md5(signature.encode()).hexdigest()
+    return markers
+
+
+def reflect_tables(engine, names):
+    """Reflects columns, primary keys and foreign keys for the given tables."""
+    if not names:
+        return []
+    from sqlalchemy import inspect
+
+    inspector = inspect(engine)
+    tables = []
+    for name in names:
+        columns = [
+            Column(c["name"], _type_name(c["type"], engine.dialect), bool(c.get("nullable", True)))
+            for c in inspector.get_columns(name)
+        ]
+        pk = inspector.get_pk_constraint(name) or {}
+        fks = [
+            ForeignKey(
+                columns=list(fk["constrained_columns"]),
+                referred_table=fk["referred_table"],
+                referred_columns=list(fk["referred_columns"]),
+                name=fk.get("name"),
+            )
+            for fk in inspector.get_foreign_keys(name)
+        ]
+        tables.append(Table(
+            name=name,
+            columns=columns,
+            primary_key=list(pk.get("constrained_columns") or []),
+            primary_key_name=pk.get("name"),
+            foreign_keys=fks,
+        ))
+    return tables
+
+
+def _type_name(col_type, dialect):
+    try:
+        return str(col_type.compile(dialect=dialect))
+    except Exception:
+        return str(col_type)
+
+
+def _cache_path(fingerprint):
+    return os.path.join(SCHEMA_CACHE_DIR, f"{fingerprint}.json")
+
+
+def _load_from_disk(fingerprint):
+    path = _cache_path(fingerprint)
+    try:
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+        if data.get("format") != CACHE_FORMAT:
+            return None
+        tables = {t["name"]: Table.from_dict(t) for t in data["tables"]}
+        return SchemaCatalog(fingerprint, tables)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"--> schema_catalog: Ignoring unreadable cache file {path}: {e}")
+        return None
+
+
+def _save_to_disk(catalog):
+    path = _cache_path(catalog.fingerprint)
+    try:
+        os.makedirs(SCHEMA_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({
+                "format": CACHE_FORMAT,
+                "fingerprint": catalog.fingerprint,
+                "tables": [t.to_dict() for t in catalog.tables.values()],
+            }, fh)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"--> schema_catalog: Could not write cache file {path}: {e}")
@@ -0,0 +1,215 @@
+"""Schema linking: picks the tables relevant to a question before prompting.
+
+A lexical inverted index is built once per catalog version over table names,
+column names and foreign-key neighbourhoods. For each question the top-k
+tables are selected, connected through their shortest foreign-key join paths
+and rendered as DDL within a token budget.
+"""
+import math
+import re
+import threading
+from collections import defaultdict, deque
+
+from .config import SCHEMA_TOKEN_BUDGET, SCHEMA_TOP_K
+
+# Field weights: a hit on a table name says more than a hit on a column name,
+# which in turn says more than a hit on a neighbouring table.
+TABLE_WEIGHT = 3.0
+COLUMN_WEIGHT = 1.0
+NEIGHBOUR_WEIGHT = 0.5
+MAX_JOIN_HOPS = 3
+
+_STOPWORDS = frozenset("""
+a an and are as at be by do does for from get give how i in is it list me many much my
+of on or per show tell than that the their them there these this those to was were what
+when where which who whom whose why with all each every any top most least number
+""".split())
+
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_WORD = re.compile(r"[A-Za-z0-9]+")
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English/SQL)."""
+    return (len(text) + 3) // 4
+
+
+def _stem(token):
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("es") and token[-3] in "sxz":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Splits identifiers and prose into lower-case, lightly stemmed terms."""
+    terms = []
+    for word in _WORD.findall(_CAMEL.sub(" ", text)):
+        word = word.lower()
+        if word in _STOPWORDS or word.isdigit():
+            continue
+        terms.append(_stem(word))
+    return terms
+
+
+class SchemaIndex:
+    """Inverted index and foreign-key graph for one catalog version."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.postings = defaultdict(dict)  # term -> {table: weight}
+        self.graph = defaultdict(dict)  # table -> {neighbour: join condition}
+
+        for name, table in catalog.tables.items():
+            for fk in table.foreign_keys:
+                if fk.referred_table not in catalog.tables:
+                    continue
+                condition = " AND ".join(
+                    f"{name}.{c} = {fk.referred_table}.{r}"
+                    for c, r in zip(fk.columns, fk.referred_columns)
+                )
+                self.graph[name].setdefault(fk.referred_table, condition)
+                self.graph[fk.referred_table].setdefault(name, condition)
+
+        for name, table in catalog.tables.items():
+            self._add(name, tokenize(name), TABLE_WEIGHT)
+            for col in table.columns:
+                self._add(name, tokenize(col.name), COLUMN_WEIGHT)
+            for neighbour in self.graph.get(name, ()):
+                self._add(name, tokenize(neighbour), NEIGHBOUR_WEIGHT)
+
+        n_tables = max(len(catalog.tables), 1)
+        self.idf = {
+            term: math.log(1 + n_tables / len(tables))
+            for term, tables in self.postings.items()
+        }
+
+    def _add(self, table, terms, weight):
+        for term in terms:
+            postings = self.postings[term]
+            postings[table] = max(postings.get(table, 0.0), weight)
+
+    def rank(self, question):
+        """Returns ``[(table, score), ...]`` for tables matching the question, best first."""
+        scores = defaultdict(float)
+        for term in set(tokenize(question)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for table, weight in self.postings[term].items():
+                scores[table] += idf * weight
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def coverage(self, question):
+        """How well the schema covers ``question``: the best weight of each question term, summed.
+
+        Unlike rank scores this doesn't grow with the number of tables, so
+        schemas of different databases can be compared.
+        """
+        return sum(max(self.postings[term].values()) for term in set(tokenize(question)) if term in self.postings)
+
+    def join_path(self, source, target, max_hops=MAX_JOIN_HOPS):
+        """Shortest foreign-key path from ``source`` to ``target`` as a list of tables."""
+        if source == target:
+            return [source]
+        previous = {source: None}
+        queue = deque([(source, 0)])
+        while queue:
+            node, depth = queue.popleft()
+            if depth >= max_hops:
+                continue
+            for neighbour in self.graph.get(node, ()):
+                if neighbour in previous:
+                    continue
+                previous[neighbour] = node
+                if neighbour == target:
+                    path = [target]
+                    while previous[path[-1]] is not None:
+                        path.append(previous[path[-1]])
+                    return path[::-1]
+                queue.append((neighbour, depth + 1))
+        return None
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_index(catalog):
+    """Returns the index for ``catalog``, building it once per catalog version."""
+    key = (catalog.fingerprint, catalog.version)
+    index = _indexes.get(key)
+    if index is None:
+        with _lock:
+            index = _indexes.get(key)
+            if index is None:
+                # Older versions of the same database are no longer needed
+                for old_key in [k for k in _indexes if k[0] == catalog.fingerprint]:
+                    del _indexes[old_key]
+                index = _indexes[key] = SchemaIndex(catalog)
+    return index
+
+
+def drop_indexes(fingerprint):
+    """Frees the indexes of a database that is no longer in use."""
+    with _lock:
+        for key in [k for k in _indexes if k[0] == fingerprint]:
+            del _indexes[key]
+
+
+def select_tables(catalog, question, top_k=SCHEMA_TOP_K):
+    """Returns the top-k relevant tables plus the bridge tables needed to join them."""
+    index = get_index(catalog)
+    ranked = [name for name, _ in index.rank(question)[:top_k]]
+    if not ranked:
+        # Nothing matched lexically: fall back to the best-connected tables
+        ranked = sorted(catalog.tables, key=lambda n: (-len(index.graph.get(n, ())), n))[:top_k]
+
+    selected = list(ranked)
+    joins = []
+    seen_edges = set()
+    anchor = ranked[0] if ranked else None
+    for name in ranked[1:]:
+        path = index.join_path(anchor, name)
+        if not path:
+            continue
+        for left, right in zip(path, path[1:]):
+            edge = frozenset((left, right))
+            if edge in seen_edges:
+                continue
+            seen_edges.add(edge)
+            joins.append(index.graph[left][right])
+            for table in (left, right):
+                if table not in selected:
+                    selected.append(table)
+    return selected, joins
+
+
+def build_schema_context(catalog, question, top_k=SCHEMA_TOP_K, token_budget=SCHEMA_TOKEN_BUDGET):
+    """Renders the DDL of the relevant tables and their join paths within ``token_budget``."""
+    selected, joins = select_tables(catalog, question, top_k)
+
+    used = 0
+    included = set()
+    for name in selected:
+        cost = estimate_tokens(catalog.ddl(name)) + 1
+        if included and used + cost > token_budget:
+            continue
+        included.add(name)
+        used += cost
+    # Catalog (name) order rather than relevance order: questions about the same
+    # tables then produce the same prompt prefix, which Ollama serves from its cache
+    parts = [catalog.ddl(name) for name in sorted(included)]
+
+    join_lines = [
+        condition for condition in joins
+        if all(ref.split(".")[0] in included for ref in re.findall(r"\w+\.\w+", condition))
+    ]
+    if join_lines:
+        join_text = "-- Join paths:\n" + "\n".join(f"-- {line}" for line in join_lines)
+        if used + estimate_tokens(join_text) <= token_budget:
+            parts.append(join_text)
+    return "\n\n".join(parts)
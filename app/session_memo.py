@@ -0,0 +1,128 @@
+"""Per-session memo of answered questions, so Streamlit reruns redraw instead of recomputing.
+
+Streamlit reruns ``main.py`` on every widget interaction. Entries are keyed on
+the normalised question and the schema version and hold the generated SQL,
+the guard result, row counts, and each fetched page with its prepared chart.
+The memo lives in ``st.session_state``. It is bounded by entry count and by
+the bytes of the frames it holds, and evicts the least recently used entries.
+Pages older than SESSION_MEMO_TTL are fetched again. Across sessions, the
+process-wide SQL and result caches serve repeated work.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from .config import SESSION_MEMO_MAX_BYTES, SESSION_MEMO_MAX_ENTRIES, SESSION_MEMO_TTL
+from .sql_cache import normalise_question
+
+STATE_KEY = "_answers"
+
+
+@dataclass
+class MemoPage:
+    frame: object
+    has_more: bool
+    nbytes: int
+    fetched_at: float
+    chart: object = None
+    chart_ready: bool = False
+
+
+@dataclass
+class MemoEntry:
+    question: str
+    version: str
+    generated: object  # GeneratedSql
+    guard: object = None  # GuardResult
+    remembered: bool = False
+    accepted: bool = False
+    counts: dict = field(default_factory=dict)  # sql -> (row_count, exact)
+    pages: dict = field(default_factory=dict)  # (sql, page) -> MemoPage
+
+    @property
+    def nbytes(self):
+        return sum(p.nbytes for p in self.pages.values())
+
+
+class SessionMemo:
+    def __init__(self, state, max_entries=SESSION_MEMO_MAX_ENTRIES, max_bytes=SESSION_MEMO_MAX_BYTES,
+                 ttl=SESSION_MEMO_TTL):
+        if STATE_KEY not in state:
+            state[STATE_KEY] = OrderedDict()
+        self._entries = state[STATE_KEY]
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(question, version):
+        return normalise_question(question), version
+
+    def get(self, question, version):
+        """The entry for ``question`` under schema ``version``, or None."""
+        key = self._key(question, version)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, question, version, generated):
+        """Starts a new entry for freshly generated SQL."""
+        key = self._key(question, version)
+        entry = self._entries[key] = MemoEntry(question, version, generated)
+        self._entries.move_to_end(key)
+        self._evict(keep=key)
+        return entry
+
+    def drop(self, question, version):
+        self._entries.pop(self._key(question, version), None)
+
+    def page(self, entry, sql, page):
+        """A fetched page of ``sql`` that is still fresh, or None."""
+        cached = entry.pages.get((sql, page))
+        if cached is not None and self.ttl > 0 and time.time() - cached.fetched_at > self.ttl:
+            del entry.pages[(sql, page)]
+            cached = None
+        return cached
+
+    def store_page(self, entry, sql, page, frame, has_more):
+        nbytes = int(frame.memory_usage(index=True, deep=True).sum()) if frame is not None else 0
+        stored = entry.pages[(sql, page)] = MemoPage(frame, has_more, nbytes, time.time())
+        self._evict(keep=self._key(entry.question, entry.version), keep_page=(sql, page))
+        return stored
+
+    def clear_pages(self, question, version):
+        """Forgets fetched pages and counts so the query runs again; the SQL is kept."""
+        entry = self._entries.get(self._key(question, version))
+        if entry is not None:
+            entry.pages.clear()
+            entry.counts.clear()
+
+    def _evict(self, keep, keep_page=None):
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            del self._entries[oldest]
+        total = sum(e.nbytes for e in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                return
+            if key == keep:
+                continue
+            total -= self._entries.pop(key).nbytes
+        # Still over budget: drop the current entry's other pages, then keep only the page being shown
+        entry = self._entries.get(keep)
+        if entry is None:
+            return
+        for page_key in [k for k in entry.pages if k != keep_page]:
+            if total <= self.max_bytes:
+                return
+            total -= entry.pages.pop(page_key).nbytes
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "pages": sum(len(e.pages) for e in self._entries.values()),
+            "bytes": sum(e.nbytes for e in self._entries.values()),
+        }
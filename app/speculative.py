@@ -0,0 +1,271 @@
+"""Speculative SQL generation: several candidates per question, the fastest valid one wins.
+
+A single generation that comes back wrong, or slow, sets the latency of the
+whole answer. With ``SQL_CANDIDATES`` > 1, :func:`speculate` instead asks the
+model for several candidates at once, at different temperatures and seeds:
+
+1. candidates are generated in parallel; once the first one passes local
+   validation, slower ones get ``SQL_CANDIDATE_GRACE`` seconds before they
+   are cancelled;
+2. valid candidates (identical SQL counted once, as extra votes) are checked
+   with the EXPLAIN guard and ordered by estimated cost, then by arrival;
+3. the ``SQL_CANDIDATE_RUNS`` cheapest run concurrently for up to
+   ``SQL_CANDIDATE_TIMEOUT`` seconds. With ``SQL_CANDIDATE_PICK=first`` the
+   first to succeed wins and the others are cancelled on the server; with
+   ``agreement`` the result returned by most candidates wins.
+
+The winning query runs exactly as the caller will fetch it (the first page,
+under paging), so with the result cache on, fetching it again is a cache hit.
+Each question holds up to ``SQL_CANDIDATES`` generation slots, so the mode
+trades throughput for tail latency.
+"""
+import contextvars
+import hashlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from .config import (DB_POOL_SIZE, OLLAMA_MAX_QUEUE, OLLAMA_NUM_PARALLEL, QUERY_GUARD, RESULT_PAGE_SIZE,
+                     SQL_CANDIDATE_GRACE, SQL_CANDIDATE_PICK, SQL_CANDIDATE_RUNS, SQL_CANDIDATE_TEMPERATURES,
+                     SQL_CANDIDATE_TIMEOUT, SQL_CANDIDATES)
+from .db_config import check_query, run_query, run_query_page
+from .instrumentation import span
+from .llm_client import LLMCancelled, get_llm_client
+from .llm_utils import generate_sql
+from .query_guard import GuardResult
+from .result_cache import normalise_sql
+from .sql_validation import clean_sql, validate_sql
+
+# How often the calling thread relays partial SQL and checks for finished work
+POLL_INTERVAL = 0.05
+# Seeds of successive candidates, so reruns of a question draw the same candidates
+SEED_BASE = 7
+
+# Candidates are generated and their queries run on separate pools, as in batch mode, so
+# queries of one question never wait behind generations of another. Generation threads
+# mostly wait in the LLM client's priority queue, which is bounded by OLLAMA_MAX_QUEUE;
+# query threads are bounded by the connection pool
+_generation_workers = ThreadPoolExecutor(max_workers=OLLAMA_NUM_PARALLEL + OLLAMA_MAX_QUEUE,
+                                         thread_name_prefix="speculative-llm")
+_query_workers = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="speculative-db")
+_warned_slots = False
+
+
+class _Cancelled(Exception):
+    """Raised in a losing query's wait loop to cancel it on the server."""
+
+
+@dataclass
+class Candidate:
+    index: int
+    options: dict
+    response: str = ""
+    sql: str = None  # cleaned; None when the response held no SQL
+    errors: list = field(default_factory=list)  # validation problems
+    metrics: dict = field(default_factory=dict)
+    error: Exception = None  # generation or query failure
+    votes: int = 1  # candidates that produced the same SQL
+    guard: GuardResult = None
+    frame: object = None
+    has_more: bool = False
+    finished_at: float = None  # when its query succeeded
+
+    @property
+    def valid(self):
+        return self.sql is not None and not self.errors and self.error is None
+
+    @property
+    def cost(self):
+        summary = self.guard.summary if self.guard else None
+        return summary.total_cost if summary else None
+
+
+@dataclass
+class Speculation:
+    requested: int
+    candidates: list  # answered ones, in arrival order
+    winner: Candidate = None  # None when no candidate was valid
+    executed: int = 0
+    agreement: int = 0  # votes for the winning result
+
+    @property
+    def valid(self):
+        return [c for c in self.candidates if c.valid]
+
+    def describe(self):
+        return {"candidates": self.requested, "answered": len(self.candidates), "valid": len(self.valid),
+                "executed": self.executed, "winner": self.winner.index if self.winner else None,
+                "agreement": self.agreement}
+
+
+def parse_temperatures(spec):
+    """``"0,0.4,0.7"`` -> ``[0.0, 0.4, 0.7]``."""
+    return [float(t) for t in spec.split(",") if t.strip()] or [0.0]
+
+
+def candidate_options(n, temperatures=None):
+    """Ollama options for ``n`` candidates: the temperatures in turn, a different seed each."""
+    temperatures = temperatures or parse_temperatures(SQL_CANDIDATE_TEMPERATURES)
+    return [{"temperature": temperatures[i % len(temperatures)], "seed": SEED_BASE + i} for i in range(n)]
+
+
+def speculate(question, schema, catalog, examples=(), dialect="postgresql", on_token=None, priority=0,
+              n=SQL_CANDIDATES, page=0, page_size=RESULT_PAGE_SIZE, runs=SQL_CANDIDATE_RUNS,
+              timeout=SQL_CANDIDATE_TIMEOUT, pick=SQL_CANDIDATE_PICK, grace=SQL_CANDIDATE_GRACE):
+    """Generates ``n`` candidates for ``question`` and runs the cheapest valid ones; returns a Speculation.
+
+    ``on_token`` receives the first candidate's partial SQL on the calling
+    thread. ``page`` (None for the whole result) is what the winner is run
+    as. When no candidate is valid, the winner is None and the caller decides
+    (e.g. asks for a repair); when no query finishes in time, the winner is
+    the cheapest valid candidate, not yet run.
+    """
+    _check_slots(n)
+    with span("speculation", candidates=n, pick=pick) as speculation_span:
+        candidates = _generate(question, schema, catalog, examples, dialect, on_token, priority, n, grace)
+        speculation = Speculation(n, candidates)
+        ranked = _rank(_unique(speculation.valid))
+        if ranked:
+            speculation.winner, speculation.executed, speculation.agreement = _race(
+                ranked[:max(runs, 1)], page, page_size, timeout, pick)
+            if speculation.winner is None:
+                speculation.winner = next((c for c in ranked if c.error is None), ranked[0])
+        speculation_span.set(**speculation.describe())
+    return speculation
+
+
+def _check_slots(n):
+    global _warned_slots
+    slots = get_llm_client().max_concurrency
+    if n > slots and not _warned_slots:
+        _warned_slots = True
+        print(f"--> speculative: {n} candidates but OLLAMA_NUM_PARALLEL={slots}; "
+              "the extra candidates queue instead of running in parallel")
+
+
+def _submit(pool, fn, *args):
+    # A fresh copy per task: the current data source and trace follow it into the worker
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _generate(question, schema, catalog, examples, dialect, on_token, priority, n, grace):
+    cancel = threading.Event()
+    partial = [None]
+    relayed = None
+
+    def run(candidate):
+        relay = (lambda text: partial.__setitem__(0, text)) if candidate.index == 0 and on_token else None
+        try:
+            candidate.response = generate_sql(schema, question, on_token=relay, metrics=candidate.metrics,
+                                              priority=priority, examples=examples, dialect=dialect,
+                                              options=candidate.options, cancel=cancel)
+        except Exception as e:
+            candidate.error = e
+            return candidate
+        candidate.sql = clean_sql(candidate.response)
+        if candidate.sql:
+            candidate.errors = validate_sql(candidate.sql, catalog, dialect).errors
+        return candidate
+
+    pending = {_submit(_generation_workers, run, Candidate(i, options))
+               for i, options in enumerate(candidate_options(n))}
+    arrived = []
+    deadline = None
+    try:
+        while pending and (deadline is None or time.monotonic() < deadline):
+            done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                arrived.append(future.result())
+                if deadline is None and arrived[-1].valid:
+                    deadline = time.monotonic() + grace
+            if on_token and partial[0] is not None and partial[0] is not relayed:
+                relayed = partial[0]
+                on_token(relayed)
+    finally:
+        # Stragglers (or everything, when the caller is interrupted) hang up on Ollama
+        cancel.set()
+    if pending:
+        print(f"--> speculative: Cancelled {len(pending)} slower candidate(s)")
+    return [c for c in arrived if not isinstance(c.error, LLMCancelled)]
+
+
+def _unique(candidates):
+    """One candidate per distinct normalised SQL, carrying the others as votes."""
+    unique = {}
+    for candidate in candidates:
+        key = normalise_sql(candidate.sql)
+        if key in unique:
+            unique[key].votes += 1
+        else:
+            unique[key] = candidate
+    return list(unique.values())
+
+
+def _rank(candidates):
+    """Valid candidates the guard lets run, cheapest first; arrival order where there is no cost."""
+    if QUERY_GUARD and candidates:
+        futures = [_submit(_query_workers, check_query, c.sql) for c in candidates]
+        for candidate, future in zip(candidates, futures):
+            candidate.guard = future.result()
+        runnable = [c for c in candidates if c.guard.action != "reject"]
+        # Everything rejected: the caller's own guard check reports it
+        candidates = runnable or candidates[:1]
+    else:
+        for candidate in candidates:
+            candidate.guard = GuardResult("run", candidate.sql)
+    order = {id(c): i for i, c in enumerate(candidates)}
+    return sorted(candidates, key=lambda c: (c.cost is None, c.cost or 0.0, order[id(c)]))
+
+
+def _race(candidates, page, page_size, timeout, pick):
+    """Runs ``candidates`` at once; returns ``(winner or None, executed, agreement)``."""
+    cancel = threading.Event()
+
+    def on_wait():
+        if cancel.is_set():
+            raise _Cancelled()
+
+    def run(candidate):
+        sql = candidate.guard.sql
+        try:
+            if page is None:
+                candidate.frame = run_query(sql, on_wait=on_wait)
+            else:
+                candidate.frame, candidate.has_more = run_query_page(sql, page, page_size, on_wait=on_wait)
+            candidate.finished_at = time.monotonic()
+        except Exception as e:
+            candidate.error = e
+        return candidate
+
+    pending = {_submit(_query_workers, run, c) for c in candidates}
+    deadline = time.monotonic() + timeout
+    succeeded = []
+    try:
+        while pending and time.monotonic() < deadline:
+            done, pending = wait(pending, timeout=min(POLL_INTERVAL, max(deadline - time.monotonic(), 0)),
+                                 return_when=FIRST_COMPLETED)
+            succeeded.extend(c for c in (f.result() for f in done) if c.error is None)
+            if succeeded and pick != "agreement":
+                break
+    finally:
+        # Losers notice within one wait tick and cancel their query on the server
+        cancel.set()
+    if not succeeded:
+        return None, len(candidates), 0
+    if pick != "agreement":
+        return succeeded[0], len(candidates), succeeded[0].votes
+    groups = {}
+    for candidate in succeeded:
+        groups.setdefault(_result_signature(candidate.frame), []).append(candidate)
+    # Most votes wins; on a tie, the group whose first result came in earliest
+    best = max(groups.values(), key=lambda g: (sum(c.votes for c in g), -min(c.finished_at for c in g)))
+    return min(best, key=lambda c: c.finished_at), len(candidates), sum(c.votes for c in best)
+
+
+def _result_signature(frame):
+    """Identifies a result by its shape and values, ignoring column names and row order."""
+    import pandas as pd
+
+    rows = pd.util.hash_pandas_object(frame, index=False).sort_values().to_numpy()
+    return frame.shape, hashlib.sha1(rows.tobytes()).hexdigest()
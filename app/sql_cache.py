@@ -0,0 +1,295 @@
+"""Cache of generated SQL keyed on (schema fingerprint, normalised question).
+
+Two tiers: an exact match on the normalised question, then (off by default)
+a near-duplicate match using cosine similarity of hashed character n-gram
+vectors held in a NumPy matrix. A near-duplicate must also use the same
+content words in the same order, so a high cosine can't hide "not", "desc",
+"before" or swapped operands ("north compared to west" vs. "west compared to
+north"). Entries are bounded (LRU), expire after a TTL, can be persisted to
+SQLite so Streamlit sessions and processes share them, and are dropped
+automatically when the schema version changes.
+"""
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .config import (
+    SQL_CACHE_MAX_ENTRIES,
+    SQL_CACHE_PATH,
+    SQL_CACHE_SIMILARITY,
+    SQL_CACHE_TTL,
+)
+
+NGRAM_SIZE = 3
+VECTOR_DIM = 2048
+
+_NUMBER = re.compile(r"(?<![\w.])\d[\d,]*(?:\.\d+)?")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+# Words that don't change which SQL answers a question; everything else, including
+# negations (not, no, without, never, except), ordering (asc, desc, top, least, first),
+# comparisons (more, less, before, after) and direction (from, to, by, for, in, on),
+# must match, in order, for a near-duplicate
+_FILLER_WORDS = frozenset(
+    "a an the of me us my our please show list give get find display return tell "
+    "what which who whose is are was were be do does did can could would i we you there".split())
+
+
+def _canonical_number(match):
+    literal = match.group(0).replace(",", "")
+    if "." in literal:
+        literal = literal.rstrip("0").rstrip(".")
+    return literal.lstrip("0") or "0"
+
+
+def normalise_question(question):
+    """Lower-cases and strips punctuation/extra whitespace; number literals are canonicalised.
+
+    Numbers are kept (``1,000`` and ``1000.0`` both become ``1000``) because they
+    usually change the meaning of the SQL, e.g. "top 5" vs "top 10".
+    """
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = _NUMBER.sub(_canonical_number, text)
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _numbers(normalised):
+    return tuple(sorted(re.findall(r"\d+", normalised)))
+
+
+def content_words(normalised):
+    """The words of a normalised question that affect its SQL, lightly stemmed, in order."""
+    words = []
+    for word in normalised.split():
+        if word == "t":
+            word = "not"  # "haven't" normalises to "haven t"
+        if word in _FILLER_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]  # plurals: "customers" matches "customer"
+        words.append(word)
+    return tuple(words)
+
+
+def ngram_vector(normalised):
+    """Unit-length hashed character n-gram vector for a normalised question."""
+    import numpy as np
+
+    vec = np.zeros(VECTOR_DIM, dtype=np.float32)
+    padded = f" {normalised} "
+    for i in range(len(padded) - NGRAM_SIZE + 1):
+        vec[zlib.crc32(padded[i:i + NGRAM_SIZE].encode()) % VECTOR_DIM] += 1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class _Entry:
+    __slots__ = ("sql", "created_at", "vector", "numbers", "words")
+
+    def __init__(self, sql, created_at, normalised):
+        self.sql = sql
+        self.created_at = created_at
+        self.vector = ngram_vector(normalised)
+        self.numbers = _numbers(normalised)
+        self.words = content_words(normalised)
+
+
+class SqlCache:
+    """Bounded LRU/TTL cache of generated SQL with an optional SQLite store."""
+
+    def __init__(self, max_entries=SQL_CACHE_MAX_ENTRIES, ttl=SQL_CACHE_TTL,
+                 similarity=SQL_CACHE_SIMILARITY, path=SQL_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.path = path
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (fingerprint, normalised) -> _Entry
+        self._versions = {}  # fingerprint -> current schema version
+        self._matrix = {}  # fingerprint -> (keys, matrix), rebuilt lazily
+        self._lock = threading.Lock()
+        if path:
+            with self._connect() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS sql_cache (
+                        fingerprint TEXT NOT NULL,
+                        version TEXT NOT NULL,
+                        normalised TEXT NOT NULL,
+                        sql TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        PRIMARY KEY (fingerprint, normalised)
+                    )
+                """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, fingerprint, version, question):
+        """Returns cached SQL for the question, or None."""
+        normalised = normalise_question(question)
+        with self._lock:
+            self._check_version(fingerprint, version)
+            key = (fingerprint, normalised)
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.sql
+
+            if self.path:
+                # Another session or process may have stored it since we loaded
+                entry = self._load_one(fingerprint, version, normalised)
+                if entry is not None:
+                    self._insert(key, entry)
+                    self.hits += 1
+                    return entry.sql
+
+            sql = self._similar(fingerprint, normalised)
+            if sql is not None:
+                self.similar_hits += 1
+                return sql
+            self.misses += 1
+            return None
+
+    def put(self, fingerprint, version, question, sql):
+        normalised = normalise_question(question)
+        now = time.time()
+        with self._lock:
+            self._check_version(fingerprint, version)
+            self._insert((fingerprint, normalised), _Entry(sql, now, normalised))
+        if self.path:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO sql_cache VALUES (?, ?, ?, ?, ?)",
+                    (fingerprint, version, normalised, sql, now),
+                )
+
+    def invalidate(self, fingerprint=None):
+        with self._lock:
+            for key in [k for k in self._entries if fingerprint is None or k[0] == fingerprint]:
+                self._drop(key)
+        if self.path:
+            with self._connect() as conn:
+                if fingerprint is None:
+                    conn.execute("DELETE FROM sql_cache")
+                else:
+                    conn.execute("DELETE FROM sql_cache WHERE fingerprint = ?", (fingerprint,))
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+        }
+
+    def _expired(self, entry):
+        return self.ttl > 0 and time.time() - entry.created_at > self.ttl
+
+    def _insert(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._matrix.pop(key[0], None)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        del self._entries[key]
+        self._matrix.pop(key[0], None)
+
+    def _check_version(self, fingerprint, version):
+        """Drops entries generated against an older schema and loads persisted ones."""
+        current = self._versions.get(fingerprint)
+        if current == version:
+            return
+        self._versions[fingerprint] = version
+        for key in [k for k in self._entries if k[0] == fingerprint]:
+            self._drop(key)
+        if self.path:
+            self._load(fingerprint, version)
+
+    def _load(self, fingerprint, version):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM sql_cache WHERE fingerprint = ? AND version != ?",
+                (fingerprint, version),
+            )
+            if self.ttl > 0:
+                conn.execute("DELETE FROM sql_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            rows = conn.execute(
+                "SELECT normalised, sql, created_at FROM sql_cache WHERE fingerprint = ? "
+                "ORDER BY created_at DESC LIMIT ?",
+                (fingerprint, self.max_entries),
+            ).fetchall()
+        for normalised, sql, created_at in reversed(rows):
+            self._insert((fingerprint, normalised), _Entry(sql, created_at, normalised))
+
+    def _load_one(self, fingerprint, version, normalised):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT sql, created_at FROM sql_cache "
+                "WHERE fingerprint = ? AND version = ? AND normalised = ?",
+                (fingerprint, version, normalised),
+            ).fetchone()
+        if row is None:
+            return None
+        entry = _Entry(row[0], row[1], normalised)
+        return None if self._expired(entry) else entry
+
+    def _similar(self, fingerprint, normalised):
+        if self.similarity >= 1.0:
+            return None
+        import numpy as np
+
+        cached = self._matrix.get(fingerprint)
+        if cached is None:
+            keys = [k for k in self._entries if k[0] == fingerprint]
+            if not keys:
+                return None
+            matrix = np.vstack([self._entries[k].vector for k in keys])
+            cached = self._matrix[fingerprint] = (keys, matrix)
+        keys, matrix = cached
+        scores = matrix @ ngram_vector(normalised)
+        numbers = _numbers(normalised)
+        words = content_words(normalised)
+        # Best candidates first; a near-duplicate must use the same numbers and content words
+        for i in np.argsort(scores)[::-1][:5]:
+            if scores[i] < self.similarity:
+                break
+            entry = self._entries.get(keys[i])
+            if entry is None or self._expired(entry) or entry.numbers != numbers or entry.words != words:
+                continue
+            self._entries.move_to_end(keys[i])
+            return entry.sql
+        return None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_sql_cache():
+    """Process-wide cache shared by all Streamlit sessions."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SqlCache()
+    return _cache
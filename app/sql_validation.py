@@ -0,0 +1,268 @@
+"""Local checks on generated SQL before it is sent to the database.
+
+:func:`clean_sql` fixes what models commonly wrap around a statement
+(markdown fences, prose before or after it, trailing semicolons).
+:func:`validate_sql` then checks that the statement is a single read-only
+query that parses, and that the tables and columns it names exist in the
+cached schema catalog. Parsing and column checks use sqlglot when it is
+installed; without it a lexical check covers statement type, balanced
+quotes/parentheses and table names.
+"""
+import re
+from dataclasses import dataclass, field
+
+from .llm_utils import find_statement_end
+
+_FENCED = re.compile(r"```[ \t]*(?:sql|postgresql|postgres)?[ \t]*\n?(.*?)(?:```|$)", re.IGNORECASE | re.DOTALL)
+# A statement at the start of a line; WITH only when a CTE follows, so prose "With ..." doesn't match
+_STATEMENT_LINE = re.compile(r"^[ \t]*(?:SELECT\b|WITH\s+(?:RECURSIVE\s+)?\w+\s*(?:\([^)]*\)\s*)?AS\b)",
+                             re.IGNORECASE | re.MULTILINE)
+_STATEMENT_WORD = re.compile(r"\b(?:SELECT|WITH)\b")
+_READ_ONLY_START = re.compile(r"^\s*(?:\(\s*)*(?:SELECT|WITH|VALUES|TABLE)\b", re.IGNORECASE)
+# Data-modifying statements PostgreSQL allows inside a WITH clause
+_WRITE_STATEMENT = re.compile(r"\b(?:INSERT\s+INTO|UPDATE\s+[\w.]+\s+SET|DELETE\s+FROM|MERGE\s+INTO)\b",
+                              re.IGNORECASE)
+# First words of paragraphs that continue a statement; any other paragraph after it is prose
+_CONTINUATION = re.compile(
+    r"^\s*(?:--|/\*|[(),]|(?:FROM|WHERE|GROUP|ORDER|HAVING|LIMIT|OFFSET|FETCH|JOIN|LEFT|RIGHT|INNER|FULL|"
+    r"CROSS|NATURAL|LATERAL|UNION|EXCEPT|INTERSECT|WINDOW|AND|OR|ON|USING|SELECT|WITH|AS|CASE|WHEN|THEN|ELSE|"
+    r"END|NOT|IN|EXISTS|BETWEEN|IS|LIKE|ILIKE|FILTER|OVER|PARTITION|RETURNING)\b)", re.IGNORECASE)
+# String literals, quoted identifiers and comments, blanked out before lexical checks
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_TABLE_REFERENCE = re.compile(r"(?<!DISTINCT )\b(?:FROM|JOIN)\s+((?:\w+\.)?\w+)", re.IGNORECASE)
+# Functions whose arguments use FROM, e.g. EXTRACT(YEAR FROM created_at)
+_FROM_FUNCTIONS = re.compile(r"\b(?:EXTRACT|SUBSTRING|TRIM|OVERLAY)\s*\([^()]*\)", re.IGNORECASE)
+_CTE_NAME = re.compile(
+    r"(?:\bWITH(?:\s+RECURSIVE)?|,)\s*(\w+)\s*(?:\([^)]*\)\s*)?AS\s*(?:NOT\s+)?(?:MATERIALIZED\s*)?\(", re.IGNORECASE)
+# Schemas that are always present but not part of the catalog
+_SYSTEM_SCHEMAS = {"information_schema", "pg_catalog", "main", "sqlite_master"}
+
+_DIALECTS = {"postgresql": "postgres", "sqlite": "sqlite", "duckdb": "duckdb", "mysql": "mysql"}
+
+
+@dataclass
+class ValidationResult:
+    sql: str  # the cleaned statement
+    errors: list = field(default_factory=list)
+    parsed: bool = False  # whether sqlglot parsed it
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def clean_sql(text):
+    """Extracts one SQL statement from a model response; returns None when there is none.
+
+    Takes the first fenced block if there is one, drops prose before the
+    statement and anything after its end, and removes trailing semicolons.
+    """
+    if not text:
+        return None
+    fenced = _FENCED.search(text)
+    if fenced and fenced.group(1).strip():
+        text = fenced.group(1)
+    start = _STATEMENT_LINE.search(text) or _STATEMENT_WORD.search(text)
+    if start is not None and text[:start.start()].strip():
+        # Prose before the statement, e.g. "Here is the query:"
+        text = text[start.start():]
+    end = find_statement_end(text)
+    text = text[:end] if end is not None else _drop_trailing_prose(text)
+    sql = text.strip().rstrip("`").strip().rstrip(";").rstrip()
+    return sql or None
+
+
+def _drop_trailing_prose(text):
+    """Cuts an unterminated statement at the first following paragraph that isn't SQL."""
+    paragraphs = re.split(r"\n[ \t]*\n", text)
+    kept = paragraphs[:1]
+    for paragraph in paragraphs[1:]:
+        if not _CONTINUATION.match(paragraph):
+            break
+        kept.append(paragraph)
+    return "\n\n".join(kept)
+
+
+def sqlglot_dialect(dialect_name):
+    """sqlglot's name for a SQLAlchemy dialect name."""
+    return _DIALECTS.get(dialect_name, dialect_name)
+
+
+def validate_sql(sql, catalog=None, dialect="postgresql"):
+    """Checks a cleaned statement; ``catalog`` (a SchemaCatalog) enables identifier checks."""
+    result = ValidationResult(sql)
+    blanked = _LITERALS.sub(" ", sql)
+    if not _READ_ONLY_START.match(blanked):
+        result.errors.append("Only SELECT queries are allowed; the statement must start with SELECT or WITH.")
+        return result
+    write = _WRITE_STATEMENT.search(blanked)
+    if write:
+        result.errors.append(f"Only read-only queries are allowed; found {write.group(0).split()[0].upper()}.")
+    if ";" in blanked:
+        result.errors.append("Only a single statement is allowed.")
+    if result.errors:
+        return result
+
+    try:
+        import sqlglot
+    except ImportError:
+        _lexical_checks(sql, blanked, catalog, result)
+        return result
+    _parsed_checks(sqlglot, sql, catalog, sqlglot_dialect(dialect), result)
+    return result
+
+
+def _lexical_checks(sql, blanked, catalog, result):
+    depth = 0
+    for ch in blanked:
+        depth += {"(": 1, ")": -1}.get(ch, 0)
+        if depth < 0:
+            break
+    if depth != 0:
+        result.errors.append("Unbalanced parentheses.")
+    if len(re.findall(r"(?<!')'(?!')", _strip_complete_literals(sql))) % 2:
+        result.errors.append("Unterminated string literal.")
+    if catalog is None:
+        return
+    known = {name.lower() for name in catalog.tables}
+    ctes = {name.lower() for name in _CTE_NAME.findall(blanked)}
+    unknown = []
+    for reference in _TABLE_REFERENCE.findall(_FROM_FUNCTIONS.sub(" ", blanked)):
+        schema, _, table = reference.rpartition(".")
+        if schema.lower() in _SYSTEM_SCHEMAS or table.lower() in ctes:
+            continue
+        if table.lower() not in known and table not in unknown:
+            unknown.append(table)
+    if unknown:
+        result.errors.append(_unknown_tables_message(unknown))
+
+
+def _strip_complete_literals(sql):
+    return re.sub(r"'(?:[^']|'')*'", " ", re.sub(r"--[^\n]*|/\*.*?\*/", " ", sql, flags=re.DOTALL))
+
+
+def _parsed_checks(sqlglot, sql, catalog, dialect, result):
+    from sqlglot import exp
+    from sqlglot.errors import ParseError
+
+    try:
+        statements = [s for s in sqlglot.parse(sql, read=dialect) if s is not None]
+    except ParseError as e:
+        messages = [err.get("description") for err in e.errors if err.get("description")]
+        result.errors.append("Syntax error: " + ("; ".join(messages[:2]) or str(e).splitlines()[0]))
+        return
+    result.parsed = True
+    if len(statements) != 1:
+        result.errors.append("Only a single statement is allowed.")
+        return
+    tree = statements[0]
+    if not isinstance(tree, exp.Query):
+        result.errors.append(f"Only SELECT queries are allowed; got {tree.key.upper()}.")
+        return
+    if any(isinstance(node, (exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop))
+           for node in tree.walk()):
+        result.errors.append("Only read-only queries are allowed.")
+        return
+    if catalog is not None:
+        _check_identifiers(tree, catalog, result, _identifier_key(dialect))
+
+
+def _identifier_key(dialect):
+    """``key(name, quoted)`` under which a name is looked up in the catalog.
+
+    Where the dialect folds unquoted names (PostgreSQL to lower case), only
+    unquoted names are folded and the result must match the catalog name
+    exactly, so ``Orders`` is not the table ``"Orders"`` and ``"Name"`` is not
+    the column ``name``. Elsewhere names match regardless of case.
+    """
+    from sqlglot.dialects.dialect import Dialect, NormalizationStrategy
+
+    try:
+        strategy = Dialect.get_or_raise(dialect).normalization_strategy
+    except ValueError:
+        strategy = None
+    if strategy == NormalizationStrategy.LOWERCASE:
+        return lambda name, quoted: name if quoted else name.lower()
+    if strategy == NormalizationStrategy.UPPERCASE:
+        return lambda name, quoted: name if quoted else name.upper()
+    return lambda name, quoted: name.lower()
+
+
+def _is_quoted(identifier):
+    return bool(getattr(identifier, "quoted", False))
+
+
+def _check_identifiers(tree, catalog, result, key):
+    from sqlglot import exp
+    from sqlglot.optimizer.scope import traverse_scope
+
+    # Catalog names are stored as the database reports them, i.e. as if quoted
+    tables = {key(name, True): table for name, table in catalog.tables.items()}
+    ctes = {key(cte.alias_or_name, _is_quoted(cte.args.get("alias") and cte.args["alias"].this))
+            for cte in tree.find_all(exp.CTE)}
+    unknown_tables = []
+    referenced = []
+    for node in tree.find_all(exp.Table):
+        name = key(node.name, _is_quoted(node.this))
+        if not node.name or (node.db and node.db.lower() in _SYSTEM_SCHEMAS) or name in ctes:
+            continue
+        if name in tables:
+            referenced.append(tables[name])
+        elif node.name not in unknown_tables:
+            unknown_tables.append(node.name)
+    if unknown_tables:
+        result.errors.append(_unknown_tables_message(unknown_tables))
+        return
+
+    # Unqualified names may be any referenced column or an output alias (ORDER BY total)
+    all_columns = {key(c.name, True) for t in referenced for c in t.columns}
+    aliases = {key(a.alias, _is_quoted(a.args["alias"])) for a in tree.find_all(exp.Alias) if a.alias}
+    unknown_columns = []
+    try:
+        scopes = traverse_scope(tree)
+    except Exception:
+        # sqlglot could not resolve scopes (unusual syntax); table checks already passed
+        return
+    for scope in scopes:
+        for column in scope.columns:
+            name = column.name
+            if not name or isinstance(column.this, exp.Star):
+                continue
+            folded = key(name, _is_quoted(column.this))
+            if column.table:
+                source = _resolve_source(scope, column.table)
+                table = tables.get(key(source.name, _is_quoted(source.this))) if isinstance(source, exp.Table) else None
+                if table is None:
+                    continue  # a subquery, CTE, function or an outer alias we can't see
+                if folded not in {key(c.name, True) for c in table.columns}:
+                    label = f"{column.table}.{name}"
+                    if label not in unknown_columns:
+                        unknown_columns.append(label)
+            elif folded not in all_columns and folded not in aliases:
+                if not _only_catalog_sources(scope, tables, key):
+                    continue
+                if name not in unknown_columns:
+                    unknown_columns.append(name)
+    if unknown_columns:
+        result.errors.append("Unknown column(s): " + ", ".join(unknown_columns[:10]) + ".")
+
+
+def _resolve_source(scope, alias):
+    while scope is not None:
+        source = scope.sources.get(alias)
+        if source is not None:
+            return source
+        scope = scope.parent
+    return None
+
+
+def _only_catalog_sources(scope, tables, key):
+    from sqlglot import exp
+
+    return bool(scope.sources) and all(
+        isinstance(source, exp.Table) and key(source.name, _is_quoted(source.this)) in tables
+        for source in scope.sources.values())
+
+
+def _unknown_tables_message(names):
+    return "Unknown table(s): " + ", ".join(names[:10]) + "."
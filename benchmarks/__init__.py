@@ -0,0 +1 @@
+# Benchmarks for the Text-to-SQL pipeline. Run modules with `python -m benchmarks.<name>`.
@@ -0,0 +1,66 @@
+"""Chart preparation time and points sent to the browser: legacy heuristics vs. app.charts.
+
+Builds typed in-memory frames shaped like query results (a time series with
+one or several measures, and a categorical breakdown), so no database is needed.
+
+    python -m benchmarks.charts_bench --rows 100000 1000000 5000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.charts import build_chart
+
+
+def legacy_prepare(df):
+    """The original main.py path: index on a unique first column, first numeric column, no reduction."""
+    chart_data = df
+    if df.iloc[:, 0].is_unique:
+        chart_data = df.set_index(df.columns[0])
+    numeric_cols = chart_data.select_dtypes(include="number").columns
+    if numeric_cols.empty:
+        return chart_data[chart_data.columns[0]]
+    return chart_data[numeric_cols[0]]
+
+
+def make_frames(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    created_at = pd.date_range("2020-01-01", periods=rows, freq="min")
+    amount = np.cumsum(rng.normal(size=rows))
+    series = pd.DataFrame({"created_at": created_at, "amount": amount})
+    series.attrs["column_types"] = {"created_at": "timestamp", "amount": "float8"}
+    multi = series.assign(qty=rng.integers(0, 100, rows), order_id=np.arange(rows))
+    multi.attrs["column_types"] = dict(series.attrs["column_types"], qty="int4", order_id="int8")
+    breakdown = pd.DataFrame({"region": rng.integers(0, 500, rows).astype(str), "amount": rng.random(rows)})
+    breakdown.attrs["column_types"] = {"region": "text", "amount": "numeric"}
+    return {"time series": series, "multi-measure": multi, "categorical": breakdown}
+
+
+def timed(fn, df, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(df)
+        samples.append(time.perf_counter() - start)
+    return min(samples), out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'shape':<14} {'legacy s':>9} {'points':>10}  {'charts s':>9} {'points':>7}  kind")
+    for rows in args.rows:
+        for shape, df in make_frames(rows).items():
+            legacy_s, legacy_out = timed(legacy_prepare, df, args.repeat)
+            new_s, chart = timed(build_chart, df, args.repeat)
+            print(f"{rows:>10,}  {shape:<14} {legacy_s:>9.3f} {len(legacy_out):>10,}  "
+                  f"{new_s:>9.3f} {len(chart.frame):>7,}  {chart.kind} {chart.reduction}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Few-shot example store: bulk and incremental insert rate, lookup latency and index size.
+
+Fills a fresh store with synthetic question/SQL pairs and times lookups for
+unseen questions at each size.
+
+    python -m benchmarks.example_store_bench --examples 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from app.example_store import ExampleStore
+from benchmarks.schema_linking_bench import ATTRIBUTES, DOMAINS, ENTITIES
+
+PHRASES = ["What is the total {attr} of {entity}s in {domain}?",
+           "How many {entity}s per {attr} last month",
+           "Top {n} {domain} {entity}s by {attr}",
+           "Average {attr} for each {entity} in {domain} this year",
+           "List {entity}s with missing {attr}"]
+
+
+def synthetic_pairs(n, seed=0):
+    rng = random.Random(seed)
+    pairs = []
+    for i in range(n):
+        domain, entity, attr = rng.choice(DOMAINS), rng.choice(ENTITIES), rng.choice(ATTRIBUTES)
+        question = rng.choice(PHRASES).format(domain=domain, entity=entity, attr=attr, n=rng.randint(3, 50))
+        # A distinct trailing token keeps every pair unique, like real question wording
+        question += f" ({rng.choice(ENTITIES)} {i})"
+        pairs.append((question, f"SELECT {attr}, COUNT(*) FROM {domain}_{entity} GROUP BY {attr}"))
+    return pairs
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--examples", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'examples':>9} {'bulk/s':>9} {'add ms':>7} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} "
+          f"{'found':>6} {'MB':>6}")
+    for n in args.examples:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = ExampleStore(os.path.join(tmp, "examples.db"))
+            pairs = synthetic_pairs(n)
+            start = time.perf_counter()
+            for i in range(0, n, 10_000):
+                store.add_many("bench", pairs[i:i + 10_000])
+            bulk_rate = n / (time.perf_counter() - start)
+
+            adds = []
+            for question, sql in synthetic_pairs(20, seed=1):
+                start = time.perf_counter()
+                store.add("bench", question + " again", sql)
+                adds.append(time.perf_counter() - start)
+
+            latencies, found = [], 0
+            for question, _ in synthetic_pairs(args.lookups, seed=2):
+                start = time.perf_counter()
+                found += bool(store.search("bench", question, k=args.k))
+                latencies.append(time.perf_counter() - start)
+            size_mb = os.path.getsize(store.path) / 1e6
+            print(f"{n:>9,} {bulk_rate:>9,.0f} {statistics.median(adds) * 1000:>7.2f} "
+                  f"{percentile(latencies, 0.5) * 1000:>7.2f} {percentile(latencies, 0.95) * 1000:>7.2f} "
+                  f"{percentile(latencies, 0.99) * 1000:>7.2f} {found / args.lookups:>6.0%} {size_mb:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
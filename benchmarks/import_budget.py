@@ -0,0 +1,96 @@
+"""Cold-start import budget for the modules the Streamlit entry points load.
+
+Imports each module in a fresh interpreter, reports the median wall time and
+the slowest imports (from ``-X importtime``), and exits non-zero when a module
+exceeds the budget or eagerly loads a heavy dependency that should only be
+imported on first use. Run it before merging changes to import structure:
+
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget-ms 150 --repeat 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules imported on every session start, and the dependencies they must not load eagerly
+TARGETS = {
+    "app.pipeline": ["langchain", "langchain_community", "pandas", "sqlalchemy", "numpy", "httpx", "pyarrow",
+                     "sqlglot"],
+    "app.api_client": ["langchain", "langchain_community", "pandas", "sqlalchemy", "numpy", "pyarrow"],
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted({{m.split(".")[0] for m in sys.modules}})}}))
+"""
+
+
+def measure(module, repeat):
+    """Returns ``(median seconds, top-level modules loaded)`` over fresh interpreters."""
+    samples = []
+    loaded = set()
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(module=module)], check=True,
+                             capture_output=True, text=True, cwd=_project_root()).stdout
+        data = json.loads(out.strip().splitlines()[-1])
+        samples.append(data["seconds"])
+        loaded.update(data["modules"])
+    return statistics.median(samples), loaded
+
+
+def slowest_imports(module, limit):
+    """The ``limit`` imports with the largest cumulative time, from ``-X importtime``."""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], check=True,
+                         capture_output=True, text=True, cwd=_project_root()).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  <self us> | <cumulative us> | <indented module name>"
+        _, cumulative_us, name = line.split("|")
+        rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def _project_root():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "250")))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to list per module")
+    args = parser.parse_args()
+
+    failures = []
+    for module, forbidden in TARGETS.items():
+        try:
+            seconds, loaded = measure(module, args.repeat)
+        except subprocess.CalledProcessError as e:
+            reason = (e.stderr or "").strip().splitlines()[-1:] or ["unknown error"]
+            print(f"{module:<16} import failed: {reason[0]}")
+            failures.append(f"{module} failed to import")
+            continue
+        eager = sorted(set(forbidden) & loaded)
+        status = "ok" if seconds * 1000 <= args.budget_ms and not eager else "FAIL"
+        print(f"{module:<16} {seconds * 1000:>8.1f} ms (budget {args.budget_ms:.0f} ms)  {status}")
+        for cumulative_us, name in slowest_imports(module, args.top):
+            print(f"    {cumulative_us / 1000:>8.1f} ms  {name}")
+        if seconds * 1000 > args.budget_ms:
+            failures.append(f"{module} took {seconds * 1000:.0f} ms")
+        if eager:
+            failures.append(f"{module} eagerly imports {', '.join(eager)}")
+    if failures:
+        print("\nImport budget exceeded: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
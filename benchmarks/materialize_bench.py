@@ -0,0 +1,98 @@
+"""Time and peak memory of result materialisation: legacy row loops vs. fetch_frame.
+
+Uses an in-memory SQLite database by default; pass ``--url`` to run against
+PostgreSQL (where ``--mode copy`` is also available).
+
+    python -m benchmarks.materialize_bench --rows 100000 1000000
+    python -m benchmarks.materialize_bench --url postgresql+psycopg2://... --mode copy
+"""
+import argparse
+import time
+import tracemalloc
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from app.materialize import fetch_frame
+
+TABLE = "bench_results"
+
+
+def legacy_fetch(connection, sql):
+    """The original run_query path: fetchall, per-cell loop, DataFrame from a list of lists."""
+    result_proxy = connection.execute(text(sql))
+    columns = list(result_proxy.keys())
+    data_list = []
+    for row in result_proxy.fetchall():
+        row_values = []
+        for value in row:
+            if value is None:
+                row_values.append(None)
+            else:
+                try:
+                    row_values.append(value)
+                except Exception:
+                    row_values.append(str(value))
+        data_list.append(row_values)
+    df = pd.DataFrame(data_list, columns=columns)
+    # main.py then copied the frame twice and scanned every column for lists
+    for _ in range(2):
+        copy = df.copy()
+        for col in copy.columns:
+            any(isinstance(x, list) for x in copy[col].dropna())
+    return df
+
+
+def populate(engine, rows):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.execute(text(
+            f"CREATE TABLE {TABLE} (id INTEGER, region TEXT, amount REAL, qty INTEGER, created_at TEXT)"
+        ))
+        batch = 50_000
+        for start in range(0, rows, batch):
+            conn.execute(
+                text(f"INSERT INTO {TABLE} VALUES (:id, :region, :amount, :qty, :created_at)"),
+                [
+                    {"id": i, "region": f"region_{i % 17}", "amount": i * 0.37, "qty": i % 101,
+                     "created_at": f"2024-01-{i % 28 + 1:02d}"}
+                    for i in range(start, min(start + batch, rows))
+                ],
+            )
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(df), elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--url", default="sqlite://", help="database to benchmark against")
+    parser.add_argument("--mode", default="chunked", choices=["chunked", "copy"])
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    sql = f"SELECT * FROM {TABLE}"
+    print(f"{'rows':>9} {'legacy s':>9} {'legacy MB':>10} {'new s':>7} {'new MB':>7} {'speedup':>8}")
+    for rows in args.rows:
+        populate(engine, rows)
+        with engine.connect() as conn:
+            _, legacy_s, legacy_mb = measure(lambda: legacy_fetch(conn, sql))
+        with engine.connect() as conn:
+            n, new_s, new_mb = measure(lambda: fetch_frame(conn, sql, mode=args.mode))
+        assert n == rows
+        print(f"{rows:>9} {legacy_s:>9.2f} {legacy_mb:>10.1f} {new_s:>7.2f} {new_mb:>7.1f} "
+              f"{legacy_s / new_s:>7.1f}x")
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""A local stand-in for Ollama's ``/api/generate`` with configurable latency.
+
+Answers every prompt with canned SQL over the first table in the prompt's
+schema, streamed as NDJSON chunks (or as one JSON object when ``stream`` is
+false), followed by prose the real model tends to add. Prompt-eval timing
+fields are filled in so the client's metrics look like Ollama's.
+
+With ``prefill_per_token`` set, it also models what makes Ollama's prefill
+slow or fast: a model load (``load_delay``) when it isn't loaded, was
+unloaded after ``keep_alive`` or is asked for a different ``num_ctx``;
+truncation of prompts longer than the context window; and one prompt-cache
+slot, so only the tokens after the prefix shared with the previous prompt
+are evaluated (about four characters per token).
+
+``slow_rate`` and ``invalid_rate`` make some answers slow (``slow_delay``
+more seconds before the first chunk) or name a column that doesn't exist,
+drawn from a seeded generator, for the tail-latency benchmarks.
+
+``num_parallel`` (0 for no limit) caps how many requests are served at once,
+like ``OLLAMA_NUM_PARALLEL``; the rest wait for a slot. As in Ollama, a client
+that hangs up frees its slot at once, even while its prompt is being evaluated.
+
+    python -m benchmarks.mock_ollama --port 11435 --ttft 0.3 --token-delay 0.02
+    python -m benchmarks.mock_ollama --prefill-per-token 0.0005 --load-delay 2
+    OLLAMA_URL=http://localhost:11435 streamlit run main.py
+"""
+import argparse
+import json
+import random
+import re
+import select
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_TABLE = re.compile(r"CREATE TABLE (\w+)")
+_COLUMN = re.compile(r"^\s*(\w+) (?:NUMERIC|INTEGER|REAL)", re.MULTILINE)
+
+DEFAULT_SQL = "SELECT * FROM {table} LIMIT {limit};"
+DEFAULT_KEEP_ALIVE = 300.0
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+TRAILER = "\n\nThis query returns the requested rows from the table."
+# How often a waiting or "working" request checks whether its client hung up
+_HANGUP_POLL = 0.01
+
+
+def canned_sql(prompt, template=DEFAULT_SQL, limit=100):
+    """SQL for the first table in the prompt; an aggregate when it has a numeric column."""
+    match = _TABLE.search(prompt)
+    table = match.group(1) if match else "information_schema.tables"
+    if template != DEFAULT_SQL or not match:
+        return template.format(table=table, limit=limit)
+    body = prompt[match.end():prompt.find(")\n", match.end()) + 1 or None]
+    numeric = [c for c in _COLUMN.findall(body) if c != "id" and not c.endswith("_id")]
+    if not numeric:
+        return template.format(table=table, limit=limit)
+    col = numeric[0]
+    return (f"SELECT id, {col}, SUM({col}) OVER (ORDER BY id) AS running_{col}\n"
+            f"FROM {table}\nORDER BY id\nLIMIT {limit};")
+
+
+class MockOllama:
+    """Threaded HTTP server; ``ttft`` is the delay before the first chunk,
+    ``token_delay`` the delay between chunks of ``chunk_chars`` characters."""
+
+    def __init__(self, host="127.0.0.1", port=0, ttft=0.2, token_delay=0.01, chunk_chars=4,
+                 sql_template=DEFAULT_SQL, limit=100, prefill_per_token=0.0, load_delay=0.0, num_ctx=4096,
+                 slow_rate=0.0, slow_delay=2.0, invalid_rate=0.0, seed=0, num_parallel=0):
+        self.ttft = ttft
+        self._slots = threading.BoundedSemaphore(num_parallel) if num_parallel > 0 else None
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.invalid_rate = invalid_rate
+        self._rng = random.Random(seed)
+        self.prefill_per_token = prefill_per_token
+        self.load_delay = load_delay
+        self.default_num_ctx = num_ctx
+        self._loaded_ctx = None  # num_ctx of the loaded model, None when unloaded
+        self._expires = 0.0
+        self._cached_prompt = ""
+        self.token_delay = token_delay
+        self.chunk_chars = chunk_chars
+        self.sql_template = sql_template
+        self.limit = limit
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="mock-ollama", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if mock._slots is not None:
+                    try:
+                        while not mock._slots.acquire(timeout=_HANGUP_POLL):
+                            _check_connected(self)
+                    except ConnectionResetError:
+                        return  # Gave up while queued
+                with mock._lock:
+                    mock.requests += 1
+                    mock.active += 1
+                    mock.max_active = max(mock.max_active, mock.active)
+                try:
+                    mock._respond(self, body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client hung up once the statement was complete
+                finally:
+                    with mock._lock:
+                        mock.active -= 1
+                    if mock._slots is not None:
+                        mock._slots.release()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _prefill(self, handler, body):
+        """Sleeps for the simulated load and prefill; returns ``(load_s, evaluated_tokens, prefill_s)``."""
+        prompt = body.get("prompt", "")
+        if not self.prefill_per_token:
+            started = time.perf_counter()
+            _sleep(handler, self.ttft)
+            return 0.0, len(prompt) // 4, time.perf_counter() - started
+        options = body.get("options") or {}
+        num_ctx = options.get("num_ctx") or self.default_num_ctx
+        keep_alive = _seconds(body.get("keep_alive", DEFAULT_KEEP_ALIVE))
+        with self._lock:
+            now = time.monotonic()
+            load = 0.0
+            if self._loaded_ctx != num_ctx or now > self._expires:
+                load = self.load_delay
+                self._loaded_ctx = num_ctx
+                self._cached_prompt = ""
+            if len(prompt) // 4 > num_ctx:
+                # Ollama keeps the end of an over-long prompt, so its start changes
+                prompt = "[truncated]" + prompt[len(prompt) - num_ctx * 4:]
+            shared = 0
+            for a, b in zip(prompt, self._cached_prompt):
+                if a != b:
+                    break
+                shared += 1
+            evaluated = max(len(prompt) // 4 - shared // 4, 1 if prompt else 0)
+            self._cached_prompt = prompt
+            self._expires = now + load + (keep_alive if keep_alive >= 0 else float("inf"))
+            if keep_alive == 0:
+                self._loaded_ctx = None
+        _sleep(handler, load + evaluated * self.prefill_per_token)
+        return load, evaluated, evaluated * self.prefill_per_token
+
+    def _respond(self, handler, body):
+        prompt = body.get("prompt", "")
+        with self._lock:
+            slow = self._rng.random() < self.slow_rate
+            invalid = self._rng.random() < self.invalid_rate
+        sql = canned_sql(prompt, self.sql_template, self.limit)
+        if invalid:
+            sql = sql.replace("SELECT ", "SELECT no_such_column, ", 1)
+        text = sql + TRAILER
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        num_predict = (body.get("options") or {}).get("num_predict")
+        if not prompt:
+            chunks = []  # Ollama only loads the model
+        elif num_predict is not None and num_predict >= 0:
+            chunks = chunks[:num_predict]
+        load, evaluated, prefill = self._prefill(handler, body)
+        if slow and prompt:
+            _sleep(handler, self.slow_delay)
+        done = {
+            "model": body.get("model", "mock"),
+            "done": True,
+            "prompt_eval_count": evaluated,
+            "prompt_eval_duration": int(prefill * 1e9),
+            "eval_count": len(chunks),
+            "load_duration": int(load * 1e9),
+        }
+        if not body.get("stream", True):
+            time.sleep(self.token_delay * len(chunks))
+            done["eval_duration"] = int(self.token_delay * len(chunks) * 1e9)
+            payload = json.dumps(dict(done, response="".join(chunks))).encode()
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(payload)))
+            handler.end_headers()
+            handler.wfile.write(payload)
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def write(obj):
+            line = json.dumps(obj).encode() + b"\n"
+            handler.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            handler.wfile.flush()
+
+        for chunk in chunks:
+            write({"model": done["model"], "response": chunk, "done": False})
+            time.sleep(self.token_delay)
+        done["eval_duration"] = int(self.token_delay * len(chunks) * 1e9)
+        write(dict(done, response=""))
+        handler.wfile.write(b"0\r\n\r\n")
+
+
+def _check_connected(handler):
+    """Raises ConnectionResetError once the client has hung up."""
+    conn = handler.connection
+    if select.select([conn], [], [], 0)[0]:
+        try:
+            if not conn.recv(1, socket.MSG_PEEK):
+                raise ConnectionResetError()
+        except BlockingIOError:
+            pass
+
+
+def _sleep(handler, seconds):
+    """Sleeps like the model would work, stopping early when the client hangs up."""
+    deadline = time.monotonic() + seconds
+    while (left := deadline - time.monotonic()) > 0:
+        time.sleep(min(left, _HANGUP_POLL))
+        _check_connected(handler)
+
+
+def _seconds(keep_alive):
+    if isinstance(keep_alive, (int, float)):
+        return float(keep_alive)
+    match = re.fullmatch(r"(-?[\d.]+)(ms|s|m|h)?", str(keep_alive).strip())
+    if not match:
+        return DEFAULT_KEEP_ALIVE
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2) or "s"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--ttft", type=float, default=0.2, help="seconds before the first chunk")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between chunks")
+    parser.add_argument("--sql", default=DEFAULT_SQL, help="SQL template with {table} and {limit}")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--prefill-per-token", type=float, default=0.0,
+                        help="seconds per evaluated prompt token; enables the load and prompt-cache model")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="seconds to load the model")
+    parser.add_argument("--num-ctx", type=int, default=4096, help="context window when a request sets none")
+    parser.add_argument("--num-parallel", type=int, default=0, help="requests served at once; 0 for no limit")
+    args = parser.parse_args()
+    mock = MockOllama(args.host, args.port, args.ttft, args.token_delay, sql_template=args.sql,
+                      limit=args.limit, prefill_per_token=args.prefill_per_token, load_delay=args.load_delay,
+                      num_ctx=args.num_ctx, num_parallel=args.num_parallel)
+    print(f"Mock Ollama listening on {mock.url}")
+    try:
+        mock._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
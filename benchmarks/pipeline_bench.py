@@ -0,0 +1,238 @@
+"""End-to-end pipeline latency and throughput against a mock Ollama server.
+
+Builds a synthetic database (SQLite by default, or ``--url`` for a local
+PostgreSQL), starts :mod:`benchmarks.mock_ollama`, and drives schema lookup,
+generation, SQL extraction, the query guard, the query and chart
+preprocessing through :mod:`app.pipeline` from ``--concurrency`` threads.
+Per-stage p50/p95/p99 come from the app's own instrumentation spans.
+
+    python -m benchmarks.pipeline_bench --tables 10 100 1000 --rows 1000 --concurrency 8
+    python -m benchmarks.pipeline_bench --save-baseline benchmarks/baseline.json
+    python -m benchmarks.pipeline_bench --baseline benchmarks/baseline.json --tolerance 0.2
+
+With ``--baseline`` the exit status is 1 when any stage's p95, or the
+throughput, is worse than the baseline by more than the tolerance.
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_ollama import MockOllama
+
+PERCENTILES = (50, 95, 99)
+# Stages faster than this are not flagged as regressions; timer noise dominates them
+MIN_REGRESSION_SECONDS = 0.002
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of a sorted list."""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, max(0, int(round(p / 100 * len(samples))) - 1))]
+
+
+def configure_environment(args, url, mock_url):
+    # app.config reads the environment at import time, so this runs before any app import
+    os.environ.update({
+        "DATABASE_URL": url,
+        "OLLAMA_URL": mock_url,
+        "OLLAMA_NUM_PARALLEL": str(args.llm_parallel or args.concurrency),
+        "OLLAMA_MAX_QUEUE": str(max(64, args.questions)),
+        "DB_POOL_SIZE": str(args.concurrency),
+        "DB_POOL_WARMUP": "0",
+        "INSTRUMENTATION": "true",
+        "TRACE_SINKS": "",
+        "SQL_CACHE": "true" if args.cache else "false",
+        "RESULT_CACHE": "true" if args.cache else "false",
+        "QUERY_GUARD": "true" if args.guard else "false",
+        "SQL_CACHE_PATH": "",
+        "FEW_SHOT": "false",
+        "SCHEMA_CACHE_DIR": os.path.join(tempfile.gettempdir(), "text2sql-bench-schema"),
+    })
+
+
+class _Collector:
+    def __init__(self):
+        self.traces = []
+        self._lock = threading.Lock()
+
+    def emit(self, trace):
+        with self._lock:
+            self.traces.append(trace.to_dict())
+
+
+def run_once(args, n_tables, rows):
+    """Benchmarks one (tables, rows) configuration in this process."""
+    url = args.url or "sqlite:///" + os.path.join(tempfile.gettempdir(),
+                                                   f"text2sql-bench-{n_tables}-{rows}.db")
+    mock = MockOllama(ttft=args.ttft, token_delay=args.token_delay, limit=args.limit).start()
+    configure_environment(args, url, mock.url)
+
+    from app import pipeline
+    from app.charts import build_chart
+    from app.instrumentation import finish_trace, register_sink, span, start_trace
+    from benchmarks.schema_linking_bench import QUESTIONS
+    from benchmarks.synthetic_db import create_database
+
+    start = time.perf_counter()
+    if args.url or not os.path.exists(url[len("sqlite:///"):]):
+        engine, _ = create_database(url, n_tables, rows)
+        engine.dispose()
+    print(f"--> pipeline_bench: Database with {n_tables} tables x {rows} rows ready "
+          f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    collector = register_sink(_Collector())
+
+    def ask(i):
+        # Distinct questions, so the client can't coalesce identical prompts
+        question = f"{QUESTIONS[i % len(QUESTIONS)]} (#{i})"
+        start_trace("question", question=question)
+        try:
+            generated = pipeline.generate(question)
+            df, _ = pipeline.fetch(pipeline.check(generated.sql).sql)
+            with span("preprocessing"):
+                build_chart(df)
+            return True
+        except Exception as e:
+            print(f"--> pipeline_bench: Question {i} failed: {e}", file=sys.stderr)
+            return False
+        finally:
+            finish_trace()
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(ask, range(args.warmup)))
+        collector.traces.clear()
+        start = time.perf_counter()
+        outcomes = list(pool.map(ask, range(args.warmup, args.warmup + args.questions)))
+        wall = time.perf_counter() - start
+    mock.stop()
+
+    durations = {}
+    for trace in collector.traces:
+        durations.setdefault("total", []).append(trace["duration"])
+        for s in trace["spans"]:
+            durations.setdefault(s["name"], []).append(s["duration"])
+    stages = {}
+    for name, samples in durations.items():
+        samples.sort()
+        stages[name] = {f"p{p}": round(percentile(samples, p), 6) for p in PERCENTILES}
+        stages[name]["count"] = len(samples)
+    return {
+        "tables": n_tables,
+        "rows": rows,
+        "concurrency": args.concurrency,
+        "questions": len(collector.traces),
+        "errors": outcomes.count(False),
+        "qps": round(len(collector.traces) / wall, 3),
+        "stages": stages,
+        "llm_max_active": mock.max_active,
+    }
+
+
+def report(result, baseline=None, tolerance=0.2):
+    """Prints one configuration's table; returns the list of regressions against ``baseline``."""
+    print(f"\n{result['tables']} tables x {result['rows']} rows, concurrency {result['concurrency']}: "
+          f"{result['qps']:.2f} questions/s, {result['errors']} errors")
+    header = f"{'stage':<18}" + "".join(f"{'p' + str(p) + ' ms':>10}" for p in PERCENTILES)
+    if baseline:
+        header += f"{'base p95':>10}{'change':>9}"
+    print(header)
+    regressions = []
+    for name, stats in sorted(result["stages"].items(), key=lambda kv: kv[0] == "total"):
+        line = f"{name:<18}" + "".join(f"{stats['p' + str(p)] * 1000:>10.1f}" for p in PERCENTILES)
+        base = baseline["stages"].get(name) if baseline else None
+        if base:
+            change = (stats["p95"] - base["p95"]) / base["p95"] if base["p95"] else 0.0
+            line += f"{base['p95'] * 1000:>10.1f}{change:>+9.0%}"
+            if change > tolerance and stats["p95"] - base["p95"] > MIN_REGRESSION_SECONDS:
+                regressions.append(f"{name} p95 {change:+.0%}")
+        print(line)
+    if baseline and baseline["qps"]:
+        change = (result["qps"] - baseline["qps"]) / baseline["qps"]
+        print(f"{'questions/s':<18}{result['qps']:>10.2f}  (baseline {baseline['qps']:.2f}, {change:+.0%})")
+        if change < -tolerance:
+            regressions.append(f"throughput {change:+.0%}")
+    return regressions
+
+
+def _run_isolated(args, n_tables, rows):
+    """Runs one configuration in a child process; app settings are fixed per process."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as fh:
+        output = fh.name
+    argv = [sys.executable, "-m", "benchmarks.pipeline_bench", "--tables", str(n_tables),
+            "--rows", str(rows), "--_result", output] + _passthrough(args)
+    try:
+        subprocess.run(argv, check=True)
+        with open(output) as fh:
+            return json.load(fh)
+    finally:
+        os.unlink(output)
+
+
+def _passthrough(args):
+    argv = ["--concurrency", str(args.concurrency), "--questions", str(args.questions),
+            "--warmup", str(args.warmup), "--ttft", str(args.ttft), "--token-delay", str(args.token_delay),
+            "--limit", str(args.limit)]
+    if args.llm_parallel:
+        argv += ["--llm-parallel", str(args.llm_parallel)]
+    if args.url:
+        argv += ["--url", args.url]
+    if args.cache:
+        argv.append("--cache")
+    if not args.guard:
+        argv.append("--no-guard")
+    return argv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tables", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000], help="rows per table")
+    parser.add_argument("--url", help="database to (re)create, e.g. a local PostgreSQL; default SQLite")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--questions", type=int, default=50, help="measured questions per configuration")
+    parser.add_argument("--warmup", type=int, default=4, help="unmeasured questions first")
+    parser.add_argument("--llm-parallel", type=int, help="mock LLM slots (default: --concurrency)")
+    parser.add_argument("--ttft", type=float, default=0.05, help="mock seconds to first token")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="mock seconds between chunks")
+    parser.add_argument("--limit", type=int, default=100, help="LIMIT in the canned SQL")
+    parser.add_argument("--cache", action="store_true", help="keep the SQL and result caches enabled")
+    parser.add_argument("--no-guard", dest="guard", action="store_false", help="skip the EXPLAIN guard")
+    parser.add_argument("--baseline", help="JSON file to compare against")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--_result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._result:
+        with open(args._result, "w") as fh:
+            json.dump(run_once(args, args.tables[0], args.rows[0]), fh)
+        return
+
+    results = [_run_isolated(args, n, rows) for n, rows in itertools.product(args.tables, args.rows)]
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = {(r["tables"], r["rows"]): r for r in json.load(fh)["runs"]}
+    regressions = []
+    for result in results:
+        found = report(result, baseline.get((result["tables"], result["rows"])), args.tolerance)
+        regressions += [f"{result['tables']}x{result['rows']}: {r}" for r in found]
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as fh:
+            json.dump({"created_at": time.time(), "runs": results}, fh, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+    if regressions:
+        print("\nRegressions: " + "; ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
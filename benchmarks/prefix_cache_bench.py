@@ -0,0 +1,132 @@
+"""Prefill time per question before and after the cached prompt prefix.
+
+"before" sends the previous prompt layout (instructions after the question)
+with the server's default keep_alive and context window; "after" sends the
+prefix-first layout with OLLAMA_KEEP_ALIVE and OLLAMA_NUM_CTX, after a
+warm-up. Both answer the same questions, with two few-shot examples each,
+over synthetic catalogs of growing size, starting from an unloaded model.
+The schema is linked per question above SCHEMA_LINKING_MIN_TABLES, as in
+the app, unless ``--full-schema`` is given.
+
+Without ``--url`` the bench runs against the mock server's prefill model
+(see :mod:`benchmarks.mock_ollama`); with it, against a real Ollama.
+
+    python -m benchmarks.prefix_cache_bench
+    python -m benchmarks.prefix_cache_bench --url http://localhost:11434 --tables 10 100 --full-schema
+"""
+import argparse
+import statistics
+import time
+
+from app.config import OLLAMA_KEEP_ALIVE, OLLAMA_MODEL, OLLAMA_NUM_CTX, SCHEMA_LINKING_MIN_TABLES
+from app.llm_client import OllamaClient
+from app.prompts import SQL_PREFIX_TEMPLATE, SQL_TEMPLATE, dialect_instruction, format_examples
+from app.schema_linking import build_schema_context, estimate_tokens
+from benchmarks.example_store_bench import synthetic_pairs
+from benchmarks.mock_ollama import MockOllama
+from benchmarks.schema_linking_bench import QUESTIONS, synthetic_catalog
+
+DIALECT = dialect_instruction("postgresql")
+
+# The layout before prompts were split into a shared prefix and a per-question part
+LEGACY_TEMPLATE = """You are an expert SQL analyst.
+
+You will be provided:
+- A database schema with table names and column descriptions.
+- A user's question written in natural language.
+
+Your job is to:
+1. Understand the user's intent
+2. Analyze which tables and columns are needed
+3. Write an accurate and optimized SQL query that answers the question
+
+--- Schema ---
+{schema}
+{examples}
+--- Question ---
+{question}
+
+--- Instructions ---
+- Return ONLY the SQL query (no explanation, no markdown)
+- Use exact column and table names from the schema
+- Use JOINs, GROUP BY, HAVING, and nested subqueries when necessary
+- Optimize for performance
+- Handle edge cases like NULL values, missing relationships, or ambiguous columns
+- Assume PostgreSQL syntax
+
+--- SQL ---"""
+
+
+def _prompts(catalog, template, rounds, full_schema):
+    linked = not full_schema and len(catalog.tables) > SCHEMA_LINKING_MIN_TABLES
+    pairs = synthetic_pairs(2 * len(QUESTIONS) * rounds, seed=3)
+    prompts = []
+    for i, question in enumerate(QUESTIONS * rounds):
+        schema = build_schema_context(catalog, question) if linked else catalog.render()
+        examples = format_examples(pairs[2 * i:2 * i + 2])
+        prompts.append(template.format(schema=schema, dialect=DIALECT, examples=examples, question=question))
+    return prompts, linked
+
+
+def _run(url, model, prompts, keep_alive, num_ctx, warm_prefix):
+    client = OllamaClient(base_url=url, model=model, keep_alive=keep_alive, num_ctx=num_ctx)
+    # Start every scenario from an unloaded model
+    client.generate("", extra={"keep_alive": 0})
+    if warm_prefix is not None:
+        client.warm_up(warm_prefix)
+    samples = []
+    for prompt in prompts:
+        metrics = {}
+        # No early stop: Ollama reports prompt evaluation only in the final chunk
+        client.generate(prompt, options={"num_predict": 64}, metrics=metrics)
+        samples.append(metrics)
+    return samples
+
+
+def _summary(samples):
+    return (statistics.mean(m.get("prompt_eval_count", 0) for m in samples),
+            statistics.mean(m.get("prompt_eval_duration", 0) for m in samples) / 1e6,
+            sum(m.get("load_duration", 0) for m in samples) / 1e9,
+            statistics.mean(m.get("ttft", 0) for m in samples) * 1000)
+
+
+def run(url, model, table_counts, rounds, full_schema):
+    print(f"{'tables':>6} {'schema':>6} {'prompt tok':>10} {'scenario':>8} {'eval tok':>9} {'prefill ms':>10} "
+          f"{'load s':>7} {'ttft ms':>8}")
+    for n in table_counts:
+        catalog = synthetic_catalog(n)
+        before, linked = _prompts(catalog, LEGACY_TEMPLATE, rounds, full_schema)
+        after, _ = _prompts(catalog, SQL_TEMPLATE, rounds, full_schema)
+        # With per-question linking there is no shared schema; the warm-up only loads the model
+        warm_prefix = "" if linked else SQL_PREFIX_TEMPLATE.format(schema=catalog.render(), dialect=DIALECT)
+        prompt_tokens = int(statistics.mean(estimate_tokens(p) for p in after))
+        for name, prompts, keep_alive, num_ctx, warm in (
+                ("before", before, None, 0, None),
+                ("after", after, OLLAMA_KEEP_ALIVE, OLLAMA_NUM_CTX, warm_prefix)):
+            eval_tokens, prefill_ms, load_s, ttft_ms = _summary(_run(url, model, prompts, keep_alive, num_ctx, warm))
+            print(f"{n:>6} {'linked' if linked else 'full':>6} {prompt_tokens:>10} {name:>8} {eval_tokens:>9.0f} "
+                  f"{prefill_ms:>10.1f} {load_s:>7.2f} {ttft_ms:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="a real Ollama server; by default a simulated one is started")
+    parser.add_argument("--model", default=OLLAMA_MODEL)
+    parser.add_argument("--tables", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--rounds", type=int, default=2, help="passes over the question set")
+    parser.add_argument("--full-schema", action="store_true", help="send every table instead of linking")
+    parser.add_argument("--prefill-per-token", type=float, default=0.0005, help="simulated prefill cost (s)")
+    parser.add_argument("--load-delay", type=float, default=1.0, help="simulated model load time (s)")
+    args = parser.parse_args()
+    if args.url:
+        run(args.url, args.model, args.tables, args.rounds, args.full_schema)
+        return
+    with MockOllama(token_delay=0.001, prefill_per_token=args.prefill_per_token,
+                    load_delay=args.load_delay) as mock:
+        started = time.perf_counter()
+        run(mock.url, args.model, args.tables, args.rounds, args.full_schema)
+        print(f"(simulated server, {time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Prompt size and latency of full vs. relevance-pruned schema context.
+
+Builds synthetic catalogs of growing size and, for a fixed set of questions,
+compares the full ``get_table_info``-style schema with the linked context.
+
+    python -m benchmarks.schema_linking_bench
+    python -m benchmarks.schema_linking_bench --tables 10 100 400 --ollama
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.prompts import SQL_TEMPLATE, dialect_instruction
+from app.schema_catalog import Column, ForeignKey, SchemaCatalog, Table
+from app.schema_linking import build_schema_context, estimate_tokens, get_index
+
+DOMAINS = ["sales", "finance", "hr", "ops", "marketing", "support", "billing", "inventory",
+           "logistics", "crm", "web", "mobile", "partner", "audit", "legal", "payroll"]
+ENTITIES = ["customer", "order", "invoice", "product", "region", "employee", "payment",
+            "shipment", "campaign", "ticket", "account", "supplier", "warehouse", "contract",
+            "department", "session", "event", "refund", "subscription", "review"]
+ATTRIBUTES = ["name", "status", "amount", "created_at", "updated_at", "description", "code",
+              "category", "price", "quantity", "email", "country", "city", "total", "score"]
+
+DIALECT = dialect_instruction("postgresql")
+
+QUESTIONS = [
+    "Who are the top 5 customers by revenue?",
+    "What are the average sales by region in the last 30 days?",
+    "List all pending invoices over $500",
+    "How many support tickets did each employee close last month?",
+    "Total refund amount per product category",
+]
+
+
+def synthetic_catalog(n_tables, seed=0):
+    """Returns a catalog of ``n_tables`` plausible tables linked by foreign keys."""
+    rng = random.Random(seed)
+    names = []
+    for domain in DOMAINS:
+        for entity in ENTITIES:
+            names.append(f"{domain}_{entity}")
+    rng.shuffle(names)
+    while len(names) < n_tables:
+        names.append(f"{rng.choice(DOMAINS)}_{rng.choice(ENTITIES)}_{len(names)}")
+    names = sorted(names[:n_tables])
+
+    tables = {}
+    for i, name in enumerate(names):
+        columns = [Column("id", "INTEGER", False)]
+        columns += [Column(attr, rng.choice(["TEXT", "NUMERIC(12, 2)", "TIMESTAMP", "INTEGER"]))
+                    for attr in rng.sample(ATTRIBUTES, rng.randint(3, 8))]
+        fks = []
+        for target in rng.sample(names[:i], min(i, rng.randint(0, 2))):
+            col = f"{target.split('_', 1)[1]}_id"
+            if any(c.name == col for c in columns):
+                continue
+            columns.append(Column(col, "INTEGER"))
+            fks.append(ForeignKey([col], target, ["id"], f"{name}_{col}_fkey"))
+        tables[name] = Table(name, columns, ["id"], f"{name}_pkey", fks, marker=str(i))
+    return SchemaCatalog(f"synthetic-{n_tables}", tables)
+
+
+def _time_ms(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(samples)
+
+
+def run(table_counts, repeat, use_ollama):
+    generate_sql = None
+    if use_ollama:
+        from app.llm_utils import generate_sql
+
+    header = f"{'tables':>6} {'full tok':>9} {'linked tok':>10} {'index ms':>9} {'link ms':>8}"
+    if use_ollama:
+        header += f" {'full llm s':>10} {'linked llm s':>12}"
+    print(header)
+    for n in table_counts:
+        catalog = synthetic_catalog(n)
+        start = time.perf_counter()
+        get_index(catalog)
+        index_ms = (time.perf_counter() - start) * 1000
+
+        full_schema = catalog.render()
+        full_tokens = estimate_tokens(SQL_TEMPLATE.format(schema=full_schema, dialect=DIALECT, examples="",
+                                                          question=QUESTIONS[0]))
+        linked_tokens, link_ms, full_llm, linked_llm = [], [], [], []
+        for question in QUESTIONS:
+            context, ms = _time_ms(lambda: build_schema_context(catalog, question), repeat)
+            link_ms.append(ms)
+            linked_tokens.append(estimate_tokens(SQL_TEMPLATE.format(schema=context, dialect=DIALECT, examples="",
+                                                                     question=question)))
+            if generate_sql:
+                _, ms = _time_ms(lambda: generate_sql(full_schema, question), 1)
+                full_llm.append(ms / 1000)
+                _, ms = _time_ms(lambda: generate_sql(context, question), 1)
+                linked_llm.append(ms / 1000)
+
+        line = (f"{n:>6} {full_tokens:>9} {int(statistics.mean(linked_tokens)):>10} "
+                f"{index_ms:>9.1f} {statistics.median(link_ms):>8.3f}")
+        if generate_sql:
+            line += f" {statistics.median(full_llm):>10.2f} {statistics.median(linked_llm):>12.2f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tables", type=int, nargs="+", default=[10, 50, 100, 200, 400])
+    parser.add_argument("--repeat", type=int, default=20, help="timing repetitions for schema linking")
+    parser.add_argument("--ollama", action="store_true", help="also time generation against the local Ollama")
+    args = parser.parse_args()
+    run(args.tables, args.repeat, args.ollama)
+
+
+if __name__ == "__main__":
+    main()
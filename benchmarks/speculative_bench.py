@@ -0,0 +1,106 @@
+"""Time to a valid answer with one generation vs. speculative candidates.
+
+Starts :mod:`benchmarks.mock_ollama` with a slow tail (``--slow-rate`` of
+answers wait ``--slow-delay`` more seconds) and some invalid SQL
+(``--invalid-rate``), then answers the same questions once per candidate
+count over a synthetic SQLite database. With one candidate, invalid SQL costs
+a repair round trip and a slow answer is waited out; with several, the first
+valid candidate that runs wins. Reports p50/p95 time to a successful result,
+throughput and LLM requests per question.
+
+The mock serves ``--llm-parallel`` requests at once (one by default, Ollama's
+own default), and the client is configured to match, so extra candidates
+compete for the same slots as everyone else's questions.
+
+    python -m benchmarks.speculative_bench
+    python -m benchmarks.speculative_bench --candidates 1 2 3 4 --questions 60 --concurrency 4 --llm-parallel 4
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_ollama import MockOllama
+from benchmarks.pipeline_bench import percentile
+
+
+def configure_environment(url, mock_url, llm_parallel, pick):
+    # app.config reads the environment at import time, so this runs before any app import
+    os.environ.update({
+        "DATABASE_URL": url,
+        "OLLAMA_URL": mock_url,
+        "OLLAMA_NUM_PARALLEL": str(llm_parallel),
+        "OLLAMA_MAX_QUEUE": "1000",
+        "OLLAMA_WARMUP": "false",
+        "DB_POOL_WARMUP": "0",
+        "SQL_CACHE": "false",
+        "SQL_CACHE_PATH": "",
+        "FEW_SHOT": "false",
+        "RESULT_CACHE": "true",
+        "TRACE_SINKS": "",
+        "SQL_CANDIDATE_PICK": pick,
+        "SCHEMA_CACHE_DIR": os.path.join(tempfile.gettempdir(), "text2sql-bench-schema"),
+    })
+
+
+def run(args):
+    url = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"text2sql-bench-{args.tables}-{args.rows}.db")
+    mock = MockOllama(ttft=args.ttft, token_delay=args.token_delay, slow_rate=args.slow_rate,
+                      slow_delay=args.slow_delay, invalid_rate=args.invalid_rate,
+                      num_parallel=args.llm_parallel).start()
+    configure_environment(url, mock.url, args.llm_parallel, args.pick)
+
+    from app import pipeline
+    from benchmarks.schema_linking_bench import QUESTIONS
+    from benchmarks.synthetic_db import create_database
+
+    if not os.path.exists(url[len("sqlite:///"):]):
+        engine, _ = create_database(url, args.tables, args.rows)
+        engine.dispose()
+
+    print(f"{'candidates':>10} {'p50 s':>7} {'p95 s':>7} {'max s':>7} {'q/s':>6} {'llm req/q':>9} {'errors':>6}")
+    for n in args.candidates:
+        def ask(i):
+            # Distinct questions per run, so neither cache can answer them
+            question = f"{QUESTIONS[i % len(QUESTIONS)]} (#{n}-{i})"
+            started = time.perf_counter()
+            try:
+                generated = pipeline.generate(question, candidates=n)
+                pipeline.fetch(pipeline.check(generated.sql).sql, page=0)
+                return time.perf_counter() - started
+            except Exception as e:
+                print(f"--> speculative_bench: Question {i} failed: {e}")
+                return None
+
+        requests = mock.requests
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            durations = list(pool.map(ask, range(args.questions)))
+        wall = time.perf_counter() - started
+        samples = sorted(d for d in durations if d is not None)
+        print(f"{n:>10} {percentile(samples, 50):>7.2f} {percentile(samples, 95):>7.2f} "
+              f"{(samples or [0])[-1]:>7.2f} {len(samples) / wall:>6.2f} "
+              f"{(mock.requests - requests) / args.questions:>9.2f} {durations.count(None):>6}")
+    mock.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--candidates", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--llm-parallel", type=int, default=1, help="requests the mock (and client) run at once")
+    parser.add_argument("--tables", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=1_000, help="rows per table")
+    parser.add_argument("--pick", choices=["first", "agreement"], default="first")
+    parser.add_argument("--ttft", type=float, default=0.2, help="mock seconds to first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="mock seconds between chunks")
+    parser.add_argument("--slow-rate", type=float, default=0.1, help="share of slow mock answers")
+    parser.add_argument("--slow-delay", type=float, default=2.0, help="extra seconds of a slow answer")
+    parser.add_argument("--invalid-rate", type=float, default=0.2, help="share of mock answers with a bad column")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,177 +1,247 @@
 # main.py - Entry point for the Streamlit application
 
-print("--> Importing main.py")
 import streamlit as st
-import re
-print("--> main.py: Imported streamlit")
-from app.db_config import get_schema, run_query
-print("--> main.py: Imported db_config functions")
-from app.llm_utils import generate_sql
-print("--> main.py: Imported llm_utils function")
-
-def extract_sql_from_response(text):
-    """Extracts SQL query, assuming the input text *is* the SQL query."""
-    print(f"--> extract_sql (raw input): Input text (first 100 chars): {text[:100]}...")
-    if text:
-        sql_query = text.strip()
-        print(f"--> extract_sql (returning cleaned input): '{sql_query}'")
-        return sql_query
-    else:
-        print("--> extract_sql: Received empty text.")
-        return None
-
-print("--> main.py: Running st.set_page_config()")
+import time
+from app.charts import prepare_chart
+from app.config import API_URL, FEW_SHOT_CAPTURE, OLLAMA_STREAM, RESULT_PAGE_SIZE, RESULT_PAGING
+from app.errors import DatabaseError, QueryError, SqlExtractionError, SqlValidationError
+from app.instrumentation import configure as configure_tracing, finish_trace, record, start_trace
+from app.llm_client import LLMBusyError, LLMError
+from app.session_memo import SessionMemo
+
+if API_URL:
+    # Thin client: generation and queries run in the separately scaled API service
+    from app.api_client import get_api_client
+    backend = get_api_client()
+else:
+    from app import pipeline as backend
+    # Load the model and its schema prefix while the user types the first question
+    backend.start_warm_up()
+
+configure_tracing()
+
 st.set_page_config(page_title="Text-to-SQL Internal Tool")
-print("--> main.py: Running st.title()")
 st.title("Ask Your Database Anything")
 
-print("--> main.py: Running st.text_input()")
+# One deployment can serve several databases; questions are routed unless one is picked
+if "_sources" not in st.session_state:
+    try:
+        st.session_state["_sources"] = backend.sources()
+    except DatabaseError as e:
+        st.error(str(e))
+        st.stop()
+source_names = [s["name"] for s in st.session_state["_sources"]]
+chosen_source = None
+if len(source_names) > 1:
+    picked = st.selectbox("Data source", ["Automatic"] + source_names)
+    chosen_source = None if picked == "Automatic" else picked
+
 question = st.text_input("Enter your question:")
 
-print(f"--> main.py: Question entered: {bool(question)}")
+memo = SessionMemo(st.session_state)
+
+trace = None
 if question:
-    print("--> main.py: Entering 'if question:' block")
-    # with st.spinner("Generating SQL and fetching results..."): # Temporarily removed for debugging
-    print("--> main.py: Calling get_schema()")
-    schema = get_schema()
-    print("--> main.py: Calling generate_sql()") # Added explicit log
-    sql_response = generate_sql(schema, question)
-    print(f"--> main.py: Full LLM response received: {sql_response[:100]}...")
-
-    # Extract SQL from the response
-    extracted_sql = extract_sql_from_response(sql_response)
-    print(f"--> main.py: Extracted SQL: {extracted_sql[:50] if extracted_sql else 'None'}...")
-
-    if extracted_sql:
-        print(f"--> main.py: Attempting to display SQL with st.code():\n{extracted_sql}") # Log full SQL
+    trace = start_trace("question", question=question)
+    # st.stop() on an error path (or the Stop button) raises, so the trace is ended in finally
+    try:
+        try:
+            source = chosen_source or (backend.route(question) if len(source_names) > 1 else None)
+            schema_version = backend.schema_version(source)
+        except DatabaseError as e:
+            st.error(str(e))
+            st.stop()
+        # Reruns (any widget change) reuse this session's answer instead of regenerating
+        entry = memo.get(question, schema_version)
+        if entry is None:
+            # Stream partial SQL into a placeholder, throttled to keep websocket traffic low
+            stream_placeholder = st.empty()
+            last_render = [0.0]
+            def show_partial_sql(partial):
+                now = time.monotonic()
+                if now - last_render[0] >= 0.05:
+                    last_render[0] = now
+                    stream_placeholder.code(partial, language="sql")
+            try:
+                generated = backend.generate(question, on_token=show_partial_sql if OLLAMA_STREAM else None,
+                                             use_cache=not st.session_state.pop("_regenerate", False),
+                                             source=source)
+            except LLMBusyError:
+                st.error("The SQL generator is busy right now. Please try again in a moment.")
+                st.stop()
+            except LLMError as e:
+                st.error(f"Error calling Ollama API: {e}")
+                st.stop()
+            except SqlValidationError as e:
+                st.error("The generated SQL did not pass validation. Please try rephrasing your question.")
+                st.code(e.sql, language="sql")
+                for problem in e.problems:
+                    st.caption(problem)
+                st.stop()
+            except SqlExtractionError as e:
+                st.error("Could not extract SQL query from the response. Please try rephrasing your question.")
+                st.text_area("Full Response:", e.response, height=150) # Show full response for debugging
+                st.stop()
+            except DatabaseError as e:
+                st.error(str(e))
+                st.stop()
+            stream_placeholder.empty()
+            entry = memo.put(question, schema_version, generated)
+        generated = entry.generated
+        if len(source_names) > 1:
+            st.caption(f"Data source: **{generated.source}**" + ("" if chosen_source else " (chosen automatically)"))
+        if generated.cached:
+            st.caption("Reused SQL generated for the same or a very similar question.")
+        elif "ttft" in generated.metrics:
+            st.caption(f"Queued: {generated.metrics.get('queue_wait', 0):.2f}s · "
+                       f"Time to first token: {generated.metrics['ttft']:.2f}s · "
+                       f"Total generation: {generated.metrics['total']:.2f}s")
+        speculation = generated.metrics.get("speculation")
+        if speculation and speculation.get("winner") is not None:
+            st.caption(f"Picked candidate {speculation['winner'] + 1} of {speculation['candidates']} "
+                       f"({speculation['valid']} valid, {speculation['executed']} run"
+                       + (f", {speculation['agreement']} agreeing" if speculation["agreement"] > 1 else "") + ").")
+        if generated.metrics.get("repairs"):
+            st.caption(f"Fixed after local validation ({generated.metrics['repairs']} repair request(s)).")
+
+        extracted_sql = generated.sql
         st.code(extracted_sql, language="sql") # Display extracted SQL
+        def regenerate():
+            memo.drop(question, schema_version)
+            st.session_state["_regenerate"] = True
+        def rerun_query():
+            memo.clear_pages(question, schema_version)
+            st.session_state["_refresh"] = True
+        regenerate_col, rerun_col = st.columns(2)
+        regenerate_col.button("Regenerate SQL", on_click=regenerate)
+        rerun_col.button("Re-run query", on_click=rerun_query)
+
+        sql_to_run = extracted_sql
+        # EXPLAIN before executing: reject or limit plans over the cost/row thresholds
+        if entry.guard is None:
+            entry.guard = backend.check(extracted_sql, source=source)
+        guard_result = entry.guard
+        if guard_result.summary:
+            st.caption(f"Plan: {guard_result.summary.describe()}")
+        if guard_result.action == "reject":
+            st.error(f"Query not run: {guard_result.reason}. Try a more specific question.")
+            st.stop()
+        if guard_result.action == "downgrade":
+            st.warning(f"Running a limited version of this query: {guard_result.reason}.")
+            sql_to_run = guard_result.sql
         try:
-            print("--> main.py: Calling run_query() with extracted SQL")
-            result = run_query(extracted_sql) # Use extracted SQL
-            print("--> main.py: run_query() successful, proceeding")
+            page_key = f"page::{sql_to_run}"
+            page = st.session_state.get(page_key, 0) if RESULT_PAGING else None
+            query_status = st.empty()
+            memo_page = memo.page(entry, sql_to_run, page)
+            if memo_page is None:
+                # Elapsed-time updates also let Streamlit's Stop button interrupt (and cancel) the query
+                query_started = time.monotonic()
+                def show_query_progress():
+                    query_status.caption(f"Running query… {time.monotonic() - query_started:.0f}s")
+                # With paging only the current page is fetched, however large the underlying result is
+                result, has_more = backend.fetch(sql_to_run, page, on_wait=show_query_progress,
+                                                 refresh=st.session_state.pop("_refresh", False), source=source)
+                query_status.empty()
+                memo_page = memo.store_page(entry, sql_to_run, page, result, has_more)
+            result, has_more = memo_page.frame, memo_page.has_more
+            # Only cache SQL that ran
+            if not generated.cached and not entry.remembered:
+                backend.remember(question, extracted_sql, source=source)
+                entry.remembered = True
 
             # Display the original table first
-            print("--> main.py: Calling st.dataframe() with original data")
+            render_started = time.perf_counter()
             if result is not None:
-                # --- Add preprocessing for table display --- 
-                table_display_df = result.copy()
-                print("--> main.py: Starting preprocessing for TABLE display")
-                for col in table_display_df.columns:
-                    try:
-                        col_data = table_display_df[col].dropna()
-                        has_lists = any(isinstance(x, list) for x in col_data)
-                        if has_lists:
-                            # Convert the entire column to string if any lists are present
-                            print(f"--> main.py: Preprocessing list-containing column '{col}' for TABLE (converting whole column to string)")
-                            table_display_df[col] = table_display_df[col].astype(str)
-                    except Exception as e:
-                        print(f"--> main.py: Warning - Could not preprocess column '{col}' for TABLE: {e}")
-                print("--> main.py: Finished preprocessing for TABLE display")
-                # --- End preprocessing for table display ---
-                
-                st.dataframe(table_display_df) # Display the processed copy
-                print("--> main.py: st.dataframe() successful")
+                # Array/JSON columns already arrive as text from run_query, so the frame
+                # can be displayed and charted as-is without copies or per-cell scans
+                st.dataframe(result)
+                if RESULT_PAGING and (page > 0 or has_more):
+                    if sql_to_run not in entry.counts:
+                        entry.counts[sql_to_run] = backend.count(sql_to_run, source=source)
+                    total, exact = entry.counts[sql_to_run]
+                    first_row = page * RESULT_PAGE_SIZE + 1
+                    total_text = "" if total is None else f" of {'' if exact else '~'}{total:,}"
+                    st.caption(f"Rows {first_row:,}–{first_row + len(result) - 1:,}{total_text}")
+                    prev_col, next_col, count_col = st.columns(3)
+                    prev_col.button("Previous page", disabled=page == 0,
+                                    on_click=lambda: st.session_state.update({page_key: page - 1}))
+                    next_col.button("Next page", disabled=not has_more,
+                                    on_click=lambda: st.session_state.update({page_key: page + 1}))
+                    if not exact:
+                        count_col.button("Count all rows",
+                                         on_click=lambda: entry.counts.update(
+                                             {sql_to_run: backend.count(sql_to_run, exact=True, source=source)}))
             else:
-                print("--> main.py: run_query() returned None.")
                 st.write("Query returned no results.")
 
-            # Preprocess DataFrame copy for chart compatibility
+            # Only SQL a user vouches for becomes a few-shot example; running without an error isn't enough
+            if FEW_SHOT_CAPTURE:
+                if entry.accepted:
+                    st.caption("Saved as an example for similar questions.")
+                else:
+                    def accept_sql():
+                        entry.accepted = backend.accept(question, extracted_sql, source=source)
+                    st.button("SQL is correct", on_click=accept_sql,
+                              help="Save this question and SQL as an example for similar questions")
+
             if result is not None and not result.empty:
-                processed_result = result.copy()
-                print("--> main.py: Starting data preprocessing for charts")
-                for col in processed_result.columns:
-                    # Check if column contains lists mixed with non-lists or only lists
-                    try:
-                        col_data = processed_result[col].dropna()
-                        has_lists = any(isinstance(x, list) for x in col_data)
-                        if has_lists:
-                            has_non_lists = any(not isinstance(x, list) for x in col_data)
-                            if has_non_lists:
-                                print(f"--> main.py: Preprocessing mixed-type column '{col}' for charts (converting lists to strings)")
-                                processed_result[col] = processed_result[col].apply(lambda x: str(x) if isinstance(x, list) else x)
-                            else: # Column contains only lists (and potentially None)
-                                print(f"--> main.py: Preprocessing list-only column '{col}' for charts (converting lists to strings)")
-                                processed_result[col] = processed_result[col].apply(lambda x: str(x) if isinstance(x, list) else x)
-                    except Exception as e:
-                        print(f"--> main.py: Warning - Could not preprocess column '{col}': {e}")
-                        # Optionally convert the whole column to string as a fallback
-                        # processed_result[col] = processed_result[col].astype(str)
-
-                print("--> main.py: Preprocessing for charts finished.")
-                
-                # Attempt to display charts using the processed data
-                if not processed_result.empty:
-                    try:
-                        print("--> main.py: Preparing chart_data")
-                        # Basic check: Use first column as index if suitable, else default index
-                        chart_data = processed_result
-                        if len(processed_result.columns) > 0:
-                            # Check if the first column can be reasonably used as an index
-                            # This is a simple heuristic, might need refinement
-                            try:
-                                # Attempt to check uniqueness, might fail if mixed types persist after str conversion
-                                potential_index_col = processed_result.iloc[:, 0]
-                                # Ensure we don't try to index on actual list objects if conversion failed somehow
-                                if not any(isinstance(x, list) for x in potential_index_col.dropna()):
-                                    if potential_index_col.nunique() == len(processed_result):
-                                        try:
-                                            chart_data = processed_result.set_index(processed_result.columns[0])
-                                            print(f"--> main.py: Set column '{processed_result.columns[0]}' as index for charts.")
-                                        except Exception as idx_e:
-                                            print(f"--> main.py: Could not set index for chart: {idx_e}")
-                                            # Proceed with default index
-                                    else:
-                                        print("--> main.py: First column not unique, using default index for charts.")
-                                else:
-                                    print("--> main.py: First column still contains lists after processing, using default index for charts.")
-                            except TypeError as unique_err:
-                                print(f"--> main.py: Could not check uniqueness for index due to types: {unique_err}")
-                                # Proceed with default index
-                        
-                        # Check if there are numeric columns to plot
-                        # Note: numeric check might be affected if numbers were in mixed lists and converted to str
-                        print("--> main.py: Identifying numeric columns for charts")
-                        numeric_cols = chart_data.select_dtypes(include='number').columns
-                        
-                        if not numeric_cols.empty:
-                            print("--> main.py: Attempting to display charts")
-                            st.subheader("Charts")
-                            # Select first numeric column for basic charts
-                            col_to_plot = numeric_cols[0]
-                            
-                            st.write("Line Chart:")
-                            st.line_chart(chart_data[col_to_plot])
-                            
-                            st.write("Bar Chart:")
-                            st.bar_chart(chart_data[col_to_plot])
-                            print("--> main.py: Charts displayed")
+                try:
+                    if not memo_page.chart_ready:
+                        # A page of a larger result is charted as such, without page-only totals
+                        memo_page.chart = prepare_chart(result, partial=page is not None and (page > 0 or has_more))
+                        memo_page.chart_ready = True
+                    chart = memo_page.chart
+                    if chart is not None:
+                        st.subheader("Charts")
+                        if chart.kind == "line":
+                            st.line_chart(chart.frame)
                         else:
-                            print("--> main.py: No numeric columns found for charting.")
-                            # Check if there are *any* columns left after potential index setting
-                            if not chart_data.columns.empty:
-                                print(f"--> main.py: Displaying bar chart for the first available column: {chart_data.columns[0]}")
-                                st.subheader("Charts (Non-Numeric)")
-                                st.bar_chart(chart_data[chart_data.columns[0]])
-                            else:
-                                st.write("No data suitable for charting after processing.")
-                    except Exception as chart_e:
-                        print(f"--> main.py: ERROR displaying charts - {chart_e}")
-                        st.warning(f"Could not display charts: {str(chart_e)}")
-            elif result is None:
-                # Already handled above when displaying the table
-                pass
-            else: # Result is an empty DataFrame
-                print("--> main.py: run_query() returned an empty DataFrame. No charts to display.")
-                # st.write("Query returned no results.") # Already shown with table
+                            st.bar_chart(chart.frame)
+                        if chart.describe():
+                            st.caption(chart.describe())
+                    else:
+                        st.write("No data suitable for charting.")
+                except Exception as chart_e:
+                    print(f"--> main.py: ERROR displaying charts - {chart_e}")
+                    st.warning(f"Could not display charts: {str(chart_e)}")
+            record("render", time.perf_counter() - render_started)
 
+        except QueryError as e:
+            query_status.empty()
+            st.error(str(e))
+            st.code(e.sql, language="sql")
         except Exception as e:
-            # Errors from run_query should be caught there now, but keep this as fallback
+            # Errors from run_query are raised as QueryError; keep this as fallback
             print(f"--> main.py: ERROR in run_query block - {e}")
             st.error(f"Error running SQL: {str(e)}")
-    else:
-        # Handle case where SQL couldn't be extracted
-        print("--> main.py: ERROR - Could not extract SQL from LLM response.")
-        st.error("Could not extract SQL query from the response. Please try rephrasing your question.")
-        st.text_area("Full Response:", sql_response, height=150) # Show full response for debugging
+    finally:
+        finish_trace()
+
+if trace is not None:
+    with st.expander("Timings"):
+        st.dataframe(
+            [{"stage": "  " * s["depth"] + s["name"], "seconds": s["duration"], **s.get("attrs", {})}
+             for s in trace.to_dict()["spans"]],
+            width="stretch",
+        )
+        st.caption(f"Total: {trace.duration:.2f}s")
+
+stats = backend.stats()
+
+with st.sidebar.expander("Database pool"):
+    st.write(stats.get("pool", stats))
+    if "data_sources" in stats:
+        st.write("Data sources", stats["data_sources"])
+
+with st.sidebar.expander("LLM queue"):
+    st.write(stats.get("llm", {}))
 
-print("--> Finished executing main.py script")
+with st.sidebar.expander("Cache statistics"):
+    if "sql_cache" in stats:
+        st.write("Generated SQL", stats["sql_cache"])
+    if "result_cache" in stats:
+        st.write("Query results", stats["result_cache"])
+    if "examples" in stats:
+        st.write("Few-shot examples", stats["examples"])
+    st.write("This session", memo.stats())
@@ -9,7 +9,7 @@ question = st.text_input("Enter your question:")
 
 if question:
     with st.spinner("Generating SQL and fetching results..."):
-        schema = get_schema()
+        schema = get_schema(question)
         sql = generate_sql(schema, question)
         st.code(sql, language="sql")
         try:
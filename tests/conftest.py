@@ -0,0 +1,43 @@
+"""Test settings: a small SQLite database and a mock Ollama server.
+
+app.config reads the environment when it is first imported, so everything is
+set here, before any test module imports the app.
+"""
+import os
+import sqlite3
+import tempfile
+
+from benchmarks.mock_ollama import MockOllama
+
+_TMP = tempfile.mkdtemp(prefix="text2sql-tests-")
+DATABASE_PATH = os.path.join(_TMP, "shop.db")
+
+with sqlite3.connect(DATABASE_PATH) as _conn:
+    _conn.executescript("""
+        CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT NOT NULL, region TEXT);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INTEGER REFERENCES customers (id),
+                             amount REAL, placed_at TEXT);
+    """)
+    _conn.executemany("INSERT INTO customers VALUES (?, ?, ?)",
+                      [(i, f"customer {i}", ["north", "south", "west"][i % 3]) for i in range(1, 31)])
+    _conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?)",
+                      [(i, i % 30 + 1, i * 1.5, f"2024-01-{i % 28 + 1:02d}") for i in range(1, 101)])
+_conn.close()
+
+MOCK_OLLAMA = MockOllama(ttft=0.01, token_delay=0.0).start()
+
+os.environ.update({
+    "DATABASE_URL": "sqlite:///" + DATABASE_PATH,
+    "OLLAMA_URL": MOCK_OLLAMA.url,
+    "OLLAMA_WARMUP": "false",
+    "OLLAMA_MAX_RETRIES": "1",
+    "DB_POOL_WARMUP": "0",
+    "SCHEMA_CACHE_DIR": os.path.join(_TMP, "schema"),
+    "SQL_CACHE_PATH": "",
+    "FEW_SHOT_PATH": os.path.join(_TMP, "examples.db"),
+    "RESULT_CACHE_DIR": os.path.join(_TMP, "results"),
+    "TRACE_SINKS": "",
+    "DATA_SOURCES": "",
+    "DATA_SOURCES_FILE": "",
+    "API_SECRET": "test-secret",
+})
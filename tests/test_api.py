@@ -0,0 +1,63 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import api  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(api.app) as client:
+        yield client
+
+
+def test_remember_takes_only_the_token_sql_returned(client):
+    generated = client.post("/sql", json={"question": "How much did each customer order?"}).json()
+    body = {"question": generated["question"], "sql": generated["sql"], "source": generated["source"]}
+    assert client.post("/remember", json=dict(body, token="0" * 64)).status_code == 403
+    forged = dict(body, sql="SELECT name FROM customers", token=generated["token"])
+    assert client.post("/remember", json=forged).status_code == 403
+    assert client.post("/remember", json=dict(body, token=generated["token"])).status_code == 200
+
+
+@pytest.mark.parametrize("sql", ["DELETE FROM orders", "SELECT 1; DROP TABLE orders", "SELECT nope FROM orders"])
+def test_query_rejects_anything_but_one_read_only_select(client, sql):
+    response = client.post("/query", json={"sql": sql, "format": "json"})
+    assert response.status_code == 400
+    assert response.json()["error"] == "QueryNotAllowed"
+
+
+def test_query_runs_the_guard_and_returns_the_page(client):
+    response = client.post("/query", json={"sql": "SELECT id FROM orders ORDER BY id", "page": 1,
+                                           "page_size": 10, "format": "json"})
+    assert response.status_code == 200
+    data = response.json()
+    assert [row[0] for row in data["data"]] == list(range(11, 21))
+    assert data["has_more"] is True
+    assert data["guard"]["action"] == "run"
+
+
+def test_page_size_is_bounded(client):
+    response = client.post("/query", json={"sql": "SELECT id FROM orders", "page": 0,
+                                           "page_size": api.API_MAX_PAGE_SIZE + 1})
+    assert response.status_code == 422
+
+
+def test_refuses_to_start_without_a_secret(monkeypatch):
+    monkeypatch.setattr(api, "API_SECRET", "")
+    with pytest.raises(RuntimeError, match="API_SECRET"):
+        with TestClient(api.app):
+            pass
+
+
+def test_accept_takes_only_the_token_sql_returned(client):
+    generated = client.post("/sql", json={"question": "Which region has the most customers?"}).json()
+    body = {"question": generated["question"], "sql": generated["sql"], "source": generated["source"]}
+    forged = dict(body, sql="SELECT name FROM customers", token=generated["token"])
+    assert client.post("/accept", json=forged).status_code == 403
+    response = client.post("/accept", json=dict(body, token=generated["token"]))
+    assert response.status_code == 200
+    assert response.json()["stored"] is True
@@ -0,0 +1,17 @@
+import pandas as pd
+
+from app.batch import write_frame
+
+
+def test_parquet_write(tmp_path):
+    path = write_frame(pd.DataFrame({"n": [1, 2]}), str(tmp_path / "ok"), "parquet")
+    assert path.endswith(".parquet")
+    assert pd.read_parquet(path)["n"].tolist() == [1, 2]
+
+
+def test_mixed_object_column_falls_back_to_csv(tmp_path):
+    frame = pd.DataFrame({"id": [1, 2, 3], "value": [1, "two", 3.0]})
+    path = write_frame(frame, str(tmp_path / "mixed"), "parquet")
+    assert path.endswith(".csv")
+    assert not (tmp_path / "mixed.parquet").exists()
+    assert pd.read_csv(path)["value"].astype(str).tolist() == ["1", "two", "3.0"]
@@ -0,0 +1,15 @@
+import pandas as pd
+
+from app.charts import build_chart
+
+
+def test_full_result_sums_per_category():
+    chart = build_chart(pd.DataFrame({"region": ["a", "b", "a"], "sales": [1, 2, 3]}))
+    assert chart.frame["sales"].to_dict() == {"a": 4, "b": 2}
+    assert chart.describe().startswith("Summed per category")
+
+
+def test_partial_result_is_not_summed():
+    chart = build_chart(pd.DataFrame({"region": ["a", "b", "a"], "sales": [1, 2, 3]}), partial=True)
+    assert chart.frame["sales"].tolist() == [1, 2, 3]
+    assert chart.describe() == "Current page only"
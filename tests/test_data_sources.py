@@ -0,0 +1,62 @@
+import os
+import sqlite3
+
+import pytest
+
+from app.data_sources import DataSource, DataSourceRegistry, parse_sources
+from app.errors import UnknownDataSource
+
+
+def sqlite_source(tmp_path, name, ddl):
+    path = tmp_path / f"{name}.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(ddl)
+    conn.close()
+    return DataSource(name, f"sqlite:///{path}")
+
+
+@pytest.fixture
+def registry(tmp_path):
+    sales = sqlite_source(tmp_path, "sales", "CREATE TABLE invoices (id INTEGER, amount REAL, due_date TEXT);")
+    hr = sqlite_source(tmp_path, "hr", "CREATE TABLE employees (id INTEGER, name TEXT, salary REAL);")
+    registry = DataSourceRegistry([sales, hr], default="sales", idle_timeout=60)
+    yield registry
+    for source in registry.sources.values():
+        source.close()
+
+
+def test_registry_evicts_idle_sources(registry):
+    hr = registry.get("hr")
+    hr.get_engine()
+    registry.get("sales").get_engine()
+    assert hr.active
+    # An hour without use; the sweep runs at most every idle_timeout / 10
+    hr.last_used -= 3600
+    registry._last_sweep -= 3600
+    registry.get("sales")
+    assert not hr.active
+    assert registry.get("sales").active
+    assert registry.evictions == 1
+    # Coming back starts a new engine
+    assert hr.get_engine() is not None and hr.active
+
+
+def test_questions_are_routed_to_the_covering_schema(registry):
+    assert registry.route("average employee salary") == "hr"
+    assert registry.route("total invoice amount by due date") == "sales"
+    assert registry.route("weather tomorrow") == "sales"
+
+
+def test_unknown_source_is_refused(registry):
+    with pytest.raises(UnknownDataSource, match="configured: sales, hr"):
+        registry.get("finance")
+
+
+def test_parse_sources_accepts_file_paths():
+    sources = parse_sources("warehouse=postgresql://reader@dw/analytics; local = data/shop.sqlite")
+    assert [(s.name, s.url) for s in sources] == [
+        ("warehouse", "postgresql://reader@dw/analytics"),
+        ("local", "sqlite:///" + os.path.abspath("data/shop.sqlite")),
+    ]
+    with pytest.raises(ValueError):
+        parse_sources("warehouse")
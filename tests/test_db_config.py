@@ -0,0 +1,61 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import db_config, pipeline
+from app.errors import QueryError, QueryRejected
+from app.query_guard import GuardResult
+
+# Counts to a billion: runs far longer than any test should wait
+ENDLESS = ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000000000) "
+           "SELECT max(i) FROM n")
+
+
+class RecordingConnection:
+    def __init__(self, dialect):
+        self.dialect = SimpleNamespace(name=dialect)
+        self.statements = []
+
+    def exec_driver_sql(self, statement):
+        self.statements.append(statement)
+
+
+def test_statement_timeout_is_local_to_the_transaction():
+    connection = RecordingConnection("postgresql")
+    db_config._set_statement_timeout(connection, 30000)
+    assert connection.statements == ["SET LOCAL statement_timeout = 30000"]
+
+
+@pytest.mark.parametrize("dialect, timeout_ms", [("postgresql", 0), ("sqlite", 30000)])
+def test_statement_timeout_is_skipped_when_off_or_unsupported(dialect, timeout_ms):
+    connection = RecordingConnection(dialect)
+    db_config._set_statement_timeout(connection, timeout_ms)
+    assert connection.statements == []
+
+
+def test_dialects_without_explain_json_pass_the_guard():
+    result = pipeline.check("SELECT * FROM orders")
+    assert result.action == "run"
+    assert result.summary is None
+
+
+def test_rejected_query_is_not_run(monkeypatch):
+    monkeypatch.setattr(pipeline, "check_query", lambda sql: GuardResult("reject", sql, reason="too expensive"))
+    monkeypatch.setattr(pipeline, "fetch", lambda *args, **kwargs: pytest.fail("a rejected query ran"))
+    with pytest.raises(QueryRejected, match="too expensive"):
+        pipeline.answer("How many orders are there?")
+
+
+def test_interrupted_query_is_cancelled():
+    class Stop(Exception):
+        pass
+
+    def stop():
+        raise Stop()
+
+    started = time.monotonic()
+    with pytest.raises(QueryError) as raised:
+        db_config.run_query(ENDLESS, on_wait=stop, refresh=True)
+    assert isinstance(raised.value.__cause__, Stop)
+    assert time.monotonic() - started < 5
@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+import sqlalchemy
+from sqlalchemy import text
+
+from app.config import DB_POOL_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT
+from app.db_pool import build_engine, pool_stats, warm_up
+
+
+@pytest.fixture
+def sqlite_url(tmp_path):
+    path = tmp_path / "pool.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER)")
+    conn.close()
+    return f"sqlite:///{path}"
+
+
+def test_server_engines_get_the_tuned_pool(monkeypatch):
+    created = {}
+    create_engine = sqlalchemy.create_engine
+
+    def capture(url, **kwargs):
+        created.update(kwargs)
+        return create_engine("sqlite://")
+
+    monkeypatch.setattr(sqlalchemy, "create_engine", capture)
+    build_engine("postgresql://reader@db.internal/shop")
+    assert created == {"pool_pre_ping": DB_POOL_PRE_PING, "pool_size": DB_POOL_SIZE,
+                       "max_overflow": DB_POOL_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT,
+                       "pool_recycle": DB_POOL_RECYCLE, "pool_use_lifo": True}
+
+
+def test_read_only_sqlite_refuses_writes(sqlite_url):
+    engine = build_engine(sqlite_url, read_only=True)
+    with engine.connect() as conn:
+        with pytest.raises(sqlalchemy.exc.OperationalError, match="readonly"):
+            conn.execute(text("INSERT INTO t VALUES (1)"))
+    engine.dispose()
+
+
+def test_warm_up_leaves_connections_in_the_pool(sqlite_url):
+    engine = build_engine(sqlite_url, read_only=False)
+    assert warm_up(engine, 2) == 2
+    stats = pool_stats(engine)
+    assert stats["checked_in"] == 2
+    assert stats["checked_out"] == 0
+    with engine.connect():
+        assert pool_stats(engine)["checked_out"] == 1
+    engine.dispose()
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from app import pipeline
+from app.db_config import get_schema_catalog
+from app.example_store import ANY_DATABASE, ExampleStore, get_example_store, read_pairs
+
+PAIRS = [
+    ("Total revenue by month", "SELECT date_trunc('month', placed_at), sum(amount) FROM orders GROUP BY 1"),
+    ("How many customers per region?", "SELECT region, count(*) FROM customers GROUP BY region"),
+    ("Largest orders this year", "SELECT * FROM orders ORDER BY amount DESC LIMIT 10"),
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ExampleStore(str(tmp_path / "examples.db"))
+    store.add_many("db", PAIRS)
+    return store
+
+
+def test_running_sql_does_not_make_it_an_example():
+    store = get_example_store()
+    before = store.stats()["examples"]
+    answer = pipeline.answer("Which customers are in the north region?")
+    assert not answer.frame.empty
+    assert store.stats()["examples"] == before
+
+
+def test_accepted_sql_is_an_example_for_its_database_only():
+    question = "What is the total order amount per customer?"
+    sql = "SELECT customer_id, SUM(amount) FROM orders GROUP BY customer_id"
+    assert pipeline.accept(question, sql)
+    fingerprint = get_schema_catalog().fingerprint
+    store = get_example_store()
+    assert (question, sql) in store.search(fingerprint, "total order amount for each customer")
+    assert store.search("another-database", "total order amount for each customer") == []
+
+
+def test_any_database_pairs_are_offered_everywhere(tmp_path):
+    store = ExampleStore(str(tmp_path / "examples.db"))
+    store.add("db-a", "How many orders were placed?", "SELECT count(*) FROM orders")
+    store.add(ANY_DATABASE, "How many customers are there?", "SELECT count(*) FROM customers")
+    assert store.search("db-b", "how many orders") == []
+    assert store.search("db-b", "how many customers") == [("How many customers are there?",
+                                                            "SELECT count(*) FROM customers")]
+
+
+def test_most_similar_question_ranks_first(store):
+    examples = store.search("db", "monthly revenue totals", k=2)
+    assert examples[0] == PAIRS[0]
+
+
+def test_search_respects_the_token_budget(store):
+    assert store.search("db", "revenue customers orders region month", k=3, token_budget=10) == []
+    assert len(store.search("db", "revenue customers orders region month", k=3, token_budget=10_000)) == 3
+
+
+def test_same_question_updates_the_pair(store):
+    assert not store.add("db", "total revenue by month?", "SELECT 1")
+    assert store.stats()["examples"] == len(PAIRS)
+    assert store.search("db", "total revenue by month", k=1) == [("total revenue by month?", "SELECT 1")]
+
+
+def test_pairs_added_by_another_process_are_found(store):
+    store.search("db", "revenue")  # builds the index
+    ExampleStore(store.path).add("db", "Average basket size", "SELECT avg(amount) FROM orders")
+    assert store.search("db", "average basket", k=1) == [("Average basket size", "SELECT avg(amount) FROM orders")]
+
+
+def test_read_pairs_from_csv_and_jsonl(tmp_path):
+    csv_path = tmp_path / "pairs.csv"
+    csv_path.write_text("question,sql\nHow many orders?,SELECT count(*) FROM orders\n,SELECT 1\n")
+    jsonl_path = tmp_path / "pairs.jsonl"
+    jsonl_path.write_text(json.dumps({"question": " Top customers ", "sql": "SELECT 1 "}) + "\n\n")
+    assert read_pairs(str(csv_path)) == [("How many orders?", "SELECT count(*) FROM orders")]
+    assert read_pairs(str(jsonl_path)) == [("Top customers", "SELECT 1")]
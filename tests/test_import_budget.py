@@ -0,0 +1,14 @@
+import os
+
+import pytest
+
+from benchmarks.import_budget import TARGETS, measure
+
+BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "250"))
+
+
+@pytest.mark.parametrize("module", sorted(TARGETS))
+def test_cold_start_import_stays_within_budget(module):
+    seconds, loaded = measure(module, repeat=3)
+    assert not set(TARGETS[module]) & loaded, f"{module} eagerly imports {sorted(set(TARGETS[module]) & loaded)}"
+    assert seconds * 1000 <= BUDGET_MS, f"{module} took {seconds * 1000:.0f} ms (budget {BUDGET_MS:.0f} ms)"
@@ -0,0 +1,42 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.instrumentation import finish_trace, span, start_trace
+
+
+def test_spans_from_worker_threads_nest_under_the_submitting_span():
+    trace = start_trace("question")
+    workers = 8
+    inside = threading.Barrier(workers)
+
+    def work(i):
+        with span("candidate", index=i):
+            inside.wait(timeout=5)  # every worker is inside its span at once
+            with span("validate", index=i):
+                pass
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        with span("speculation"):
+            futures = [pool.submit(contextvars.copy_context().run, work, i) for i in range(workers)]
+            for future in futures:
+                future.result()
+    with span("query"):
+        pass
+    finish_trace()
+
+    depths = {}
+    for s in trace.spans:
+        depths.setdefault(s.name, set()).add(s.depth)
+    assert depths == {"speculation": {0}, "candidate": {1}, "validate": {2}, "query": {0}}
+
+
+def test_prometheus_endpoint_is_local_by_default():
+    from app.instrumentation import PrometheusSink
+
+    server = PrometheusSink().serve(0)
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import llm_utils
+from app.llm_client import LLMError, OllamaClient, _keep_alive
+
+
+class ScriptedOllama:
+    """Answers /api/generate with the next scripted reply: an HTTP status, or a list of NDJSON objects."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests = 0
+        self.bodies = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                server.bodies.append(json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0)))))
+                server.requests += 1
+                reply = server.replies.pop(0) if server.replies else [{"response": "SELECT 1;", "done": True}]
+                if isinstance(reply, int):
+                    self.send_error(reply)
+                    return
+                body = "".join(json.dumps(obj) + "\n" for obj in reply).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def scripted():
+    servers = []
+
+    def start(*replies):
+        servers.append(ScriptedOllama(*replies))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def client():
+    clients = []
+
+    def make(url, keep_alive="", num_ctx=0):
+        clients.append(OllamaClient(base_url=url, max_concurrency=1, max_retries=3, backoff_base=0.0,
+                                    keep_alive=keep_alive, num_ctx=num_ctx))
+        return clients[-1]
+
+    yield make
+    for llm in clients:
+        if llm._loop is not None:
+            # Cancel the workers first, so no pending task is left for the garbage collector to report
+            asyncio.run_coroutine_threadsafe(_shut_down(llm), llm._loop).result()
+            llm._loop.call_soon_threadsafe(llm._loop.stop)
+
+
+async def _shut_down(llm):
+    for worker in llm._workers:
+        worker.cancel()
+    await asyncio.gather(*llm._workers, return_exceptions=True)
+    await llm._http.aclose()
+    await asyncio.get_running_loop().shutdown_asyncgens()
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retries_rate_limits_and_server_errors(scripted, client, status):
+    server = scripted(status)
+    metrics = {}
+    assert client(server.url).generate("q", metrics=metrics) == "SELECT 1;"
+    assert server.requests == 2
+    assert metrics["attempts"] == 2
+
+
+def test_client_errors_are_not_retried(scripted, client):
+    server = scripted(400)
+    with pytest.raises(LLMError):
+        client(server.url).generate("q")
+    assert server.requests == 1
+
+
+def test_model_errors_are_not_retried(scripted, client):
+    server = scripted([{"error": "model 'sqlcoder' not found"}])
+    with pytest.raises(LLMError, match="not found"):
+        client(server.url).generate("q")
+    assert server.requests == 1
+
+
+def test_connection_errors_are_retried(scripted, client, capsys):
+    server = scripted()
+    url = server.url
+    server.close()
+    llm = client(url)
+    with pytest.raises(LLMError):
+        llm.generate("q")
+    assert llm.failed == 1
+    assert "Attempt 3 of 3 failed" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("value, expected", [("30m", "30m"), ("600", 600), ("-1", -1), (" ", None), (None, None)])
+def test_keep_alive_values(value, expected):
+    assert _keep_alive(value) == expected
+
+
+def test_every_request_keeps_the_model_and_window(scripted, client):
+    server = scripted()
+    llm = client(server.url, keep_alive="30m", num_ctx=8192)
+    llm.generate("q1")
+    llm.generate("q2", options={"temperature": 0.7})
+    assert [b["keep_alive"] for b in server.bodies] == ["30m", "30m"]
+    # A different num_ctx would make Ollama reload the model and drop its prompt cache
+    assert [b["options"]["num_ctx"] for b in server.bodies] == [8192, 8192]
+
+
+def test_questions_share_the_schema_prefix(scripted, client, monkeypatch):
+    server = scripted()
+    monkeypatch.setattr(llm_utils, "get_llm_client", lambda: client(server.url))
+    schema = "CREATE TABLE orders (id INTEGER, amount REAL);"
+    llm_utils.warm_up(schema, dialect="sqlite")
+    llm_utils.generate_sql(schema, "How many orders?", dialect="sqlite")
+    llm_utils.generate_sql(schema, "Total amount?", examples=[("Largest order", "SELECT max(amount) FROM orders")],
+                           dialect="sqlite")
+    warm_up, first, second = (b["prompt"] for b in server.bodies)
+    assert server.bodies[0]["options"]["num_predict"] == 1
+    assert first.startswith(warm_up) and second.startswith(warm_up)
+    assert schema in warm_up
+    assert "Largest order" not in warm_up
@@ -0,0 +1,31 @@
+import pytest
+
+from app.llm_utils import find_statement_end, generate_sql
+
+
+@pytest.mark.parametrize("text, statement", [
+    ("SELECT 1; and some prose", "SELECT 1;"),
+    ("Here's the query:\nSELECT name FROM t;\nIt lists names.", "Here's the query:\nSELECT name FROM t;"),
+    ("SELECT 'a;b' FROM t; x", "SELECT 'a;b' FROM t;"),
+    ("SELECT 'it''s;' FROM t; x", "SELECT 'it''s;' FROM t;"),
+    ("SELECT 1 -- not the end;\nFROM t; x", "SELECT 1 -- not the end;\nFROM t;"),
+    ("SELECT /* ; */ 1; x", "SELECT /* ; */ 1;"),
+    ("SELECT (SELECT 1; ) FROM t; x", "SELECT (SELECT 1; ) FROM t;"),
+    ("```sql\nSELECT 1\n```\nDone.", "```sql\nSELECT 1\n```"),
+])
+def test_statement_end(text, statement):
+    assert text[:find_statement_end(text)] == statement
+
+
+@pytest.mark.parametrize("text", ["SELECT 1", "SELECT 'open;", "```sql\nSELECT 1;", "The answer is", ""])
+def test_incomplete_statement_has_no_end(text):
+    assert find_statement_end(text) is None
+
+
+def test_generation_stops_at_the_end_of_the_statement():
+    metrics = {}
+    schema = "CREATE TABLE orders (id INTEGER, amount REAL);"
+    response = generate_sql(schema, "What was the running total of order amounts?", metrics=metrics)
+    assert response.rstrip().endswith(";")
+    assert "This query returns" not in response
+    assert metrics["cut_early"] is True
@@ -0,0 +1,43 @@
+import io
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from app.materialize import _column_types, _parse_copy, fetch_frame
+
+# bool, int4, text, text, float8, date
+DESCRIPTION = [("active", 16), ("id", 23), ("code", 25), ("note", 25), ("price", 701), ("day", 1082)]
+# As COPY ... WITH (FORMAT csv, NULL '\N', FORCE_QUOTE *) writes it
+COPY_OUTPUT = (b'"t","1","007","","1.5","2024-01-02"\n'
+               b'"f","2",\\N,"\\N",\\N,\\N\n')
+
+
+@pytest.mark.parametrize("arrow", [True, False])
+def test_copy_output_matches_the_query_result(monkeypatch, arrow):
+    if arrow:
+        pytest.importorskip("pyarrow")
+    else:
+        def no_arrow(*args):
+            raise ImportError("pyarrow")
+        monkeypatch.setattr("app.materialize._parse_copy_arrow", no_arrow)
+    column_types = _column_types(DESCRIPTION)
+    df = _parse_copy(pd, io.BytesIO(COPY_OUTPUT), [c[0] for c in DESCRIPTION], column_types, {5: 1082})
+    assert df["active"].tolist() == [True, False]
+    assert df["id"].tolist() == [1, 2]
+    assert df["code"].iloc[0] == "007" and pd.isna(df["code"].iloc[1])
+    assert df["note"].iloc[0] == ""
+    if arrow:
+        assert df["note"].iloc[1] == "\\N"  # a quoted "\N" is a string, not NULL
+    assert pd.isna(df["price"].iloc[1]) and df["price"].iloc[0] == 1.5
+    assert df["day"].iloc[0] == pd.Timestamp("2024-01-02") and pd.isna(df["day"].iloc[1])
+
+
+def test_chunked_fetch_keeps_columns_and_types():
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        df = fetch_frame(connection, "SELECT 1 AS id, 'x' AS name, 1 AS id UNION ALL SELECT 2, NULL, 3",
+                         chunk_size=1, mode="chunked")
+    assert list(df.columns) == ["id", "name", "id"]
+    assert df.iloc[:, 0].tolist() == [1, 2] and df.iloc[:, 2].tolist() == [1, 3]
+    assert df["name"].iloc[0] == "x" and pd.isna(df["name"].iloc[1])
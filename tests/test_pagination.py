@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import event
+
+from app import pipeline
+from app.db_config import get_query_engine
+from app.pagination import is_pageable, page_sql
+
+ORDERS = "SELECT id, amount FROM orders ORDER BY id;"
+
+
+@pytest.fixture
+def executed():
+    """Statements sent to the query engine during the test."""
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = get_query_engine()
+    event.listen(engine, "before_cursor_execute", capture)
+    yield statements
+    event.remove(engine, "before_cursor_execute", capture)
+
+
+def test_page_request_returns_only_that_page(executed):
+    frame, has_more = pipeline.fetch(ORDERS, page=1, page_size=10, refresh=True)
+    assert frame["id"].tolist() == list(range(11, 21))
+    assert has_more
+    # The window is applied in the database, with one extra row to detect a next page
+    assert any("LIMIT 11 OFFSET 10" in s for s in executed)
+
+
+def test_last_page_has_no_more():
+    frame, has_more = pipeline.fetch(ORDERS, page=9, page_size=10, refresh=True)
+    assert frame["id"].tolist() == list(range(91, 101))
+    assert not has_more
+
+
+def test_exact_count():
+    assert pipeline.count(ORDERS, exact=True) == (100, True)
+
+
+def test_page_sql_drops_the_trailing_semicolon():
+    assert page_sql(ORDERS, 2, 25).endswith(") AS _t2s_page LIMIT 26 OFFSET 50")
+    assert ";" not in page_sql(ORDERS, 2, 25)
+
+
+@pytest.mark.parametrize("sql, pageable", [
+    ("SELECT 1", True), ("  with t as (select 1) select * from t", True), ("(SELECT 1) UNION (SELECT 2)", True),
+    ("PRAGMA table_info(orders)", False), ("EXPLAIN SELECT 1", False),
+])
+def test_only_row_returning_statements_are_paged(sql, pageable):
+    assert is_pageable(sql) is pageable
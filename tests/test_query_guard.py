@@ -0,0 +1,90 @@
+import json
+from types import SimpleNamespace
+
+from app.query_guard import guard, summarise_plan
+
+
+def scan(rows, relation="orders", cost=1000.0):
+    return {"Node Type": "Seq Scan", "Relation Name": relation, "Plan Rows": rows, "Total Cost": cost}
+
+
+def plan(root):
+    return [{"Plan": root}]
+
+
+class FakeConnection:
+    """Answers EXPLAIN with a canned plan: ``limited`` for the LIMIT-wrapped query, ``full`` otherwise."""
+
+    dialect = SimpleNamespace(name="postgresql")
+
+    def __init__(self, full, limited):
+        self.full, self.limited = full, limited
+
+    def execute(self, statement):
+        raw = self.limited if "_t2s_limited" in str(statement) else self.full
+        return SimpleNamespace(scalar=lambda: json.dumps(raw))
+
+
+def test_summary_tracks_rows_feeding_an_aggregate():
+    summary = summarise_plan(plan({"Node Type": "Aggregate", "Plan Rows": 10, "Total Cost": 50.0,
+                                   "Plans": [scan(5000)]}))
+    assert summary.max_node_rows == 5000
+    assert summary.max_blocked_rows == 5000
+    assert summary.scans == [("Seq Scan", "orders", 5000)]
+
+
+def test_summary_ignores_rows_a_limit_can_stop():
+    summary = summarise_plan(plan({"Node Type": "Limit", "Plan Rows": 10, "Total Cost": 5.0,
+                                   "Plans": [scan(5000)]}))
+    assert summary.max_blocked_rows == 0
+
+
+def test_plain_scan_over_row_limit_is_downgraded():
+    full = plan(scan(5000, cost=100.0))
+    limited = plan({"Node Type": "Limit", "Plan Rows": 1000, "Total Cost": 20.0, "Plans": [scan(5000, cost=100.0)]})
+    result = guard(FakeConnection(full, limited), "SELECT * FROM orders", max_cost=1000, max_rows=1000,
+                   action="downgrade")
+    assert result.action == "downgrade"
+    assert "_t2s_limited" in result.sql
+
+
+def test_rows_under_aggregate_are_rejected_not_limited():
+    full = plan({"Node Type": "Aggregate", "Plan Rows": 10, "Total Cost": 100.0, "Plans": [scan(5000, cost=90.0)]})
+    # Even if the limited plan looks cheap, the GROUP BY still reads every row
+    limited = plan({"Node Type": "Limit", "Plan Rows": 10, "Total Cost": 10.0, "Plans": [full[0]["Plan"]]})
+    sql = "SELECT customer_id, sum(amount) FROM orders GROUP BY customer_id"
+    result = guard(FakeConnection(full, limited), sql, max_cost=1000, max_rows=1000, action="downgrade")
+    assert result.action == "reject"
+    assert result.sql == sql
+    assert "aggregate, sort or join" in result.reason
+
+
+def test_rows_under_join_are_rejected_not_limited():
+    join = {"Node Type": "Hash Join", "Plan Rows": 500, "Total Cost": 100.0, "Hash Cond": "(o.customer_id = c.id)",
+            "Plans": [scan(5000), {"Node Type": "Hash", "Plan Rows": 30, "Plans": [scan(30, "customers")]}]}
+    limited = plan({"Node Type": "Limit", "Plan Rows": 500, "Total Cost": 10.0, "Plans": [join]})
+    sql = "SELECT * FROM orders o JOIN customers c ON c.id = o.customer_id"
+    result = guard(FakeConnection(plan(join), limited), sql, max_cost=1000, max_rows=1000, action="downgrade")
+    assert result.action == "reject"
+
+
+def test_non_postgres_dialect_passes_through():
+    connection = SimpleNamespace(dialect=SimpleNamespace(name="sqlite"))
+    assert guard(connection, "SELECT 1").action == "run"
+
+
+def test_nested_loop_without_condition_is_a_cartesian_join():
+    loop = {"Node Type": "Nested Loop", "Plan Rows": 3000, "Total Cost": 500.0,
+            "Plans": [scan(100), {"Node Type": "Materialize", "Plan Rows": 30, "Plans": [scan(30, "customers")]}]}
+    summary = summarise_plan(plan(loop))
+    assert summary.cartesian
+    assert summary.describe() == ("Estimated cost 500 · 3,000 rows · sequential scan of orders (~100), "
+                                  "customers (~30) · possible cartesian join")
+
+
+def test_cost_over_limit_is_rejected_without_downgrade():
+    full = plan(scan(10, cost=5000.0))
+    result = guard(FakeConnection(full, full), "SELECT * FROM orders", max_cost=1000, max_rows=1000,
+                   action="reject")
+    assert result.action == "reject"
+    assert result.reason == "estimated cost 5,000 exceeds 1,000"
@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+from app.result_cache import ResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(max_bytes=10_000_000, spill_bytes=5_000_000, max_disk_bytes=100_000_000,
+                       default_ttl=60, table_ttls={}, cache_dir=str(tmp_path))
+
+
+def test_hits_are_copies_of_the_cached_frame(cache):
+    frame = pd.DataFrame({"n": [3, 1, 2]})
+    cache.put("q", frame)
+    frame["changed_by_caller"] = 1
+    hit = cache.get("q")
+    hit["added"] = hit["n"] * 2
+    hit.sort_values("n", inplace=True)
+    again = cache.get("q")
+    assert list(again.columns) == ["n"]
+    assert again["n"].tolist() == [3, 1, 2]
+    assert cache.stats()["hits"] == 2
+
+
+def test_frames_over_budget_are_spilled_outside_the_lock(cache, monkeypatch):
+    cache.max_bytes = 1_000
+    write = cache._write
+    locked = []
+
+    def watched_write(key, frame):
+        locked.append(cache._lock.locked())
+        return write(key, frame)
+
+    monkeypatch.setattr(cache, "_write", watched_write)
+    for i in range(3):
+        cache.put(f"q{i}", pd.DataFrame({"n": range(i * 100, i * 100 + 100)}))
+    stats = cache.stats()
+    assert locked and not any(locked)
+    assert stats["spilled_entries"] >= 2 and stats["memory_bytes"] <= cache.max_bytes
+    assert cache.get("q0")["n"].tolist() == list(range(100))
+
+
+def test_replaced_entries_keep_their_own_spill_file(cache):
+    cache.spill_bytes = 0
+    cache.put("q", pd.DataFrame({"n": [1]}))
+    cache.put("q", pd.DataFrame({"n": [2]}))
+    assert cache.get("q")["n"].tolist() == [2]
+    assert cache.stats()["spilled_entries"] == 1
+
+
+def test_misses_and_invalidation(cache):
+    assert cache.get("q") is None
+    cache.put("q", pd.DataFrame({"n": [1]}), tables=frozenset({"orders"}))
+    cache.invalidate_tables({"orders"})
+    assert cache.get("q") is None
+    stats = cache.stats()
+    assert stats["misses"] == 2 and stats["invalidations"] == 1
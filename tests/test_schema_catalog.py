@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+
+from app import schema_catalog
+from app.db_config import get_engine
+from app.schema_catalog import get_catalog, invalidate
+
+
+@pytest.fixture
+def engine(tmp_path):
+    path = tmp_path / "catalog.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript("""
+            CREATE TABLE regions (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+            CREATE TABLE stores (id INTEGER PRIMARY KEY, region_id INTEGER REFERENCES regions (id));
+        """)
+    conn.close()
+    engine = create_engine(f"sqlite:///{path}")
+    yield engine
+    schema_catalog.release(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def reflected(monkeypatch):
+    """Names of the tables reflected from the database, per call."""
+    calls = []
+    reflect = schema_catalog.reflect_tables
+
+    def counting(engine, names):
+        calls.append(sorted(names))
+        return reflect(engine, names)
+
+    monkeypatch.setattr(schema_catalog, "reflect_tables", counting)
+    return calls
+
+
+def test_engine_is_reused():
+    assert get_engine() is get_engine()
+
+
+def test_catalog_is_served_from_memory_between_checks(engine, reflected):
+    first = get_catalog(engine)
+    assert get_catalog(engine) is first
+    assert reflected == [["regions", "stores"]]
+    assert first.get_table("stores").foreign_keys[0].referred_table == "regions"
+
+
+def test_only_changed_tables_are_reflected_again(engine, reflected):
+    before = get_catalog(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE stores ADD COLUMN opened_at TEXT")
+    after = get_catalog(engine, force_refresh=True)
+    assert reflected == [["regions", "stores"], ["stores"]]
+    assert after.version != before.version
+    assert after.get_table("regions") is before.get_table("regions")
+    assert "opened_at" in after.ddl("stores")
+
+
+def test_disk_cache_survives_a_restart(engine, reflected):
+    version = get_catalog(engine).version
+    invalidate(engine)
+    assert get_catalog(engine).version == version
+    assert reflected == [["regions", "stores"]]
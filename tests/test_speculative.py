@@ -0,0 +1,62 @@
+import pytest
+
+from app import speculative
+from app.db_config import get_schema_catalog
+from app.llm_client import LLMCancelled
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    """Candidate ``i`` answers with ``responses[i]``; None makes it wait until it is cancelled."""
+    scripted = []
+
+    def generate_sql(schema, question, options=None, cancel=None, **kwargs):
+        response = scripted[options["seed"] - speculative.SEED_BASE]
+        if response is None:
+            if not cancel.wait(10):
+                pytest.fail("the slow candidate was never cancelled")
+            raise LLMCancelled("Cancelled by the caller")
+        return response
+
+    monkeypatch.setattr(speculative, "generate_sql", generate_sql)
+    return scripted
+
+
+def speculate(n, grace=0.0, pick="first"):
+    return speculative.speculate("How many orders are there?", "", get_schema_catalog(), dialect="sqlite", n=n,
+                                 grace=grace, timeout=10.0, runs=3, pick=pick)
+
+
+def test_cancelled_candidate_is_dropped(responses):
+    responses.extend(["SELECT count(*) FROM orders;", None])
+    speculation = speculate(2)
+    assert [c.index for c in speculation.candidates] == [0]
+    assert speculation.winner.index == 0
+    assert speculation.winner.frame.iloc[0, 0] == 100
+
+
+def test_identical_sql_counts_as_votes_and_invalid_sql_loses(responses):
+    responses.extend(["SELECT no_such_column FROM orders;", "SELECT count(*) FROM orders;",
+                      "select count(*)  from orders"])
+    speculation = speculate(3, grace=5.0)
+    assert len(speculation.candidates) == 3
+    assert len(speculation.valid) == 2
+    assert speculation.executed == 1
+    assert speculation.winner.votes == 2
+    assert speculation.winner.index in (1, 2)
+
+
+def test_no_valid_candidate_leaves_the_choice_to_the_caller(responses):
+    responses.extend(["SELECT no_such_column FROM orders;", "I can't answer that."])
+    speculation = speculate(2, grace=5.0)
+    assert speculation.winner is None
+    assert speculation.executed == 0
+
+
+def test_agreement_picks_the_result_most_candidates_return(responses):
+    responses.extend(["SELECT count(*) FROM customers;", "SELECT count(*) FROM orders;",
+                      "SELECT count(id) FROM orders;"])
+    speculation = speculate(3, grace=5.0, pick="agreement")
+    assert speculation.executed == 3
+    assert speculation.agreement == 2
+    assert speculation.winner.frame.iloc[0, 0] == 100
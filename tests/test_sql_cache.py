@@ -0,0 +1,47 @@
+import pytest
+
+from app.sql_cache import SqlCache
+
+FINGERPRINT = "db"
+VERSION = "v1"
+
+
+@pytest.fixture
+def cache():
+    # A loose threshold, so only the content-word check keeps these pairs apart
+    return SqlCache(similarity=0.9, path="")
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("Orders shipped in the last month to customers in Germany",
+     "Orders not shipped in the last month to customers in Germany"),
+    ("Customers who have placed an order this year", "Customers who have not placed an order this year"),
+    ("Customers who haven't placed an order this year", "Customers who have placed an order this year"),
+    ("Products sorted by price ascending", "Products sorted by price descending"),
+    ("Top customers by revenue", "Bottom customers by revenue"),
+    ("Customers with the most orders", "Customers with the least orders"),
+    ("Orders placed before the promotion", "Orders placed after the promotion"),
+    ("Employees earning more than their manager", "Employees earning less than their manager"),
+    ("Customers with orders", "Customers without orders"),
+    ("All regions", "All regions except Europe"),
+    ("Total sales of the northern sales region compared to the western sales region",
+     "Total sales of the western sales region compared to the northern sales region"),
+    ("Orders shipped from Germany to France", "Orders shipped from France to Germany"),
+    ("Revenue by region for 2023", "Revenue for region by 2023"),
+])
+def test_near_duplicate_with_different_meaning_is_a_miss(cache, cached, asked):
+    cache.put(FINGERPRINT, VERSION, cached, "SELECT 1")
+    assert cache.get(FINGERPRINT, VERSION, asked) is None
+
+
+def test_near_duplicate_with_same_content_words_is_a_hit(cache):
+    cache.put(FINGERPRINT, VERSION, "Show me the top customers by revenue", "SELECT 1")
+    assert cache.get(FINGERPRINT, VERSION, "show the top customers by revenue?") == "SELECT 1"
+    assert cache.stats()["similar_hits"] == 1
+
+
+def test_near_duplicate_tier_is_off_by_default():
+    cache = SqlCache(path="")
+    cache.put(FINGERPRINT, VERSION, "Show me the top customers by revenue", "SELECT 1")
+    assert cache.get(FINGERPRINT, VERSION, "show the top customers by revenue?") is None
+    assert cache.get(FINGERPRINT, VERSION, "show me the TOP customers by revenue!") == "SELECT 1"
@@ -0,0 +1,55 @@
+import pytest
+
+from app.schema_catalog import Column, SchemaCatalog, Table
+from app.sql_validation import validate_sql
+
+# Identifier checks need sqlglot; without it only table names are checked lexically
+pytest.importorskip("sqlglot")
+
+
+@pytest.fixture
+def catalog():
+    return SchemaCatalog("db", {
+        "customers": Table("customers", [Column("id", "int4"), Column("name", "text")]),
+        "Orders": Table("Orders", [Column("Total", "numeric")]),
+    })
+
+
+@pytest.mark.parametrize("sql", [
+    'SELECT "Name" FROM customers',
+    'SELECT c."Name" FROM customers c',
+    'SELECT "total" FROM "Orders"',
+    'SELECT name FROM "Customers"',
+])
+def test_quoted_names_keep_their_case_in_postgresql(catalog, sql):
+    assert validate_sql(sql, catalog, "postgresql").errors
+    assert not validate_sql(sql, catalog, "sqlite").errors
+
+
+@pytest.mark.parametrize("sql", [
+    'SELECT "Total" FROM Orders',
+    'SELECT Total FROM "Orders"',
+])
+def test_unquoted_names_fold_to_lower_case_in_postgresql(catalog, sql):
+    assert validate_sql(sql, catalog, "postgresql").errors
+    assert not validate_sql(sql, catalog, "sqlite").errors
+
+
+@pytest.mark.parametrize("sql", [
+    'SELECT "name" FROM customers',
+    "SELECT Name FROM Customers",
+    'SELECT "Total" FROM "Orders"',
+    'SELECT o."Total" FROM "Orders" o',
+])
+def test_matching_names_pass_in_postgresql(catalog, sql):
+    assert not validate_sql(sql, catalog, "postgresql").errors
+
+
+def test_tables_differing_only_in_case_stay_apart():
+    catalog = SchemaCatalog("db", {
+        "Orders": Table("Orders", [Column("Total", "numeric")]),
+        "orders": Table("orders", [Column("amount", "numeric")]),
+    })
+    assert not validate_sql("SELECT amount FROM orders", catalog, "postgresql").errors
+    assert not validate_sql('SELECT "Total" FROM "Orders"', catalog, "postgresql").errors
+    assert validate_sql('SELECT amount FROM "Orders"', catalog, "postgresql").errors